@@ -1,80 +1,631 @@
 import os
-import time
 import logging
+import itertools
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from google import genai
-from google.genai import types
 
-from api.settings import SUMMARY_PROMPT, COMBINE_PROMPT
+from api.compaction import PromptCompactor, expand_arxiv_links
+from api.digests import paper_key, parse_digest_lines
+from api.hedging import CallTimeoutError, LatencyTracker, RunBudget, RunBudgetExceeded, hedged_call
+from api.llm_backend import DEFAULT_MODEL, GeminiBackend, LLMRateLimitError
+from api.llm_cache import LLMCache, cache_key
+from api.packing import pack, section_header, split_sections
+from api.paper import Paper, format_paper
+from api.ranking import select_papers, titles_appendix
+from api.ratelimit import RateLimiter
+from api.references import expand_references, reference_table
+from api.tokens import TokenCounter
+from api.settings import (
+    COMBINE_PROMPT,
+    DIGEST_PROMPT,
+    LLM_BATCH_TOKEN_BUDGET,
+    LLM_CACHE_DIR,
+    LLM_CACHE_MAX_AGE_DAYS,
+    LLM_CACHE_MAX_MB,
+    LLM_CALL_TIMEOUT_SECONDS,
+    LLM_COMBINE_FAN_IN,
+    LLM_CONTEXT_CACHE_MIN_TOKENS,
+    LLM_CONTEXT_CACHE_TTL_SECONDS,
+    LLM_HEDGE,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_HEDGE_QUANTILE,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_OUTPUT_TOKENS,
+    LLM_RATE_LIMIT_BACKOFF_SECONDS,
+    LLM_RATE_LIMIT_RETRIES,
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_RUN_BUDGET_SECONDS,
+    LLM_TOKENS_PER_MINUTE,
+    MULTI_CATEGORY_PROMPT,
+    PACK_MAX_CATEGORIES,
+    PACK_SMALL_CATEGORY_TOKENS,
+    PROMPT_COMPACTION,
+    PROMPT_REFERENCE_IDS,
+    REFERENCE_MULTI_CATEGORY_PROMPT,
+    RANK_MAX_PAPERS,
+    RANK_TOKEN_BUDGET,
+    REFERENCE_COMBINE_PROMPT,
+    REFERENCE_SUMMARY_PROMPT,
+    SUMMARY_PROMPT,
+)
 
 logger = logging.getLogger(__name__)
 
 
 
+MODEL = DEFAULT_MODEL
+SYSTEM_INSTRUCTION = 'You are a helpful assistant.'
+# Key of the blog post among the category slugs in summarize_with_batch_jobs.
+# The blog has its own prompt, so it is never packed with categories.
+BLOG_JOB = '__blog__'
+# A cached prefix is replaced this long (or a tenth of its TTL) before it expires.
+PREFIX_REFRESH_MARGIN_SECONDS = 120
+
+
+def planned_call(call):
+    """(prompt, prefix, max_tokens) of a call yielded by a plan; max_tokens is optional."""
+    prompt, prefix, *rest = call
+    return prompt, prefix, rest[0] if rest else LLM_MAX_OUTPUT_TOKENS
+
+
 class Agent:
-    def __init__(self, gemini_api_key):
-        self.client = genai.Client(api_key=gemini_api_key)
+    def __init__(self, gemini_api_key=None, rate_limiter=None, max_concurrency=LLM_MAX_CONCURRENCY, cache=None,
+                 backend=None):
+        # Any LLMBackend (see api.llm_backend); Gemini unless one is given.
+        if backend is None:
+            self.client = genai.Client(api_key=gemini_api_key)
+            backend = GeminiBackend(self.client, MODEL, timeout=LLM_CALL_TIMEOUT_SECONDS or None)
+        else:
+            self.client = getattr(backend, 'client', None)
+        self.backend = backend
+        # Optional LLMCache; identical calls (e.g. when rerunning a day) are served
+        # from disk without touching the API or the rate limiter.
+        self.cache = cache if cache is not None else (
+            LLMCache(LLM_CACHE_DIR, max_bytes=LLM_CACHE_MAX_MB * 1024 * 1024,
+                     max_age=LLM_CACHE_MAX_AGE_DAYS * 24 * 3600)
+            if LLM_CACHE_DIR else None)
+        # Every LLM call draws from one quota-shaped limiter, so concurrent batches
+        # (and concurrent callers sharing this agent) stay within the API limits.
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter(
+            LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE)
+        self.max_concurrency = max(1, max_concurrency)
+        # Caps in-flight calls across everything sharing this agent (batches,
+        # combine levels and concurrent categories alike).
+        self._call_slots = threading.BoundedSemaphore(self.max_concurrency)
+        self.token_counter = TokenCounter()
+        # Shared prompt prefixes cached server-side for the run; see _prefix_handle.
+        self.context_cache_ttl = LLM_CONTEXT_CACHE_TTL_SECONDS
+        self.context_cache_min_tokens = LLM_CONTEXT_CACHE_MIN_TOKENS
+        self._prefix_handles = {}  # prefix -> (handle or None, refresh time)
+        self._prefix_lock = threading.Lock()
+        self.clock = time.monotonic
+        # Optional DigestStore; see api.digests.
+        self.digests = None
+        # Cite papers by [P17] labels, expanded into links afterwards; see api.references.
+        self.reference_ids = PROMPT_REFERENCE_IDS
+        # Local ranking caps the papers each summary sends; see api.ranking.
+        self.rank_max_papers = RANK_MAX_PAPERS
+        self.rank_token_budget = RANK_TOKEN_BUDGET
+        self.cross_listings = None
+        # Small categories share calls; see pack_categories.
+        self.pack_small_category_tokens = PACK_SMALL_CATEGORY_TOKENS
+        self.pack_max_categories = PACK_MAX_CATEGORIES
+        # Per-call deadline, hedging at the observed tail latency and a budget
+        # for the run's LLM calls, started by the first one; see api.hedging
+        # and _generate.
+        self.call_timeout = LLM_CALL_TIMEOUT_SECONDS
+        self.hedge = LLM_HEDGE
+        self.latencies = LatencyTracker(quantile=LLM_HEDGE_QUANTILE, min_samples=LLM_HEDGE_MIN_SAMPLES)
+        self.run_budget = RunBudget(LLM_RUN_BUDGET_SECONDS)
+        # Rate-limited calls wait out Retry-After and go again; see _rate_limit_wait.
+        self.rate_limit_retries = LLM_RATE_LIMIT_RETRIES
+        self.rate_limit_backoff = LLM_RATE_LIMIT_BACKOFF_SECONDS
+        self.sleep = time.sleep
+        self._call_stats = {'hedges': 0, 'hedge_wins': 0, 'timeouts': 0, 'skipped': 0, 'rate_limited': 0}
+        self._stats_lock = threading.Lock()
+        # Optional PromptCompactor; see api.compaction.
+        self.compactor = PromptCompactor(token_counter=self.token_counter) if PROMPT_COMPACTION else None
+
+    def _estimate_tokens(self, text):
+        return self.token_counter.count(text)
 
-    def _combine_paper_info(self, paper):
+    def _combine_paper_info(self, paper, ref=None):
         """
         Combines the title, authors, and summary into a single string
 
+        With a digest store attached, the paper's digest stands in for its
+        abstract; with a compactor, the block is compacted (see api.compaction).
+        A reference label (see api.references) replaces the URL.
+
         Args:
-        paper: the dict containing details of the paper
+        paper: a Paper record (rendered once and memoized) or a paper dict
+        ref: optional reference label, e.g. 'P17'
         """
-        return f"**Title:** {paper['title']}\n**URL:** {paper['url']}\n**Authors:** {', '.join(paper['authors'])}\n**Summary:** {paper['summary']}\n"
+        digest = self.digests.get(paper_key(paper)) if self.digests is not None else None
+        if self.compactor is not None:
+            return self.compactor.render(paper, summary=digest or None, ref=ref)
+        if digest or ref:
+            return format_paper(paper['title'], paper['url'], paper['authors'], digest or paper['summary'],
+                                ref=ref)
+        if isinstance(paper, Paper):
+            return paper.prompt_text
+        return format_paper(paper['title'], paper['url'], paper['authors'], paper['summary'])
 
-    def _batch_papers(self, papers, max_length, prompt_template):
+    def _batch_papers(self, papers, token_budget, prompt_template):
         """
-        Splits papers into batches that when combined stay under max_length.
-        
+        Packs papers into as few batches as fit the per-call token budget.
+
+        Each paper is sized in tokens (see api.tokens) and the batches are
+        bin-packed (see api.packing), leaving room in every batch for the prompt
+        template and the model's output. Papers keep their original relative
+        order within a batch.
+
         Args:
-            papers: List of paper dictionaries
-            max_length: Maximum allowed length for combined papers
+            papers: List of Paper records (or paper dicts)
+            token_budget: Input-plus-output token limit for one call
             prompt_template: Template text that will be added to each batch
-            
+
         Returns:
-            List of paper batches, where each batch is a list of paper dictionaries
+            List of paper batches, where each batch is a list of papers
         """
-        batches = []
-        current_batch = []
-        current_length = len(prompt_template)
-        
-        for paper in papers:
-            paper_info = self._combine_paper_info(paper)
-            paper_length = len(paper_info)
-            
-            # If adding this paper would exceed max_length, start a new batch
-            if current_length + paper_length > max_length and current_batch:
-                batches.append(current_batch)
-                current_batch = []
-                current_length = len(prompt_template)
-                
-            current_batch.append(paper)
-            current_length += paper_length
-        
-        # Add the last batch if it's not empty
-        if current_batch:
-            batches.append(current_batch)
-            
-        logger.info(f"Split {len(papers)} papers into {len(batches)} batches")
+        capacity = token_budget - self.token_counter.count(prompt_template) - LLM_MAX_OUTPUT_TOKENS
+        # Joining blocks adds a newline between papers; count it with each paper.
+        sizes = [self.token_counter.count(self._combine_paper_info(p)) + 1 for p in papers]
+        batches = [[papers[i] for i in indices] for indices in pack(sizes, capacity)]
+
+        logger.info(f"Split {len(papers)} papers ({sum(sizes)} tokens) into {len(batches)} batches")
         return batches
 
-    def _call_llm(self, prompt, max_tokens=5000):
+    def calibrate_tokens(self, papers):
+        """Fit the token estimator to the model's tokenizer using a sample of papers.
+
+        Costs one count_tokens request. Returns the fitted tokens-per-piece scale.
+        """
+        texts = [self._combine_paper_info(p) for p in papers]
+        return self.token_counter.calibrate(texts, self.backend.count_tokens)
+
+    def _prefix_handle(self, prefix):
+        """
+        The backend's cached-content handle for a shared prompt prefix, or None.
+
+        Created on first use and reused until it nears its TTL, when a fresh
+        one replaces it. Prefixes below the API's minimum cacheable size,
+        backends without caching, and failed creations fall back to sending the
+        prefix inline (the failure is remembered, so it is not retried on every
+        call).
+        """
+        if not prefix or not self.context_cache_ttl:
+            return None
+        stale = None
+        with self._prefix_lock:
+            if prefix in self._prefix_handles:
+                handle, refresh_at = self._prefix_handles[prefix]
+                if handle is None or self.clock() < refresh_at:
+                    return handle
+                stale = handle
+                logger.info(f"Cached prompt prefix {handle} is near its TTL; replacing it")
+            handle = None
+            tokens = self.token_counter.count(SYSTEM_INSTRUCTION + prefix)
+            if tokens < self.context_cache_min_tokens:
+                logger.info(f"Prompt prefix of ~{tokens} tokens is below the "
+                            f"{self.context_cache_min_tokens}-token cache minimum; sending it inline")
+            elif hasattr(self.backend, 'create_prefix_cache'):
+                try:
+                    handle = self.backend.create_prefix_cache(prefix, SYSTEM_INSTRUCTION, self.context_cache_ttl)
+                    logger.info(f"Cached ~{tokens}-token prompt prefix as {handle}")
+                except Exception as e:
+                    logger.warning(f"Context caching unavailable; sending the prefix inline: {e}")
+            # Replace the handle with a margin, so calls in flight never outlive it.
+            margin = min(PREFIX_REFRESH_MARGIN_SECONDS, self.context_cache_ttl / 10)
+            self._prefix_handles[prefix] = (handle, self.clock() + self.context_cache_ttl - margin)
+        if stale:
+            self._delete_prefix_cache(stale)
+        return handle
+
+    def _drop_prefix_handle(self, prefix, handle):
+        """Forget a handle the backend rejected; the next call creates a new one."""
+        with self._prefix_lock:
+            if self._prefix_handles.get(prefix, (None,))[0] == handle:
+                del self._prefix_handles[prefix]
+
+    def _delete_prefix_cache(self, handle):
         try:
-            response = self.client.models.generate_content(
-                model='gemini-3.1-flash-lite',
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    system_instruction='You are a helpful assistant.',
-                    temperature=0.1,
-                    max_output_tokens=max_tokens,
-                )
-            )
-            return response.text
+            self.backend.delete_prefix_cache(handle)
         except Exception as e:
-            logger.error(f"LLM API call failed: {str(e)}")
+            logger.warning(f"Could not delete cached prefix {handle}: {e}")
+
+    def release_prefix_caches(self):
+        """Delete this run's cached prefixes instead of waiting out their TTL."""
+        with self._prefix_lock:
+            handles = [handle for handle, _ in self._prefix_handles.values() if handle]
+            self._prefix_handles.clear()
+        for handle in handles:
+            self._delete_prefix_cache(handle)
+
+    @staticmethod
+    def _llm_config(max_tokens=LLM_MAX_OUTPUT_TOKENS):
+        return {'temperature': 0.1, 'max_output_tokens': max_tokens}
+
+    def _cache_key(self, full_prompt, config):
+        """LLM cache key for a call, or None without a cache."""
+        return cache_key(self.backend.model, config, SYSTEM_INSTRUCTION, full_prompt) if self.cache else None
+
+    def _call_llm(self, prompt, max_tokens=LLM_MAX_OUTPUT_TOKENS, prefix=''):
+        """
+        One LLM call on prefix + prompt.
+
+        `prefix` is the shared instruction text (e.g. SUMMARY_PROMPT). When the
+        backend caches it, only `prompt` is transmitted.
+        """
+        config = self._llm_config(max_tokens)
+        full_prompt = prefix + prompt
+        key = self._cache_key(full_prompt, config)
+        if key:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        for retry in itertools.count():
+            handle = self._prefix_handle(prefix)
+            self.run_budget.start()
+            with self._call_slots:
+                if self.run_budget.expired:
+                    self._count('skipped')
+                    raise RunBudgetExceeded("LLM run budget is spent; call skipped")
+                tokens = self._estimate_tokens(full_prompt)
+                self.rate_limiter.acquire(tokens)
+
+                def send(attempt):
+                    if attempt:
+                        # A hedge is a real request and draws from the quota too.
+                        self.rate_limiter.acquire(tokens)
+                    if handle:
+                        try:
+                            return self.backend.generate(prompt, SYSTEM_INSTRUCTION, config,
+                                                         cached_prefix=handle)
+                        except LLMRateLimitError:
+                            raise
+                        except Exception as e:
+                            # e.g. the cache expired early or was evicted: resend inline.
+                            logger.warning(
+                                f"Call on cached prefix {handle} failed ({e}); sending the prefix inline")
+                            self._drop_prefix_handle(prefix, handle)
+                            self.rate_limiter.acquire(tokens)
+                    return self.backend.generate(full_prompt, SYSTEM_INSTRUCTION, config)
+
+                try:
+                    response = self._generate(send)
+                    break
+                except LLMRateLimitError as e:
+                    self._count('rate_limited')
+                    wait = self._rate_limit_wait(e, retry)
+                    if wait is None:
+                        logger.error(f"LLM API call failed: {str(e)}")
+                        raise
+                except Exception as e:
+                    logger.error(f"LLM API call failed: {str(e)}")
+                    raise
+            # Wait with the call slot released so other calls can proceed.
+            logger.warning(f"LLM call rate limited; retrying in {wait:.1f}s")
+            self.sleep(wait)
+
+        if key and response.text:
+            self.cache.put(key, response.text, model=self.backend.model)
+        return response.text
+
+    def _rate_limit_wait(self, error, retry):
+        """
+        Seconds to wait before retrying a rate-limited call: the server's
+        Retry-After, else an exponential backoff. None once the retries are
+        used up or the wait would outlast the run budget.
+        """
+        if retry >= self.rate_limit_retries:
+            return None
+        wait = error.retry_after if error.retry_after is not None else self.rate_limit_backoff * 2 ** retry
+        if wait >= self.run_budget.remaining():
+            return None
+        return wait
+
+    def _generate(self, send):
+        """
+        Runs send(attempt) under the per-call deadline (cut short by the run
+        budget) and, with hedging on, sends a duplicate once the call outlasts
+        the observed LLM_HEDGE_QUANTILE latency; the first answer wins.
+
+        Raises:
+            CallTimeoutError: No answer before the deadline.
+        """
+        timeout = min(self.call_timeout or math.inf, self.run_budget.remaining())
+        hedge_after = self.latencies.threshold() if self.hedge else None
+        if timeout == math.inf and not self.hedge:
+            return send(0)
+        try:
+            response, attempt, seconds = hedged_call(
+                send, timeout=None if timeout == math.inf else timeout, hedge_after=hedge_after,
+                on_hedge=lambda: self._count('hedges'))
+        except CallTimeoutError:
+            self._count('timeouts')
             raise
+        self.latencies.record(seconds)
+        if attempt:
+            self._count('hedge_wins')
+        return response
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._call_stats[name] += 1
+
+    def call_stats(self):
+        """Hedges sent and won, calls timed out, rate limited and skipped for the run budget."""
+        with self._stats_lock:
+            stats = dict(self._call_stats)
+        stats['hedge_after'] = self.latencies.threshold() if self.hedge else None
+        return stats
+
+    def _try_call(self, call):
+        """Run one planned call (see planned_call). Returns None (logged) if it fails."""
+        prompt, prefix, max_tokens = planned_call(call)
+        try:
+            return self._call_llm(prompt, max_tokens=max_tokens, prefix=prefix)
+        except RunBudgetExceeded:
+            return None  # counted in call_stats(); the plans degrade on their own
+        except Exception as e:
+            logger.error(f"LLM call failed and was dropped: {str(e)}")
+            return None
+
+    def _run_plan(self, plan):
+        """
+        Drives a plan interactively: each round's calls run concurrently (paced by
+        the shared rate limiter and in-flight cap) and the outputs, in call order,
+        are sent back to the plan.
+
+        Returns:
+            The plan's return value
+        """
+        try:
+            calls = next(plan)
+            while True:
+                outputs = []
+                if calls:
+                    workers = min(self.max_concurrency, len(calls))
+                    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='llm-call') as pool:
+                        outputs = list(pool.map(self._try_call, calls))
+                calls = plan.send(outputs)
+        except StopIteration as done:
+            return done.value
+
+    def _combine_groups(self, summaries, fan_in, token_budget, combine_prompt=COMBINE_PROMPT):
+        """
+        Splits summaries into consecutive groups for one level of the combine tree.
+
+        A group closes at `fan_in` summaries or when the next summary would push
+        `combine_prompt` (the instruction prefix in use) past the token budget,
+        but always holds at least two summaries so every level shrinks.
+        """
+        capacity = token_budget - self.token_counter.count(combine_prompt) - LLM_MAX_OUTPUT_TOKENS
+        groups, group, used = [], [], 0
+        for summary in summaries:
+            size = self.token_counter.count(summary) + 1
+            if len(group) >= 2 and (len(group) >= fan_in or used + size > capacity):
+                groups.append(group)
+                group, used = [], 0
+            group.append(summary)
+            used += size
+        if group:
+            groups.append(group)  # a trailing single summary passes through to the next level
+        return groups
+
+    def _reduce_plan(self, summaries, fan_in=LLM_COMBINE_FAN_IN, token_budget=LLM_BATCH_TOKEN_BUDGET,
+                     combine_prompt=COMBINE_PROMPT):
+        """
+        Plan that tree-reduces intermediate summaries into one.
+
+        Each round is one level of the tree: groups of up to `fan_in` summaries,
+        each merged by a COMBINE_PROMPT call, so every combine call stays within
+        the context window and latency grows with log(batches) rather than with
+        the size of one giant combine prompt. A failed combine falls back to
+        concatenating its group.
+
+        Args:
+            summaries: Intermediate summaries, in batch order
+            fan_in: Maximum summaries per combine call (at least 2)
+            token_budget: Input-plus-output token limit for one combine call
+            combine_prompt: Instruction prefix for the combine calls
+
+        Returns:
+            The final summary ("" if there are no summaries)
+        """
+        if not summaries:
+            return ""
+        fan_in = max(2, fan_in)
+        level = 0
+        while len(summaries) > 1:
+            level += 1
+            groups = self._combine_groups(summaries, fan_in, token_budget, combine_prompt)
+            logger.info(f"Combine level {level}: {len(summaries)} summaries in {len(groups)} groups")
+            merged = iter((yield [("\n\n".join(g), combine_prompt) for g in groups if len(g) > 1]))
+            summaries = [group[0] if len(group) == 1 else self._merged(group, next(merged)) for group in groups]
+        return summaries[0]
+
+    @staticmethod
+    def _merged(group, output):
+        if output is None:
+            logger.error(f"Failed to combine {len(group)} summaries; concatenating them")
+            return "\n\n".join(group)
+        return output
+
+    def _summary_plan(self, papers):
+        """
+        The summarization of one set of papers, as a plan.
+
+        A plan is a generator that yields each round of independent LLM calls as
+        a list of (prompt, prefix) pairs (optionally with max_tokens, see
+        planned_call), is sent their outputs (None for a failed call) and
+        returns the result. Here the rounds are the paper batches, then each
+        level of the combine tree. _run_plan drives a plan with interactive
+        calls; api.batch_jobs drives many plans at once as batch jobs.
+        """
+        unranked = []
+        if self.rank_max_papers or self.rank_token_budget:
+            papers, unranked = select_papers(
+                papers, self.rank_max_papers, self.rank_token_budget,
+                size=lambda p: self.token_counter.count(self._combine_paper_info(p)),
+                cross_listings=self.cross_listings)
+            if unranked:
+                logger.info(f"Ranking kept {len(papers)} papers; {len(unranked)} listed by title only")
+
+        summary_prompt, combine_prompt = SUMMARY_PROMPT, COMBINE_PROMPT
+        table = {}
+        if self.reference_ids:
+            # Labels are unique across the whole set, so they survive combining.
+            summary_prompt, combine_prompt = REFERENCE_SUMMARY_PROMPT, REFERENCE_COMBINE_PROMPT
+            table = reference_table(papers)
+        refs = {id(paper): label for label, paper in table.items()}
+
+        batches = self._batch_papers(papers, LLM_BATCH_TOKEN_BUDGET, summary_prompt)
+        prompts = ["\n".join(self._combine_paper_info(p, ref=refs.get(id(p))) for p in batch)
+                   for batch in batches]
+        logger.info(f"Summarizing {len(papers)} papers in {len(batches)} batches")
+        outcomes = yield [(prompt, summary_prompt) for prompt in prompts]
+        failed = [i for i, outcome in enumerate(outcomes, 1) if outcome is None]
+        if failed:
+            logger.error(f"Dropped {len(failed)} of {len(batches)} batches that failed: {failed}")
+            # Their papers are still announced, by title.
+            dropped = {id(p) for i in failed for p in batches[i - 1]}
+            unranked = [p for p in papers if id(p) in dropped] + unranked
+        summary = yield from self._reduce_plan([outcome for outcome in outcomes if outcome is not None],
+                                               combine_prompt=combine_prompt)
+        if table:
+            summary = expand_references(summary, table)
+        # Compacted prompts cite bare arXiv ids; turn them back into links.
+        if self.compactor is not None:
+            summary = expand_arxiv_links(summary)
+        if unranked:
+            summary = f"{summary}\n\n{titles_appendix(unranked)}" if summary else titles_appendix(unranked)
+        return summary
+
+    def pack_categories(self, papers_by_category):
+        """
+        Groups small categories so each group shares one LLM call.
+
+        A category is small when its paper blocks total at most
+        PACK_SMALL_CATEGORY_TOKENS. Small categories are bin-packed under the
+        per-call token budget, at most PACK_MAX_CATEGORIES per call.
+
+        Args:
+            papers_by_category: Dict mapping slug -> list of papers
+
+        Returns:
+            List of packs (lists of two or more slugs); [] when packing is off
+        """
+        if not self.pack_small_category_tokens:
+            return []
+        sizes = {
+            slug: sum(self.token_counter.count(self._combine_paper_info(p)) + 1 for p in papers)
+            for slug, papers in papers_by_category.items() if papers
+        }
+        small = [slug for slug, size in sizes.items() if size <= self.pack_small_category_tokens]
+        per_pack = max(2, self.pack_max_categories)
+        # Each category in a pack keeps its own LLM_MAX_OUTPUT_TOKENS of reply (see _pack_plan).
+        capacity = (LLM_BATCH_TOKEN_BUDGET - self.token_counter.count(MULTI_CATEGORY_PROMPT)
+                    - per_pack * LLM_MAX_OUTPUT_TOKENS)
+        bins = pack([sizes[slug] + self.token_counter.count(section_header(slug)) for slug in small], capacity)
+        packs = [[small[i] for i in b[j:j + per_pack]] for b in bins for j in range(0, len(b), per_pack)]
+        return [p for p in packs if len(p) > 1]
+
+    def _pack_plan(self, papers_by_slug):
+        """
+        Plan that summarizes several small categories in one sectioned call.
+
+        The call may write LLM_MAX_OUTPUT_TOKENS per category. The reply is
+        split back per slug (see api.packing.split_sections). A category whose
+        section is missing, empty or cut off is summarized on its own.
+
+        Returns:
+            Dict mapping each slug -> summary
+        """
+        prompt, table = MULTI_CATEGORY_PROMPT, {}
+        if self.reference_ids:
+            # Labels run across the whole pack, like one category's paper set.
+            prompt = REFERENCE_MULTI_CATEGORY_PROMPT
+            table = reference_table([p for papers in papers_by_slug.values() for p in papers])
+        refs = {id(paper): label for label, paper in table.items()}
+        sections = [section_header(slug) + "\n" + "\n".join(self._combine_paper_info(p, ref=refs.get(id(p)))
+                                                             for p in papers)
+                    for slug, papers in papers_by_slug.items()]
+        logger.info(f"Summarizing {len(papers_by_slug)} categories in one call: {list(papers_by_slug)}")
+        max_tokens = LLM_MAX_OUTPUT_TOKENS * len(papers_by_slug)
+        (output,) = yield [("\n".join(sections), prompt, max_tokens)]
+        summaries = split_sections(output, papers_by_slug)
+        if table:
+            summaries = {slug: expand_references(text, table) for slug, text in summaries.items()}
+        if self.compactor is not None:
+            summaries = {slug: expand_arxiv_links(text) for slug, text in summaries.items()}
+        missing = [slug for slug in papers_by_slug if slug not in summaries]
+        if missing:
+            logger.warning(f"Packed reply had no section for {missing}; summarizing them separately")
+        for slug in missing:
+            summaries[slug] = yield from self._summary_plan(papers_by_slug[slug])
+        return {slug: summaries[slug] for slug in papers_by_slug}
+
+    def summarize_category_pack(self, papers_by_slug):
+        """Summarizes a pack of small categories (see pack_categories). Returns {slug: summary}."""
+        return self._run_plan(self._pack_plan(papers_by_slug))
+
+    def _reduce_summaries(self, summaries, fan_in=LLM_COMBINE_FAN_IN, token_budget=LLM_BATCH_TOKEN_BUDGET):
+        """Tree-reduces intermediate summaries into one, combining each level concurrently."""
+        return self._run_plan(self._reduce_plan(summaries, fan_in, token_budget))
+
+    def _digest_batch(self, batch):
+        """LLM digests for one batch of papers; {} (logged) if the call fails."""
+        ids = [paper_key(p) for p in batch]
+        papers_info = "\n".join(f"{i}: {p['title']}\n{p['summary']}\n" for i, p in zip(ids, batch))
+        try:
+            return parse_digest_lines(self._call_llm(papers_info, prefix=DIGEST_PROMPT), ids)
+        except Exception as e:
+            logger.error(f"Failed to digest {len(batch)} papers: {str(e)}")
+            return {}
+
+    def digest_papers(self, papers):
+        """
+        Writes a short synopsis of each paper with DIGEST_PROMPT, batched and concurrent.
+
+        Args:
+            papers: List of Paper records (or paper dicts)
+
+        Returns:
+            Dict mapping arXiv id -> synopsis; papers the model skipped are left out
+        """
+        if not papers:
+            return {}
+        sizes = [self.token_counter.count(p['title'] + p['summary']) + 8 for p in papers]
+        capacity = (LLM_BATCH_TOKEN_BUDGET - self.token_counter.count(DIGEST_PROMPT)
+                    - LLM_MAX_OUTPUT_TOKENS)
+        # Output is ~1 line per paper, so also cap batches by what the reply can hold.
+        per_batch = max(1, LLM_MAX_OUTPUT_TOKENS // 80)
+        batches = [[papers[i] for i in indices] for indices in pack(sizes, capacity)]
+        batches = [b[i:i + per_batch] for b in batches for i in range(0, len(b), per_batch)]
+
+        digests = {}
+        workers = min(self.max_concurrency, len(batches))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='llm-digest') as pool:
+            for result in pool.map(self._digest_batch, batches):
+                digests.update(result)
+        logger.info(f"LLM digests: {len(digests)} of {len(papers)} papers in {len(batches)} calls")
+        return digests
+
+    def combine_summaries(self, summaries):
+        """
+        Merges already-written summaries (e.g. per-category blurbs) with COMBINE_PROMPT.
+
+        Up to LLM_COMBINE_FAN_IN summaries take a single combine call; more are
+        tree-reduced. A single summary is returned as is.
+        """
+        return self._reduce_summaries(summaries)
 
     def identify_important_papers(self, papers):
         """
@@ -92,46 +643,38 @@ class Agent:
         if not papers:
             raise ValueError("No papers provided to summarize")
             
-        # Constants
-        MAX_LENGTH = 122000 * 4  # max len = max tokens * 4 since on average a word is ~4 tokens
-        
-        # Get paper batches
-        batches = self._batch_papers(papers, MAX_LENGTH, SUMMARY_PROMPT)
-        intermediate_summaries = []
-        
-        # Process each batch
-        for i, batch in enumerate(batches, 1):
-            logger.info(f"Processing batch {i} of {len(batches)}")
-
-            # Combine papers in this batch
-            batch_info = "\n".join(self._combine_paper_info(p) for p in batch)
-            prompt = SUMMARY_PROMPT + batch_info
-
-            try:
-                batch_summary = self._call_llm(prompt)
-                intermediate_summaries.append(batch_summary)
-                logger.info(f"Successfully processed batch {i}")
-            except Exception as e:
-                logger.error(f"Failed to process batch {i}: {str(e)}")
-                continue
-
-            if i < len(batches):
-                time.sleep(30)
-        
-        # If we have multiple summaries, combine them
-        if len(intermediate_summaries) > 1:
-            combine_prompt = COMBINE_PROMPT + "\n\n".join(intermediate_summaries)
-            
-            try:
-                final_summary = self._call_llm(combine_prompt)
-            except Exception as e:
-                logger.error(f"Failed to combine summaries: {str(e)}")
-                # Fall back to concatenation if combination fails
-                final_summary = "\n\n".join(intermediate_summaries)
-        else:
-            final_summary = intermediate_summaries[0] if intermediate_summaries else ""
-        
-        return final_summary
+        # Batches run concurrently, then each combine level; pacing comes from
+        # the shared rate limiter. Outputs come back in batch order, so the
+        # combine step sees the same order as a sequential run.
+        return self._run_plan(self._summary_plan(papers))
+
+    def summarize_with_batch_jobs(self, papers_by_key):
+        """
+        Summarizes several paper sets at once through the backend's batch-job API.
+
+        Every set's calls for a round (first all paper batches, then each combine
+        level) go out together as one batch job; see api.batch_jobs. Small sets
+        are packed several to a call (see pack_categories), except BLOG_JOB.
+
+        Args:
+            papers_by_key: Dict mapping a key (a category slug, or BLOG_JOB) -> non-empty list of papers
+
+        Returns:
+            Dict mapping each key -> summary
+        """
+        from api.batch_jobs import BatchJobRunner
+
+        papers_by_key = {key: papers for key, papers in papers_by_key.items() if papers}
+        packs = self.pack_categories({key: papers for key, papers in papers_by_key.items() if key != BLOG_JOB})
+        packed = {slug for pack in packs for slug in pack}
+        plans = {key: self._summary_plan(papers) for key, papers in papers_by_key.items() if key not in packed}
+        plans.update({('pack', i): self._pack_plan({slug: papers_by_key[slug] for slug in pack})
+                      for i, pack in enumerate(packs)})
+
+        results = BatchJobRunner(self).run(plans)
+        for i in range(len(packs)):
+            results.update(results.pop(('pack', i)))
+        return {key: results[key] for key in papers_by_key}
 
     # TODO: remove summarize_paper, _create_and_run_thread, _combine_paper_summaries in a future commit
     # def summarize_paper(self, pdf_file):
@@ -1,12 +1,31 @@
-import time
+import heapq
 import logging
+import math
 import re
-import urllib.request as libreq
-
-import xml.etree.ElementTree as ET
-from email.utils import parsedate_to_datetime
-
-from api.settings import RSS_CATEGORIES
+import urllib.error
+import urllib.parse
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from api.arxiv_metadata import ArxivMetadataResolver, MetadataCache
+from api.feed_cache import FeedValidatorCache
+from api.feed_store import FeedStore
+from api.feeds import today_ny
+from api.http_session import open_url
+from api.paper import Paper, arxiv_id_from_url
+from api.ratelimit import TokenBucket
+from api.retry import RetryPolicy
+from api.rss_parser import parse_entries
+from api.settings import (
+    ARXIV_METADATA_CACHE,
+    RSS_CATEGORIES,
+    FETCH_COMBINED_FEEDS,
+    FETCH_CONCURRENCY,
+    FETCH_MAX_ATTEMPTS,
+    FETCH_REQUESTS_PER_SECOND,
+    FETCH_RUN_BUDGET_SECONDS,
+    FEED_CACHE_DIR,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -15,10 +34,40 @@ _RSS_NS = {
     'arxiv': 'http://arxiv.org/schemas/atom',
 }
 
+# Conservative URL length for combined feeds ('cs.LG+cs.AI+...'); well under what
+# servers and proxies commonly accept.
+MAX_FEED_URL_LENGTH = 2000
+
 class ArxivClient:
-    def __init__(self, categories=RSS_CATEGORIES):
+    def __init__(self, categories=RSS_CATEGORIES, max_workers=FETCH_CONCURRENCY,
+                 requests_per_second=FETCH_REQUESTS_PER_SECOND, combined=FETCH_COMBINED_FEEDS,
+                 store=None, parser_backend=None, metadata=None, session=None, retry_policy=None,
+                 validator_cache=None):
         self.categories = categories
         self.base_url = 'https://rss.arxiv.org/rss'
+        self.combined = combined
+        self.max_workers = max(1, max_workers)
+        # One bucket per client, shared by every worker thread and every retry, so
+        # the request rate toward arXiv is bounded no matter how many fetches are
+        # in flight.
+        self.rate_limiter = TokenBucket(requests_per_second, capacity=self.max_workers)
+        self.store = store if store is not None else FeedStore()
+        # The run deadline counts from the first fetch (see _fetch_many).
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy(
+            max_attempts=FETCH_MAX_ATTEMPTS, run_budget=FETCH_RUN_BUDGET_SECONDS)
+        # Conditional-GET cache (ETag / Last-Modified); disabled when FEED_CACHE_DIR
+        # is unset. unchanged_feeds maps each slug answered with 304 this run to
+        # when its content was first seen, so callers can skip downstream work.
+        self.validator_cache = validator_cache if validator_cache is not None else (
+            FeedValidatorCache(FEED_CACHE_DIR) if FEED_CACHE_DIR else None)
+        self.unchanged_feeds = {}
+        # None picks lxml when installed, else the stdlib parser (see api.rss_parser).
+        self.parser_backend = parser_backend
+        # Shared keep-alive HttpSession for all of this client's requests; None
+        # falls back to a one-off urlopen per request.
+        self.session = session
+        self.metadata = metadata if metadata is not None else ArxivMetadataResolver(
+            MetadataCache(ARXIV_METADATA_CACHE), session=session)
 
     def _process_paper_entry(self, item):
         title = (item.findtext('title') or '').strip()
@@ -33,71 +82,84 @@ class ArxivClient:
         creator = item.findtext('dc:creator', namespaces=_RSS_NS) or ''
         authors = [a.strip() for a in creator.split(',') if a.strip()]
 
-        return {
-            'title': title,
-            'authors': authors,
-            'summary': summary,
-            'url': url,
-        }
+        return Paper.create(title, url, authors, summary)
 
     def retrieve_daily_results(self):
+        """Fetch the client's categories as one list, deduped across feeds by URL.
+
+        Feeds come from retrieve_results_by_category, so they share its per-run
+        store: a category already fetched for another flow is not downloaded again.
+
+        Returns:
+            List of Paper records in category order.
+        """
         papers = []
         seen_urls = set()
-        max_retries = 5
-
-        for i, category in enumerate(self.categories):
-            if i > 0:
-                time.sleep(3)
-
-            url = f'{self.base_url}/{category}'
-            root = None
-
-            for attempt in range(1, max_retries + 1):
-                try:
-                    with libreq.urlopen(url, timeout=30) as response:
-                        root = ET.fromstring(response.read())
-                    break
-                except Exception as e:
-                    if attempt == max_retries:
-                        print(f"Failed to fetch {category} after {max_retries} attempts: {e}")
-                    else:
-                        print(f"Attempt {attempt} error for {category}: {e}")
-                        time.sleep(5)
+        for category_papers in self.retrieve_results_by_category(self.categories).values():
+            for paper in category_papers:
+                if paper['url'] not in seen_urls:
+                    seen_urls.add(paper['url'])
+                    papers.append(paper)
+        return papers
 
-            if root is None:
-                continue
+    def _fetch_feed(self, feed):
+        """Download and parse one RSS feed in a single attempt.
 
-            items = root.findall('.//item')
+        The response is parsed while it streams in (see api.rss_parser), so the
+        raw document and a full element tree are never held in memory. Retries
+        are not done here: _fetch_many reschedules failed feeds.
 
-            # Find the most recent pubDate in this feed and keep only items from that date.
-            # Guards against mixed-date feeds and partial intra-day data.
-            pub_dates = []
-            for item in items:
-                raw = item.findtext('pubDate')
-                if raw:
-                    try:
-                        pub_dates.append(parsedate_to_datetime(raw).date())
-                    except Exception:
-                        pass
+        With a validator cache configured the request is conditional when the
+        cached version of the feed was first seen on an earlier day. On 304 Not
+        Modified no entries are returned and the feed's slugs are recorded in
+        `unchanged_feeds`: their papers were summarized on that earlier day.
 
-            latest_date = max(pub_dates) if pub_dates else None
+        Args:
+            feed: Feed name appended to base_url — a slug such as 'cs.LG', or a
+                '+'-joined combination such as 'cs.LG+cs.AI'.
 
-            for item in items:
-                if latest_date:
-                    raw = item.findtext('pubDate')
-                    try:
-                        item_date = parsedate_to_datetime(raw).date()
-                        if item_date != latest_date:
-                            continue
-                    except Exception:
-                        pass
-
-                paper = self._process_paper_entry(item)
-                if paper and paper['url'] not in seen_urls:
-                    seen_urls.add(paper['url'])
-                    papers.append(paper)
+        Returns:
+            List of (date, categories, paper) entries.
 
-        return papers
+        Raises:
+            Any download or parse error.
+        """
+        url = f'{self.base_url}/{feed}'
+        headers = None
+        if self.validator_cache:
+            headers = self.validator_cache.request_headers(url, seen_before=today_ny())
+        self.rate_limiter.acquire()
+        try:
+            with open_url(url, headers=headers, timeout=30, session=self.session) as response:
+                entries = parse_entries(response, self._process_paper_entry, self.parser_backend)
+                if self.validator_cache:
+                    self.validator_cache.store(url, getattr(response, 'headers', None))
+                return entries
+        except urllib.error.HTTPError as e:
+            first_seen = self.validator_cache.first_seen(url) if self.validator_cache and e.code == 304 else None
+            if first_seen is None:
+                raise
+        for slug in feed.split('+'):
+            self.unchanged_feeds[slug] = first_seen
+        logger.info(f"{feed} unchanged since {first_seen}; skipping it")
+        return []
+
+    @staticmethod
+    def _latest_only(dated_papers):
+        """Keep only papers from the most recent pubDate.
+
+        Guards against mixed-date feeds and partial intra-day data. Papers whose
+        date could not be parsed are kept, as are all papers if no item had a date.
+
+        Args:
+            dated_papers: List of (date or None, paper) pairs in feed order.
+
+        Returns:
+            List of papers.
+        """
+        dates = [d for d, _ in dated_papers if d is not None]
+        latest_date = max(dates) if dates else None
+        return [p for d, p in dated_papers if latest_date is None or d is None or d == latest_date]
 
     def _fetch_category_papers(self, slug):
         """Fetch one RSS feed and return its most-recent-pubDate papers.
@@ -109,76 +171,198 @@ class ArxivClient:
             slug: arXiv category slug (also the RSS feed name), e.g. 'cs.LG'.
 
         Returns:
-            List of paper dicts (possibly empty).
-        """
-        url = f'{self.base_url}/{slug}'
-        root = None
-        max_retries = 5
-
-        for attempt in range(1, max_retries + 1):
-            try:
-                with libreq.urlopen(url, timeout=30) as response:
-                    root = ET.fromstring(response.read())
-                break
-            except Exception as e:
-                if attempt == max_retries:
-                    logger.error(f"Failed to fetch {slug} after {max_retries} attempts: {e}")
-                else:
-                    time.sleep(5)
-
-        if root is None:
-            return []
-
-        items = root.findall('.//item')
-
-        # Keep only items from the most recent pubDate in this feed.
-        pub_dates = []
-        for item in items:
-            raw = item.findtext('pubDate')
-            if raw:
-                try:
-                    pub_dates.append(parsedate_to_datetime(raw).date())
-                except Exception:
-                    pass
-        latest_date = max(pub_dates) if pub_dates else None
+            List of Paper records (possibly empty).
 
-        papers = []
+        Raises:
+            Any download or parse error; see _fetch_many for retries.
+        """
+        entries = self._fetch_feed(slug)
+        dated_papers = []
         seen_urls = set()
-        for item in items:
-            if latest_date:
-                raw = item.findtext('pubDate')
-                try:
-                    if parsedate_to_datetime(raw).date() != latest_date:
-                        continue
-                except Exception:
-                    pass
-            paper = self._process_paper_entry(item)
-            if paper and paper['url'] not in seen_urls:
+        for date, _, paper in entries:
+            if paper['url'] not in seen_urls:
                 seen_urls.add(paper['url'])
-                papers.append(paper)
-        return papers
+                dated_papers.append((date, paper))
+        return self._latest_only(dated_papers)
+
+    def _pack_feeds(self, slugs):
+        """Pack slugs into as few '+'-joined feed names as the URL limit allows.
 
-    def retrieve_results_by_category(self, slugs):
+        Order is preserved; a slug that alone exceeds the limit gets its own feed.
+
+        Returns:
+            List of slug lists, one per combined request.
+        """
+        groups = []
+        current = []
+        for slug in slugs:
+            candidate = '+'.join(current + [slug])
+            if current and len(f'{self.base_url}/{candidate}') > MAX_FEED_URL_LENGTH:
+                groups.append(current)
+                current = []
+            current.append(slug)
+        if current:
+            groups.append(current)
+        return groups
+
+    def _fetch_combined_papers(self, slugs):
+        """Fetch several categories in one combined feed and split them back out.
+
+        Items are assigned to every requested slug listed in their <category>
+        elements. Each item is parsed once, in the same single streaming pass; a
+        cross-listed paper's record is shared by all of its slugs' lists. The
+        latest-pubDate filter is applied per slug, exactly as
+        _fetch_category_papers does for a single feed.
+
+        Args:
+            slugs: Category slugs to request together, e.g. ['cs.LG', 'cs.AI'].
+
+        Returns:
+            Dict mapping each slug to its list of Paper records (possibly empty).
+        """
+        dated_by_slug = {slug: [] for slug in slugs}
+        entries = self._fetch_feed('+'.join(slugs))
+        seen_urls = set()
+        for date, listed, paper in entries:
+            targets = [c for c in dict.fromkeys(listed) if c in dated_by_slug]
+            if not targets and len(slugs) == 1:
+                # Untagged item in a single-slug feed: it can only belong there.
+                targets = slugs
+            if not targets:
+                continue
+
+            if paper['url'] in seen_urls:
+                continue
+            seen_urls.add(paper['url'])
+            dated = (date, paper)
+            for slug in targets:
+                dated_by_slug[slug].append(dated)
+
+        return {slug: self._latest_only(dated) for slug, dated in dated_by_slug.items()}
+
+    def retrieve_results_by_category(self, slugs, combined=None):
         """Fetch papers grouped by category slug.
 
         Each feed is deduped within itself; a cross-listed paper appears in every
         feed it shows up in (no global dedup across categories), so it lands in
-        each relevant category's blurb.
+        each relevant category's blurb. Results are kept in the client's feed
+        store, so each slug is downloaded and parsed at most once per client.
+
+        Feeds are downloaded by a pool of up to `max_workers` threads. Pacing comes
+        from the client's shared token bucket rather than fixed sleeps, so wall-clock
+        time scales with the concurrency cap instead of the category count.
+
+        In combined mode the slugs are packed into as few multi-category feeds
+        (e.g. 'cs.LG+cs.AI+stat.ML') as the URL length limit allows and split back
+        out by each item's <category> tags, so request count and parse work no
+        longer grow with the number of categories.
 
         Args:
             slugs: List of category slugs to fetch.
+            combined: Use combined multi-category requests. Defaults to the
+                client's `combined` setting.
 
         Returns:
-            Dict mapping each slug to its list of paper dicts.
+            Dict mapping each slug to its list of Paper records, in input order.
         """
-        results = {}
         # Deduplicate while preserving order: each category is downloaded exactly
         # once per run, no matter how many times it appears in the input (or how
         # many users selected it upstream).
-        for i, slug in enumerate(dict.fromkeys(slugs)):
-            if i > 0:
-                time.sleep(3)
-            results[slug] = self._fetch_category_papers(slug)
+        unique_slugs = list(dict.fromkeys(slugs))
+        results = {}
+        missing = []
+        for slug in unique_slugs:
+            stored = self.store.get(slug)
+            if stored is None:
+                missing.append(slug)
+            else:
+                results[slug] = stored
+        if missing:
+            fetched = self._fetch_many(missing, combined)
+            for slug, papers in fetched.items():
+                self.store.put(slug, papers)
+            results.update(fetched)
+        # A slug whose fetch raised is reported empty but not stored, so a later
+        # call in the same run may try it again.
+        return {slug: results.get(slug, []) for slug in unique_slugs}
+
+    def _fetch_many(self, slugs, combined=None):
+        """Download slugs on the worker pool. See retrieve_results_by_category.
+
+        Workers make single attempts. A failed feed goes back on a timer queue
+        with the delay its retry policy chose (backoff, Retry-After, an open
+        circuit), so it never holds a worker while it waits and the feeds queued
+        behind it keep moving. While the host's circuit is open no request
+        starts, first attempts included; once it half-opens a single probe goes
+        out first. Feeds the policy gives up on, including any that cannot be
+        retried (or wait out an open circuit) before the run deadline, are left
+        out of the result.
+
+        Returns:
+            Dict of slug -> papers for every fetch that completed.
+        """
+        if self.combined if combined is None else combined:
+            groups = self._pack_feeds(slugs)
+            fetch = self._fetch_combined_papers
+        else:
+            groups = [[slug] for slug in slugs]
+            fetch = lambda group: {group[0]: self._fetch_category_papers(group[0])}
+
+        policy = self.retry_policy
+        policy.start()
+        host = urllib.parse.urlsplit(self.base_url).hostname
+        results = {}
+        # (ready_at, sequence, group, attempt); sequence keeps input order on ties.
+        queue = [(policy.clock(), i, group, 1) for i, group in enumerate(groups)]
+        sequence = len(queue)
+        workers = min(self.max_workers, len(groups))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='arxiv-fetch') as pool:
+            running = {}
+            while queue or running:
+                now = policy.clock()
+                held = 0.0
+                while queue and queue[0][0] <= now and len(running) < workers:
+                    held = policy.admit(host)
+                    if held:
+                        break  # circuit open: hold the queue until it half-opens
+                    _, _, group, attempt = heapq.heappop(queue)
+                    running[pool.submit(fetch, group)] = (group, attempt)
+
+                if held and held != math.inf and not policy.fits_deadline(held):
+                    for _, _, group, _ in queue:
+                        logger.error(f"Gave up on {'+'.join(group)}: circuit for {host} stays open "
+                                     f"past the run deadline")
+                    queue = []
+                wait_for = None
+                if queue and len(running) < workers:
+                    wait_for = max(held, queue[0][0] - now)
+                    if wait_for == math.inf:
+                        wait_for = None  # the probe is out; its completion wakes us
+                if not running:
+                    if wait_for is None and queue:
+                        wait_for = policy.breaker_cooldown  # another caller's probe is out
+                    if queue:
+                        policy.sleep(wait_for)
+                    continue
+                done, _ = wait(running, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    group, attempt = running.pop(future)
+                    name = '+'.join(group)
+                    try:
+                        results.update(future.result())
+                        policy.record_success(host)
+                        continue
+                    except Exception as e:
+                        error = e
+                    delay = policy.next_delay(attempt, error, host)
+                    if delay is None:
+                        logger.error(f"Failed to fetch {name} after {attempt} attempts: {error}")
+                    else:
+                        logger.warning(f"Attempt {attempt} error for {name}: {error}; "
+                                       f"retrying in {delay:.1f}s")
+                        heapq.heappush(queue, (policy.clock() + delay, sequence, group, attempt + 1))
+                        sequence += 1
         return results
 
     def extract_titles(self, content):
@@ -220,36 +404,18 @@ class ArxivClient:
         """
         Extracts the PDF URL from an arXiv abstract page URL using the arXiv API.
 
+        Goes through the client's metadata resolver, so the answer is cached and
+        a paper is never looked up twice. For many papers, call
+        `self.metadata.resolve(ids)` once instead.
+
         Args:
             arxiv_url (str): The URL of the arXiv abstract page.
 
         Returns:
             str: The URL of the PDF, or None if not found.
         """
-        match = re.search(r'abs/([\w\.\/]+)', arxiv_url)
-        if not match:
-            return None
-        arxiv_id = match.group(1)
-
-        api_url = f'http://export.arxiv.org/api/query?id_list={arxiv_id}'
-
-        try:
-            with libreq.urlopen(api_url) as response:
-                xml_content = response.read()
-
-            tree = ET.fromstring(xml_content)
-
-            namespaces = {
-                'atom': 'http://www.w3.org/2005/Atom',
-                'arxiv': 'http://arxiv.org/schemas/atom'
-            }
-
-            for entry in tree.findall('atom:entry', namespaces):
-                for link in entry.findall('atom:link', namespaces):
-                    if link.get('rel') == 'related' and link.get('title') == 'pdf':
-                        return link.get('href')
-            return None
-
-        except Exception as e:
-            logger.error(f"An unexpected error occurred {e}")
+        arxiv_id = arxiv_id_from_url(arxiv_url)
+        if not arxiv_id:
             return None
+        record = self.metadata.resolve([arxiv_id]).get(arxiv_id)
+        return record.pdf_url if record else None
@@ -0,0 +1,158 @@
+"""Bulk arXiv metadata lookup through the export API, with a persistent cache.
+
+Ids are resolved in chunks via `id_list=`, so a whole day's papers take a few
+requests instead of one per paper, and every resolved id is stored in a local
+SQLite cache so it is never looked up twice.
+"""
+import json
+import logging
+import re
+import sqlite3
+import threading
+import urllib.parse
+import xml.etree.ElementTree as ET
+from dataclasses import asdict, dataclass
+
+from api.http_session import open_url
+from api.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+_ATOM_NS = {
+    'atom': 'http://www.w3.org/2005/Atom',
+    'arxiv': 'http://arxiv.org/schemas/atom',
+}
+_ENTRY_ID_RE = re.compile(r'/abs/([\w.\-/]+?)(?:v(\d+))?$')
+
+API_URL = 'https://export.arxiv.org/api/query'
+
+
+@dataclass(frozen=True, slots=True)
+class PaperMetadata:
+    arxiv_id: str
+    pdf_url: str = None
+    primary_category: str = None
+    categories: tuple = ()
+    version: int = None
+    published: str = None
+    updated: str = None
+
+
+class MetadataCache:
+    """arxiv_id -> PaperMetadata in SQLite. An empty path keeps it in memory."""
+
+    def __init__(self, path=''):
+        self.path = path or ':memory:'
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS paper_metadata (arxiv_id TEXT PRIMARY KEY, data TEXT NOT NULL)"
+            )
+
+    def get_many(self, ids):
+        found = {}
+        with self._lock:
+            for arxiv_id in ids:
+                row = self._conn.execute(
+                    "SELECT data FROM paper_metadata WHERE arxiv_id = ?", (arxiv_id,)
+                ).fetchone()
+                if row:
+                    data = json.loads(row[0])
+                    data['categories'] = tuple(data.get('categories') or ())
+                    found[arxiv_id] = PaperMetadata(**data)
+        return found
+
+    def put_many(self, records):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO paper_metadata (arxiv_id, data) VALUES (?, ?)",
+                [(r.arxiv_id, json.dumps(asdict(r))) for r in records],
+            )
+
+    def close(self):
+        self._conn.close()
+
+
+class ArxivMetadataResolver:
+    """Resolve arXiv ids to PaperMetadata in bulk.
+
+    Args:
+        cache: MetadataCache to read through and fill. Defaults to an in-memory one.
+        chunk_size: Ids per export-API request.
+        requests_per_second: Pacing for the export API (arXiv asks for one
+            request every three seconds).
+        timeout: Per-request timeout in seconds.
+        session: Optional shared HttpSession.
+    """
+
+    def __init__(self, cache=None, chunk_size=100, requests_per_second=1 / 3, timeout=30, session=None):
+        self.cache = cache if cache is not None else MetadataCache()
+        self.session = session
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.rate_limiter = TokenBucket(requests_per_second, capacity=1)
+        self.requests_made = 0
+
+    def resolve(self, ids):
+        """Return {arxiv_id: PaperMetadata} for every id the API knows.
+
+        Cached ids cost nothing; the rest are fetched `chunk_size` at a time.
+        Ids that fail to resolve are left out and not cached.
+        """
+        ids = list(dict.fromkeys(i for i in ids if i))
+        results = self.cache.get_many(ids)
+        missing = [i for i in ids if i not in results]
+        for start in range(0, len(missing), self.chunk_size):
+            chunk = missing[start:start + self.chunk_size]
+            try:
+                fetched = self._fetch_chunk(chunk)
+            except Exception as e:
+                logger.error(f"arXiv metadata lookup failed for {len(chunk)} ids: {e}")
+                continue
+            self.cache.put_many(fetched.values())
+            results.update(fetched)
+        return results
+
+    def _fetch_chunk(self, ids):
+        query = urllib.parse.urlencode({'id_list': ','.join(ids), 'max_results': len(ids)})
+        self.rate_limiter.acquire()
+        self.requests_made += 1
+        with open_url(f'{API_URL}?{query}', timeout=self.timeout, session=self.session) as response:
+            root = ET.fromstring(response.read())
+
+        records = {}
+        # The API answers id_list queries in request order, which lets entries
+        # without a usable <id> still be matched to the id that was asked for.
+        for requested, entry in zip(ids, root.findall('atom:entry', _ATOM_NS)):
+            record = self._parse_entry(entry, requested)
+            if record and record.arxiv_id in ids:
+                records[record.arxiv_id] = record
+        return records
+
+    @staticmethod
+    def _parse_entry(entry, requested_id):
+        arxiv_id, version = requested_id, None
+        match = _ENTRY_ID_RE.search((entry.findtext('atom:id', '', _ATOM_NS) or '').strip())
+        if match:
+            arxiv_id = match.group(1)
+            version = int(match.group(2)) if match.group(2) else None
+        elif entry.findtext('atom:title', '', _ATOM_NS).strip() == 'Error':
+            return None
+
+        pdf_url = None
+        for link in entry.findall('atom:link', _ATOM_NS):
+            if link.get('title') == 'pdf':
+                pdf_url = link.get('href')
+                break
+
+        primary = entry.find('arxiv:primary_category', _ATOM_NS)
+        return PaperMetadata(
+            arxiv_id=arxiv_id,
+            pdf_url=pdf_url,
+            primary_category=primary.get('term') if primary is not None else None,
+            categories=tuple(c.get('term') for c in entry.findall('atom:category', _ATOM_NS) if c.get('term')),
+            version=version,
+            published=(entry.findtext('atom:published', None, _ATOM_NS) or None),
+            updated=(entry.findtext('atom:updated', None, _ATOM_NS) or None),
+        )
@@ -0,0 +1,139 @@
+"""Batch-job execution of summarization plans for the nightly run.
+
+The nightly run has no interactive latency requirement, so instead of one
+generate_content call per batch it can submit every category's calls for a
+round as one asynchronous batch job (higher throughput limits, lower price),
+poll until the job finishes and feed the outputs back into each plan. Plans
+advance in lockstep: round one is every paper batch of every category, round
+two every first-level combine, and so on (see Agent._summary_plan).
+
+The job API is the backend's submit_batch / batch_state / batch_results /
+cancel_batch; FakeBackend implements it locally for tests and benchmarks.
+"""
+import logging
+import time
+
+from api.agent import SYSTEM_INSTRUCTION, planned_call
+from api.settings import LLM_BATCH_POLL_SECONDS, LLM_BATCH_TIMEOUT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class BatchJobRunner:
+    """Drives many plans, one batch job per round.
+
+    Calls already in the Agent's LLM cache are answered from it and not
+    submitted. Calls whose job returns no output for them are retried
+    interactively through the Agent. After a job fails or times out, the
+    remaining rounds skip batch jobs altogether, so a struggling batch service
+    degrades to the normal path instead of losing categories.
+
+    Args:
+        agent: The Agent whose backend, cache and plans are used.
+        poll_interval: Seconds between job status checks.
+        timeout: Seconds to wait for one job before cancelling it.
+        clock, sleep: Injectable for tests.
+    """
+
+    def __init__(self, agent, poll_interval=LLM_BATCH_POLL_SECONDS, timeout=LLM_BATCH_TIMEOUT_SECONDS,
+                 clock=time.monotonic, sleep=time.sleep):
+        if not hasattr(agent.backend, 'submit_batch'):
+            raise ValueError(f"LLM backend {type(agent.backend).__name__} has no batch-job API")
+        self.agent = agent
+        self.backend = agent.backend
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.clock = clock
+        self.sleep = sleep
+        self.jobs = 0
+        self.degraded = False
+
+    def run(self, plans):
+        """Run plans (key -> plan generator) to completion. Returns {key: result}."""
+        results = {}
+        pending = {}
+        for key, plan in plans.items():
+            self._advance(key, plan, None, pending, results)
+
+        while pending:
+            calls = [(key, call) for key, (_, plan_calls) in pending.items() for call in plan_calls]
+            outputs = self._execute([call for _, call in calls])
+            by_key = {key: [] for key in pending}
+            for (key, _), output in zip(calls, outputs):
+                by_key[key].append(output)
+            advancing, pending = pending, {}
+            for key, (plan, _) in advancing.items():
+                self._advance(key, plan, by_key[key], pending, results)
+        return results
+
+    @staticmethod
+    def _advance(key, plan, outputs, pending, results):
+        try:
+            calls = next(plan) if outputs is None else plan.send(outputs)
+            while not calls:  # a round with nothing to call
+                calls = plan.send([])
+            pending[key] = (plan, calls)
+        except StopIteration as done:
+            results[key] = done.value
+
+    def _execute(self, calls):
+        """Outputs for a round of planned calls (see planned_call), in order."""
+        requests = []
+        for prompt, prefix, max_tokens in map(planned_call, calls):
+            requests.append((prefix + prompt, SYSTEM_INSTRUCTION, self.agent._llm_config(max_tokens)))
+        outputs = [None] * len(calls)
+        to_submit = []
+        for i, (full_prompt, _, config) in enumerate(requests):
+            key = self.agent._cache_key(full_prompt, config)
+            cached = self.agent.cache.get(key) if key else None
+            if cached is not None:
+                outputs[i] = cached
+            else:
+                to_submit.append(i)
+
+        if to_submit and not self.degraded:
+            for i, result in zip(to_submit, self._run_job([requests[i] for i in to_submit])):
+                if result is not None and result.text:
+                    outputs[i] = result.text
+                    full_prompt, _, config = requests[i]
+                    key = self.agent._cache_key(full_prompt, config)
+                    if key:
+                        self.agent.cache.put(key, result.text, model=self.backend.model)
+
+        missing = [i for i, output in enumerate(outputs) if output is None]
+        if missing:
+            logger.warning(f"Making {len(missing)} of {len(calls)} calls directly")
+            for i, output in zip(missing, self.agent._run_plan(_one_round([calls[i] for i in missing]))):
+                outputs[i] = output
+        return outputs
+
+    def _run_job(self, requests):
+        """Submit one job and wait for it. Returns per-request results (None where missing)."""
+        job = self.backend.submit_batch(requests)
+        self.jobs += 1
+        logger.info(f"Submitted batch job {job} with {len(requests)} requests")
+        deadline = self.clock() + self.timeout
+        while True:
+            state = self.backend.batch_state(job)
+            if state == 'succeeded':
+                logger.info(f"Batch job {job} succeeded")
+                return self.backend.batch_results(job)
+            if state == 'failed':
+                logger.error(f"Batch job {job} failed; making the remaining calls directly")
+                self.degraded = True
+                return [None] * len(requests)
+            if self.clock() >= deadline:
+                logger.error(f"Batch job {job} still {state} after {self.timeout}s; cancelling it "
+                             f"and making the remaining calls directly")
+                self.degraded = True
+                try:
+                    self.backend.cancel_batch(job)
+                except Exception as e:
+                    logger.warning(f"Could not cancel batch job {job}: {e}")
+                return [None] * len(requests)
+            self.sleep(self.poll_interval)
+
+
+def _one_round(calls):
+    """A plan that makes one round of calls and returns their outputs."""
+    return (yield calls)
@@ -0,0 +1,215 @@
+"""Offline benchmarks for the pipeline.
+
+Usage:
+    PYTHONPATH=. python -m api.bench parse [--items 2000] [--repeat 3]
+    PYTHONPATH=. python -m api.bench fetch [--categories 5 50 155] [--latency 0.05 0.3] [--combined]
+    PYTHONPATH=. python -m api.bench pipeline [--papers 10000] [--categories 155] [--latency 0.3 1.5]
+"""
+import argparse
+import io
+import json
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+from api.agent import Agent
+from api.arxiv_client import ArxivClient
+from api.feeds import generate_category_blurbs
+from api.http_session import HttpSession
+from api.llm_backend import FakeBackend
+from api.ratelimit import RateLimiter
+from api.replay import ReplayServer, synthetic_feed
+from api.retry import RetryPolicy
+from api.rss_parser import BACKENDS, lxml_etree, parse_entries
+from api.settings import BLURB_CONCURRENCY, FETCH_CONCURRENCY, FETCH_REQUESTS_PER_SECOND, LLM_MAX_CONCURRENCY
+
+CATEGORIES_JSON = Path(__file__).resolve().parent.parent / 'app' / 'data' / 'categories.json'
+
+def _parse_tree(document, process_entry):
+    """The pre-streaming approach: full tree, pubDate parsed twice per item."""
+    items = ET.fromstring(document).findall('.//item')
+    dates = []
+    for item in items:
+        try:
+            dates.append(parsedate_to_datetime(item.findtext('pubDate')).date())
+        except Exception:
+            pass
+    latest = max(dates) if dates else None
+    papers = []
+    for item in items:
+        try:
+            if latest and parsedate_to_datetime(item.findtext('pubDate')).date() != latest:
+                continue
+        except Exception:
+            pass
+        papers.append(process_entry(item))
+    return papers
+
+
+def _measure(fn, repeat):
+    """Best-of-`repeat` wall time, then peak traced memory from one extra run.
+
+    Timing runs are untraced; tracemalloc slows allocation-heavy code severalfold.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def bench_parse(items, repeat):
+    client = ArxivClient([])
+    document = synthetic_feed('cs.LG', items)
+    print(f'Feed: {items} items, {len(document) / 1e6:.2f} MB')
+    print(f'{"parser":<18}{"best time (ms)":>16}{"peak memory (MB)":>20}')
+
+    cases = [('tree (2-pass)', lambda: _parse_tree(document, client._process_paper_entry))]
+    for backend in BACKENDS:
+        if backend == 'lxml' and lxml_etree is None:
+            continue
+        cases.append((f'stream ({backend})',
+                      lambda b=backend: parse_entries(io.BytesIO(document), client._process_paper_entry, b)))
+
+    # tracemalloc only sees Python allocations, so lxml's C-level tree is not
+    # counted in its peak; compare lxml on time only.
+    for name, fn in cases:
+        seconds, peak = _measure(fn, repeat)
+        print(f'{name:<18}{seconds * 1000:>16.1f}{peak / 1e6:>20.2f}')
+
+
+def _seeded_slugs(count):
+    """The first `count` seeded category slugs (synthetic names past the seed list)."""
+    try:
+        slugs = [c['slug'] for c in json.loads(CATEGORIES_JSON.read_text())]
+    except OSError:
+        slugs = []
+    return (slugs + [f'synthetic.{i}' for i in range(len(slugs), count)])[:count]
+
+
+def bench_fetch(counts, latency, error_rate, rate_limit_rate, combined, workers, rps, items, recordings):
+    print(f'Replay server: latency {latency[0]}-{latency[1]}s, errors {error_rate:.0%}, '
+          f'429s {rate_limit_rate:.0%}; client: {workers} workers, {rps} req/s, '
+          f'{"combined" if combined else "per-slug"} feeds')
+    print(f'{"categories":>10}{"wall (s)":>10}{"requests":>10}{"MB":>8}{"conns":>7}{"papers":>8}  statuses')
+    for count in counts:
+        with ReplayServer(recordings_dir=recordings, items_per_feed=items, latency=tuple(latency),
+                          error_rate=error_rate, rate_limit_rate=rate_limit_rate, retry_after=0) as server:
+            session = HttpSession(max_per_host=workers)
+            client = ArxivClient([], max_workers=workers, requests_per_second=rps, combined=combined,
+                                 session=session, retry_policy=RetryPolicy(base_delay=0.2))
+            client.base_url = server.base_url
+            slugs = _seeded_slugs(count)
+
+            start = time.perf_counter()
+            results = client.retrieve_results_by_category(slugs)
+            elapsed = time.perf_counter() - start
+
+            stats = server.stats()
+            papers = sum(len(p) for p in results.values())
+            print(f'{count:>10}{elapsed:>10.2f}{stats["requests"]:>10}{stats["bytes"] / 1e6:>8.1f}'
+                  f'{session.stats()["connections_opened"]:>7}{papers:>8}  {stats["status"]}')
+            session.close()
+
+
+def _synthetic_papers(slugs, n_papers):
+    """{slug: [Paper]} with n_papers spread evenly over slugs, parsed from synthetic feeds."""
+    client = ArxivClient([])
+    per_slug, extra = divmod(n_papers, len(slugs))
+    papers_by_category = {}
+    for i, slug in enumerate(slugs):
+        document = synthetic_feed(slug, per_slug + (i < extra), stale_fraction=0)
+        papers_by_category[slug] = [paper for _, _, paper in
+                                    parse_entries(io.BytesIO(document), client._process_paper_entry)]
+    return papers_by_category
+
+
+def bench_pipeline(n_papers, n_categories, latency, rate_limit_rate, output_tokens, concurrency,
+                   blurb_concurrency, rpm, tpm, pack_tokens=0, stall_rate=0.0, hedge=False):
+    slugs = _seeded_slugs(n_categories)
+    papers_by_category = _synthetic_papers(slugs, n_papers)
+    backend = FakeBackend(latency=tuple(latency), rate_limit_rate=rate_limit_rate, output_tokens=output_tokens,
+                          stall_rate=stall_rate)
+    agent = Agent(backend=backend, rate_limiter=RateLimiter(rpm, tpm), max_concurrency=concurrency)
+    agent.pack_small_category_tokens = pack_tokens
+    agent.hedge = hedge
+    print(f'{sum(map(len, papers_by_category.values()))} papers in {len(slugs)} categories; '
+          f'fake LLM latency median {latency[0]}s / p95 {latency[1]}s, 429s {rate_limit_rate:.0%}; '
+          f'{concurrency} in-flight calls, {blurb_concurrency} categories at once, '
+          f'quota {rpm or "unlimited"} RPM / {tpm or "unlimited"} TPM; '
+          f'packing categories under {pack_tokens or "(off)"} tokens; '
+          f'{stall_rate:.0%} of calls stall, hedging {"on" if hedge else "off"}')
+
+    with tempfile.TemporaryDirectory() as content_dir:
+        start = time.perf_counter()
+        written = generate_category_blurbs(papers_by_category, agent, content_dir, '2025-01-14',
+                                           max_concurrency=blurb_concurrency)
+        elapsed = time.perf_counter() - start
+
+    usage = backend.usage()
+    stats = agent.call_stats()
+    print(f'{"wall (s)":>10}{"blurbs":>8}{"calls":>8}{"errors":>8}{"input tok":>12}{"output tok":>12}'
+          f'{"hedges":>8}{"timeouts":>10}')
+    print(f'{elapsed:>10.2f}{len(written):>8}{usage["calls"]:>8}{usage["errors"]:>8}'
+          f'{usage["input_tokens"]:>12}{usage["output_tokens"]:>12}{stats["hedges"]:>8}{stats["timeouts"]:>10}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m api.bench', description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    parse_cmd = commands.add_parser('parse', help='RSS parse time and peak memory on a large synthetic feed')
+    parse_cmd.add_argument('--items', type=int, default=2000)
+    parse_cmd.add_argument('--repeat', type=int, default=3)
+
+    fetch_cmd = commands.add_parser('fetch', help='ArxivClient against a local replay server')
+    fetch_cmd.add_argument('--categories', type=int, nargs='+', default=[5, 50, 155])
+    fetch_cmd.add_argument('--latency', type=float, nargs=2, default=[0.05, 0.3], metavar=('MIN', 'MAX'))
+    fetch_cmd.add_argument('--error-rate', type=float, default=0.02)
+    fetch_cmd.add_argument('--rate-limit-rate', type=float, default=0.02)
+    fetch_cmd.add_argument('--combined', action='store_true', help='use combined multi-category feeds')
+    fetch_cmd.add_argument('--workers', type=int, default=FETCH_CONCURRENCY)
+    fetch_cmd.add_argument('--rps', type=float, default=FETCH_REQUESTS_PER_SECOND,
+                           help='client politeness budget (requests/second)')
+    fetch_cmd.add_argument('--items', type=int, default=None, help='items per synthetic feed (default varies)')
+    fetch_cmd.add_argument('--recordings', default=None, help='directory of recorded <feed>.xml files')
+
+    pipeline_cmd = commands.add_parser('pipeline', help='category blurbs end to end against a fake LLM backend')
+    pipeline_cmd.add_argument('--papers', type=int, default=10000)
+    pipeline_cmd.add_argument('--categories', type=int, default=155)
+    pipeline_cmd.add_argument('--latency', type=float, nargs=2, default=[0.3, 1.5], metavar=('MEDIAN', 'P95'))
+    pipeline_cmd.add_argument('--rate-limit-rate', type=float, default=0.0)
+    pipeline_cmd.add_argument('--output-tokens', type=int, default=800)
+    pipeline_cmd.add_argument('--concurrency', type=int, default=LLM_MAX_CONCURRENCY, help='in-flight LLM calls')
+    pipeline_cmd.add_argument('--blurb-concurrency', type=int, default=BLURB_CONCURRENCY)
+    pipeline_cmd.add_argument('--rpm', type=int, default=0, help='requests/minute quota (0: unlimited)')
+    pipeline_cmd.add_argument('--tpm', type=int, default=0, help='tokens/minute quota (0: unlimited)')
+    pipeline_cmd.add_argument('--pack-tokens', type=int, default=0,
+                              help='pack categories up to this many tokens into shared calls (0: off)')
+    pipeline_cmd.add_argument('--stall-rate', type=float, default=0.0, help='share of fake calls that hang')
+    pipeline_cmd.add_argument('--hedge', action='store_true', help='hedge calls slower than the observed p95')
+
+    args = parser.parse_args(argv)
+    if args.command == 'parse':
+        bench_parse(args.items, args.repeat)
+    elif args.command == 'fetch':
+        bench_fetch(args.categories, args.latency, args.error_rate, args.rate_limit_rate, args.combined,
+                    args.workers, args.rps, args.items, args.recordings)
+    elif args.command == 'pipeline':
+        bench_pipeline(args.papers, args.categories, args.latency, args.rate_limit_rate, args.output_tokens,
+                       args.concurrency, args.blurb_concurrency, args.rpm, args.tpm, args.pack_tokens,
+                       args.stall_rate, args.hedge)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Prompt compaction for per-paper blocks.
+
+Paper blocks are most of every summarization prompt, and much of a raw block
+is noise to the model: 40-name author lists, LaTeX markup, hard line breaks,
+full URLs. PromptCompactor renders a smaller block (capped authors, plain-text
+abstract trimmed to a token budget, bare arXiv id instead of the URL) and
+counts the tokens it saved. expand_arxiv_links turns the bare ids the model
+then cites back into full links.
+"""
+import re
+import threading
+
+from api.digests import paper_key
+from api.paper import format_paper
+from api.settings import PROMPT_ABSTRACT_TOKENS, PROMPT_MAX_AUTHORS, PROMPT_SHORT_URLS
+from api.tokens import TokenCounter
+
+ABS_URL = 'https://arxiv.org/abs/'
+
+_MATH_RE = re.compile(r'\$+([^$]*)\$+')
+_LATEX_ARG_RE = re.compile(r'\\(?:text\w*|math\w*|emph|textbf|textit|operatorname|mbox)\s*\{([^{}]*)\}')
+_LATEX_CMD_RE = re.compile(r'\\([A-Za-z]+)')
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+')
+_ARXIV_ID = r'(?:\d{4}\.\d{4,5}|[a-z\-]+(?:\.[A-Z]{2})?/\d{7})(?:v\d+)?'
+_BARE_LINK_RE = re.compile(r'\]\(\s*(?:arXiv:)?(' + _ARXIV_ID + r')\s*\)')
+
+
+def strip_latex(text):
+    """Plain text from an abstract with inline LaTeX; also collapses whitespace.
+
+    Math keeps its content without the markup ($\\mathcal{O}(n^2)$ -> O(n^2)),
+    styling commands keep their argument and other commands keep their name
+    (\\alpha -> alpha), which is what the model needs to read the sentence.
+    """
+    text = _MATH_RE.sub(r'\1', text)
+    for _ in range(3):  # nested arguments, innermost first
+        text = _LATEX_ARG_RE.sub(r'\1', text)
+    text = _LATEX_CMD_RE.sub(r'\1', text)
+    text = text.replace('{', '').replace('}', '').replace('~', ' ')
+    return ' '.join(text.split())
+
+
+def cap_authors(authors, max_authors):
+    """The first `max_authors` names, plus "et al." when there are more (0: no cap)."""
+    authors = list(authors)
+    if max_authors and len(authors) > max_authors:
+        return authors[:max_authors] + ['et al.']
+    return authors
+
+
+def expand_arxiv_links(text):
+    """Turn markdown links whose target is a bare arXiv id into full abs links."""
+    return _BARE_LINK_RE.sub(lambda m: f']({ABS_URL}{m.group(1)})', text or '')
+
+
+class PromptCompactor:
+    """Renders compact paper blocks and keeps a running count of tokens saved.
+
+    Args:
+        max_authors: Authors kept before "et al." (0: keep all).
+        abstract_tokens: Per-paper abstract budget in tokens (0: no trim). Trims
+            at a sentence boundary where one fits.
+        short_urls: Send the bare arXiv id instead of the URL.
+        token_counter: TokenCounter used for budgets and savings.
+    """
+
+    def __init__(self, max_authors=PROMPT_MAX_AUTHORS, abstract_tokens=PROMPT_ABSTRACT_TOKENS,
+                 short_urls=PROMPT_SHORT_URLS, token_counter=None):
+        self.max_authors = max_authors
+        self.abstract_tokens = abstract_tokens
+        self.short_urls = short_urls
+        self.token_counter = token_counter or TokenCounter()
+        self._blocks = {}
+        self._lock = threading.Lock()
+        self._stats = {'papers': 0, 'tokens_before': 0, 'tokens_after': 0}
+
+    def _trim(self, text):
+        if not self.abstract_tokens or self.token_counter.count(text) <= self.abstract_tokens:
+            return text
+        kept = ''
+        for sentence in _SENTENCE_END_RE.split(text):
+            candidate = f'{kept} {sentence}'.strip()
+            if self.token_counter.count(candidate) > self.abstract_tokens:
+                break
+            kept = candidate
+        if kept:
+            return kept
+        # A single over-long sentence: keep as many words as fit.
+        words = text.split()
+        low, high = 0, len(words)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self.token_counter.count(' '.join(words[:mid])) <= self.abstract_tokens:
+                low = mid
+            else:
+                high = mid - 1
+        return ' '.join(words[:low]) + ' …'
+
+    def render(self, paper, summary=None, ref=None):
+        """The compact block for a paper; `summary` overrides its abstract (e.g. a digest).
+
+        `ref` labels the block instead of a URL (see api.references). Blocks are
+        memoized, and savings are counted once per distinct block.
+        """
+        summary = paper['summary'] if summary is None else summary
+        cache_key = (paper_key(paper), summary, ref)
+        block = self._blocks.get(cache_key)
+        if block is not None:
+            return block
+
+        key = cache_key[0]
+        url = key if self.short_urls and key != paper['url'] else paper['url']
+        block = format_paper(
+            ' '.join(paper['title'].split()),
+            url,
+            cap_authors(paper['authors'], self.max_authors),
+            self._trim(strip_latex(summary)),
+            ref=ref,
+        )
+        before = self.token_counter.count(format_paper(paper['title'], paper['url'], paper['authors'], summary))
+        after = self.token_counter.count(block)
+        with self._lock:
+            if cache_key not in self._blocks:
+                self._blocks[cache_key] = block
+                self._stats['papers'] += 1
+                self._stats['tokens_before'] += before
+                self._stats['tokens_after'] += after
+        return block
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['tokens_saved'] = stats['tokens_before'] - stats['tokens_after']
+        return stats
@@ -0,0 +1,138 @@
+"""Per-paper digests shared across category prompts.
+
+A paper cross-listed in several categories used to be sent to the LLM in full
+once per category. The DigestStore holds one compact synopsis per arXiv id,
+built once per day (extractively from the abstract, or by a short LLM pass),
+and the Agent renders category prompts from those digests instead of full
+abstracts.
+"""
+import logging
+import re
+import sqlite3
+import threading
+
+from api.paper import Paper
+from api.settings import DIGEST_MAX_CHARS
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+(?=[A-Z$\\(\[])')
+_DIGEST_LINE_RE = re.compile(r'^\s*(?:[-*]\s*)?\[?([\w.\-/]+?)\]?\s*:\s*(.+?)\s*$')
+
+
+def paper_key(paper):
+    """The arXiv id of a Paper record or paper dict (its URL if it has no id)."""
+    return Paper.from_dict(paper).arxiv_id
+
+
+def extractive_digest(summary, max_chars=DIGEST_MAX_CHARS):
+    """Leading sentences of an abstract, up to max_chars.
+
+    Abstracts front-load the problem and contribution, so the opening sentences
+    are a fair synopsis. The first sentence is always kept, cut at a word
+    boundary if it alone is too long.
+    """
+    text = ' '.join(summary.split())
+    digest = ''
+    for sentence in _SENTENCE_END_RE.split(text):
+        candidate = f'{digest} {sentence}'.strip()
+        if digest and len(candidate) > max_chars:
+            break
+        digest = candidate
+    if len(digest) > max_chars:
+        digest = digest[:max_chars].rsplit(' ', 1)[0] + '…'
+    return digest
+
+
+def parse_digest_lines(text, ids):
+    """{arxiv_id: synopsis} from "<id>: <synopsis>" lines, keeping only the ids asked for."""
+    wanted = set(ids)
+    digests = {}
+    for line in (text or '').splitlines():
+        match = _DIGEST_LINE_RE.match(line)
+        if match and match.group(1) in wanted and match.group(2):
+            digests[match.group(1)] = match.group(2)
+    return digests
+
+
+class DigestStore:
+    """arxiv_id -> digest for one day, in SQLite. An empty path keeps it in memory.
+
+    Digests from other days are dropped when the store is opened, so a rerun on
+    the same day reuses its digests and the next day starts fresh.
+
+    Args:
+        path: SQLite file, or '' for an in-memory store.
+        date: Day the digests belong to (YYYY-MM-DD).
+        summarize: Optional callable(papers) -> {arxiv_id: digest} (e.g.
+            Agent.digest_papers). Papers it leaves out get extractive digests.
+        max_chars: Length bound for extractive digests.
+    """
+
+    def __init__(self, path='', date='', summarize=None, max_chars=DIGEST_MAX_CHARS):
+        self.path = path or ':memory:'
+        self.date = date
+        self.summarize = summarize
+        self.max_chars = max_chars
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS paper_digests "
+                "(arxiv_id TEXT PRIMARY KEY, day TEXT NOT NULL, digest TEXT NOT NULL)"
+            )
+            self._conn.execute("DELETE FROM paper_digests WHERE day != ?", (date,))
+            self._digests = dict(self._conn.execute("SELECT arxiv_id, digest FROM paper_digests"))
+        self.built = 0
+        self.reused = 0
+
+    def build(self, papers):
+        """Make sure every paper has a digest; each arXiv id is digested once.
+
+        Returns:
+            Number of digests built by this call.
+        """
+        with self._lock:
+            missing = {}
+            for paper in papers:
+                key = paper_key(paper)
+                if key in self._digests or key in missing:
+                    self.reused += 1
+                else:
+                    missing[key] = paper
+            if not missing:
+                return 0
+
+            digests = {}
+            if self.summarize:
+                try:
+                    digests = self.summarize(list(missing.values()))
+                except Exception as e:
+                    logger.error(f"LLM digests failed for {len(missing)} papers; using extractive digests: {e}")
+            for key, paper in missing.items():
+                if not digests.get(key):
+                    digests[key] = extractive_digest(paper['summary'], self.max_chars)
+
+            rows = [(key, self.date, digests[key]) for key in missing]
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO paper_digests (arxiv_id, day, digest) VALUES (?, ?, ?)", rows)
+            self._digests.update((key, digests[key]) for key in missing)
+            self.built += len(missing)
+            logger.info(f"Built {len(missing)} paper digests ({len(self._digests)} for {self.date})")
+            return len(missing)
+
+    def get(self, arxiv_id, default=None):
+        return self._digests.get(arxiv_id, default)
+
+    def __contains__(self, arxiv_id):
+        return arxiv_id in self._digests
+
+    def __len__(self):
+        return len(self._digests)
+
+    def stats(self):
+        return {'digests': len(self._digests), 'built': self.built, 'reused': self.reused}
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,106 @@
+"""On-disk HTTP validator cache for RSS feeds (conditional GET).
+
+For each feed URL the cache keeps only the ETag / Last-Modified validators and
+when that version of the feed was first seen, never feed content: raw feeds
+are not persisted across runs (docs/PHASE1_SPEC.md). Requests are conditional
+only for a version first seen on an earlier day, so a 304 Not Modified means
+the feed's papers were already summarized then and the run can skip the feed
+without downloading or parsing it. arXiv feeds do not change over weekends and
+holidays, so those runs become nearly free. A same-day rerun downloads in full,
+since it may still have work to finish for that content.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+from api.feeds import FEED_TZ
+
+logger = logging.getLogger(__name__)
+
+
+class FeedValidatorCache:
+    """Validators and first-seen time per feed URL, one small JSON file each.
+
+    Args:
+        directory: Where cache files live; created on first write.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def _path(self, url):
+        return self.directory / f"{hashlib.sha256(url.encode()).hexdigest()[:32]}.json"
+
+    def _load(self, url):
+        path = self._path(url)
+        try:
+            with open(path, encoding='utf-8') as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable feed cache entry {path}: {e}")
+            return None
+        return record if record.get('url') == url else None
+
+    def request_headers(self, url, seen_before=None):
+        """Conditional-request headers for url.
+
+        Args:
+            url: Feed URL.
+            seen_before: Day (YYYY-MM-DD, New York); headers are only sent for a
+                version first seen before it. None sends them for any version.
+
+        Returns:
+            Dict of headers, empty for an unconditional request.
+        """
+        record = self._load(url)
+        if not record:
+            return {}
+        first_seen = datetime.fromisoformat(record['first_seen']).astimezone(FEED_TZ).strftime("%Y-%m-%d")
+        if seen_before is not None and first_seen >= seen_before:
+            return {}
+        headers = {}
+        if record.get('etag'):
+            headers['If-None-Match'] = record['etag']
+        if record.get('last_modified'):
+            headers['If-Modified-Since'] = record['last_modified']
+        return headers
+
+    def first_seen(self, url):
+        """UTC ISO time the stored version of url was first downloaded, or None."""
+        record = self._load(url)
+        return record['first_seen'] if record else None
+
+    def store(self, url, headers):
+        """Save url's validators from a full download. No-op if the server sent none.
+
+        A download with the same validators as the stored ones is the same
+        version, so it keeps its original first-seen time.
+        """
+        etag = headers.get('ETag') if headers is not None else None
+        last_modified = headers.get('Last-Modified') if headers is not None else None
+        if not etag and not last_modified:
+            return
+        previous = self._load(url)
+        same = previous and (previous.get('etag'), previous.get('last_modified')) == (etag, last_modified)
+        record = {
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'first_seen': previous['first_seen'] if same else datetime.now(timezone.utc).isoformat(),
+        }
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Write-then-rename so a crash never leaves a half-written cache file.
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(record, f)
+            os.replace(tmp, self._path(url))
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
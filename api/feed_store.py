@@ -0,0 +1,44 @@
+"""Per-run store of parsed RSS feeds.
+
+The blog flow and the per-category flow in api.main both need the fixed public
+categories. The store lets every slug be downloaded and parsed once per run,
+with whichever flow asks second served from memory.
+"""
+import threading
+
+
+class FeedStore:
+    """Thread-safe in-memory map of slug -> list of papers, with hit/miss counts."""
+
+    def __init__(self):
+        self._feeds = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, slug):
+        """Return the stored papers for slug (counted as a hit), or None (a miss)."""
+        with self._lock:
+            papers = self._feeds.get(slug)
+            if papers is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return papers
+
+    def put(self, slug, papers):
+        with self._lock:
+            self._feeds[slug] = papers
+
+    def __contains__(self, slug):
+        with self._lock:
+            return slug in self._feeds
+
+    def __len__(self):
+        with self._lock:
+            return len(self._feeds)
+
+    def stats(self):
+        """Counters for the run log."""
+        with self._lock:
+            return {'feeds': len(self._feeds), 'hits': self.hits, 'misses': self.misses}
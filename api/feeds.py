@@ -5,12 +5,14 @@ CONTENT_DIR/<NY-date>/<slug>.md, which the app's /feed page renders. This is
 separate from (and additive to) the public Jekyll blog flow.
 """
 import logging
+import os
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
 from zoneinfo import ZoneInfo
 
-from api.settings import FIXED_PUBLIC_CATEGORIES
+from api.settings import BLURB_CONCURRENCY, FIXED_PUBLIC_CATEGORIES
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +24,26 @@ def today_ny():
     return datetime.now(FEED_TZ).strftime("%Y-%m-%d")
 
 
+def already_seen_feeds(unchanged_feeds, date):
+    """Slugs whose feed answered 304 and whose content was first seen before `date`.
+
+    Their papers were already summarized on an earlier day, so today's run can
+    skip them. Content first seen earlier *today* is not included: a same-day
+    rerun after a partial failure must still be able to finish the work.
+
+    Args:
+        unchanged_feeds: ArxivClient.unchanged_feeds (slug -> UTC ISO first-seen).
+        date: Day being produced (YYYY-MM-DD, New York), typically today_ny().
+
+    Returns:
+        Set of slugs.
+    """
+    return {
+        slug for slug, first_seen in unchanged_feeds.items()
+        if datetime.fromisoformat(first_seen).astimezone(FEED_TZ).strftime("%Y-%m-%d") < date
+    }
+
+
 def get_fetch_list(app_db_path):
     """Sorted, deduped union of users' selected categories and the fixed public list.
 
@@ -54,36 +76,110 @@ def get_fetch_list(app_db_path):
     return sorted(slugs)
 
 
-def generate_category_blurbs(papers_by_category, agent, content_dir, date):
+def _write_blurb(day_dir, slug, blurb):
+    """Write one blurb atomically, so the feed never renders a half-written file."""
+    day_dir.mkdir(parents=True, exist_ok=True)
+    tmp = day_dir / f".{slug}.md.tmp"
+    tmp.write_text(blurb, encoding="utf-8")
+    os.replace(tmp, day_dir / f"{slug}.md")
+
+
+def write_category_blurbs(blurbs, content_dir, date):
+    """Write blurbs that were generated elsewhere (e.g. by a batch job).
+
+    Args:
+        blurbs: Dict mapping slug -> markdown; empty blurbs are skipped.
+        content_dir: Base content directory.
+        date: Day-dir name (YYYY-MM-DD).
+
+    Returns:
+        List of slugs that were written, in `blurbs` order.
+    """
+    day_dir = Path(content_dir) / date
+    written = []
+    for slug, blurb in blurbs.items():
+        if blurb and blurb.strip():
+            _write_blurb(day_dir, slug, blurb)
+            written.append(slug)
+    logger.info(f"Wrote {len(written)} category blurbs for {date}: {written}")
+    return written
+
+
+def generate_category_blurbs(papers_by_category, agent, content_dir, date,
+                             max_concurrency=BLURB_CONCURRENCY):
     """Generate and write one markdown blurb per non-empty category.
 
-    Writes to content_dir/<date>/<slug>.md. Empty categories produce no file
-    (the feed shows its own "no new papers today" placeholder). The day dir is
-    created only when there is at least one file to write.
+    Categories are summarized concurrently; each blurb is written to
+    content_dir/<date>/<slug>.md as soon as it is ready, so early categories go
+    live while later ones are still in flight. LLM pacing is shared: every
+    category draws from the agent's one rate limiter and in-flight call cap.
+    If the agent packs small categories (agent.pack_categories), each pack is
+    one task whose blurbs are all written when it completes. Empty categories
+    produce no file (the feed shows its own "no new papers today" placeholder).
+    The day dir is created only when there is at least one file to write.
 
     Args:
-        papers_by_category: Dict mapping slug -> list of paper dicts.
-        agent: An object with identify_important_papers(papers) -> markdown str.
+        papers_by_category: Dict mapping slug -> list of papers (Paper records or dicts).
+        agent: An object with identify_important_papers(papers) -> markdown str,
+            and optionally pack_categories / summarize_category_pack.
         content_dir: Base content directory.
         date: Day-dir name (YYYY-MM-DD), typically today_ny().
+        max_concurrency: Categories summarized at once.
 
     Returns:
-        List of slugs that were written.
+        List of slugs that were written, in papers_by_category order.
     """
     day_dir = Path(content_dir) / date
-    written = []
-    for slug, papers in papers_by_category.items():
-        if not papers:
-            continue
-        try:
-            blurb = agent.identify_important_papers(papers)
-        except Exception as e:
-            logger.error(f"Blurb generation failed for {slug}: {e}")
-            continue
-        if not blurb or not blurb.strip():
-            continue
-        day_dir.mkdir(parents=True, exist_ok=True)
-        (day_dir / f"{slug}.md").write_text(blurb, encoding="utf-8")
-        written.append(slug)
+    pending = {slug: papers for slug, papers in papers_by_category.items() if papers}
+    packs = agent.pack_categories(pending) if hasattr(agent, 'pack_categories') else []
+    packed = {slug for pack in packs for slug in pack}
+    written = set()
+    if pending:
+        tasks = len(packs) + len(pending) - len(packed)
+        workers = max(1, min(max_concurrency, tasks))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='blurb') as pool:
+            futures = {pool.submit(agent.summarize_category_pack, {slug: pending[slug] for slug in pack}): tuple(pack)
+                       for pack in packs}
+            futures.update({pool.submit(agent.identify_important_papers, papers): slug
+                            for slug, papers in pending.items() if slug not in packed})
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Blurb generation failed for {key}: {e}")
+                    continue
+                # A pack of small categories returns {slug: blurb}.
+                blurbs = result if isinstance(key, tuple) else {key: result}
+                for slug, blurb in blurbs.items():
+                    if not blurb or not blurb.strip():
+                        continue
+                    _write_blurb(day_dir, slug, blurb)
+                    written.add(slug)
+                    logger.info(f"Wrote blurb for {slug} ({len(written)}/{len(pending)})")
+    written = [slug for slug in papers_by_category if slug in written]
     logger.info(f"Wrote {len(written)} category blurbs for {date}: {written}")
     return written
+
+
+def read_category_blurbs(content_dir, date, slugs):
+    """Read the blurbs already written for `slugs` on `date`.
+
+    Args:
+        content_dir: Base content directory.
+        date: Day-dir name (YYYY-MM-DD).
+        slugs: Categories to read, in the order wanted.
+
+    Returns:
+        Dict mapping slug -> blurb text, in `slugs` order, for slugs with a
+        non-empty blurb file.
+    """
+    day_dir = Path(content_dir) / date
+    blurbs = {}
+    for slug in slugs:
+        path = day_dir / f"{slug}.md"
+        if path.exists():
+            text = path.read_text(encoding="utf-8")
+            if text.strip():
+                blurbs[slug] = text
+    return blurbs
@@ -0,0 +1,145 @@
+"""Deadlines and hedging for blocking LLM calls.
+
+A call that hangs should cost its deadline, not the run. hedged_call runs each
+attempt on a daemon thread, so an attempt that never returns is abandoned at
+the deadline instead of holding up the caller (or interpreter exit). If the
+first attempt is still out after `hedge_after` seconds (the observed p95, see
+LatencyTracker), one duplicate is sent and whichever answers first wins, so a
+slow call costs about one typical call more rather than the tail.
+"""
+import math
+import queue
+import threading
+import time
+from collections import deque
+
+
+class CallTimeoutError(TimeoutError):
+    """No attempt of a call answered before its deadline."""
+
+
+class RunBudgetExceeded(RuntimeError):
+    """The run's LLM time budget is spent; the call was not made."""
+
+
+class LatencyTracker:
+    """Rolling latency quantile of recent successful calls. Thread-safe.
+
+    Args:
+        window: Most recent latencies kept.
+        quantile: Quantile reported by threshold(), e.g. 0.95.
+        min_samples: Latencies needed before threshold() reports anything.
+    """
+
+    def __init__(self, window=200, quantile=0.95, min_samples=20):
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def threshold(self):
+        """The quantile latency in seconds, or None until min_samples are in."""
+        with self._lock:
+            if not self._latencies or len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, math.ceil(self.quantile * len(ordered)) - 1)]
+
+
+class RunBudget:
+    """Wall-clock budget for all of a run's LLM calls.
+
+    The clock starts at start() (the agent calls it before its first request),
+    so time spent before any LLM work, such as fetching feeds, is not charged.
+
+    Args:
+        seconds: Budget; 0 or None means unlimited.
+        clock: Monotonic time source; injectable for tests.
+    """
+
+    def __init__(self, seconds=0, clock=time.monotonic):
+        self.seconds = seconds
+        self._clock = clock
+        self.deadline = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the clock; later calls are no-ops."""
+        with self._lock:
+            if self.deadline is None and self.seconds:
+                self.deadline = self._clock() + self.seconds
+
+    def remaining(self):
+        """Seconds left (math.inf when unlimited, never negative)."""
+        if not self.seconds:
+            return math.inf
+        if self.deadline is None:
+            return float(self.seconds)
+        return max(0.0, self.deadline - self._clock())
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+
+def hedged_call(send, timeout=None, hedge_after=None, on_hedge=None):
+    """
+    Run send(attempt) with a deadline and at most one hedge.
+
+    Args:
+        send: Callable taking the attempt number (0 for the first, 1 for the
+            hedge) and returning the call's result.
+        timeout: Seconds until CallTimeoutError; None waits indefinitely.
+        hedge_after: Seconds after which, if the first attempt is still out, a
+            hedge is sent; None never hedges.
+        on_hedge: Called (no arguments) when the hedge is sent.
+
+    Returns:
+        (result, attempt, seconds) of the first attempt to succeed; seconds is
+        that attempt's own latency.
+
+    Raises:
+        CallTimeoutError: No attempt succeeded within `timeout`.
+        Exception: What the attempt raised, once no other attempt is out.
+    """
+    results = queue.Queue()
+
+    def attempt(n):
+        start = time.monotonic()
+        try:
+            results.put((n, send(n), None, time.monotonic() - start))
+        except Exception as e:
+            results.put((n, None, e, time.monotonic() - start))
+
+    def launch(n):
+        threading.Thread(target=attempt, args=(n,), name=f'llm-attempt-{n}', daemon=True).start()
+
+    start = time.monotonic()
+    deadline = start + timeout if timeout is not None else math.inf
+    hedge_at = start + hedge_after if hedge_after is not None else math.inf
+    launch(0)
+    out, hedged = 1, False
+    while True:
+        now = time.monotonic()
+        wait = (hedge_at if not hedged else deadline) - now
+        wait = min(wait, deadline - now)
+        try:
+            n, result, error, seconds = results.get(timeout=None if wait == math.inf else max(0.0, wait))
+        except queue.Empty:
+            if not hedged and time.monotonic() >= hedge_at and hedge_at < deadline:
+                hedged = True
+                out += 1
+                if on_hedge:
+                    on_hedge()
+                launch(1)
+                continue
+            raise CallTimeoutError(f"no answer after {timeout}s") from None
+        out -= 1
+        if error is None:
+            return result, n, seconds
+        if out == 0:
+            raise error
@@ -0,0 +1,225 @@
+"""Shared keep-alive HTTP client for outbound arXiv traffic.
+
+`urllib.request.urlopen` opens a new connection (DNS, TCP, TLS) for every
+request. HttpSession keeps idle connections per host and reuses them, caps
+concurrent connections per host, and negotiates gzip/deflate. Responses behave
+like urlopen's: file-like, usable as context managers, and any non-2xx status
+raises urllib.error.HTTPError, so callers can switch between the two freely.
+"""
+import gzip
+import http.client
+import io
+import logging
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request as libreq
+import zlib
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'paperpulse/1.0 (+https://paperpulse.ukurup.com)'
+_REDIRECTS = (301, 302, 303, 307, 308)
+_MAX_REDIRECTS = 5
+# Errors that mean a pooled connection was closed by the server while idle.
+_STALE_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError,
+                 http.client.BadStatusLine)
+
+
+class HttpResponse(io.RawIOBase):
+    """A decoded response body. Closing it returns the connection to the pool."""
+
+    def __init__(self, session, key, conn, raw, url):
+        super().__init__()
+        self._session = session
+        self._key = key
+        self._conn = conn
+        self._raw = raw
+        self.url = url
+        self.status = raw.status
+        self.code = raw.status
+        self.reason = raw.reason
+        self.headers = raw.msg
+        encoding = (raw.getheader('Content-Encoding') or '').lower()
+        if encoding == 'gzip':
+            self._body = gzip.GzipFile(fileobj=raw)
+        elif encoding == 'deflate':
+            data = raw.read()
+            try:
+                data = zlib.decompress(data)
+            except zlib.error:  # some servers send raw deflate without the zlib header
+                data = zlib.decompress(data, -zlib.MAX_WBITS)
+            self._body = io.BytesIO(data)
+        else:
+            self._body = raw
+
+    def getcode(self):
+        return self.status
+
+    def getheader(self, name, default=None):
+        return self._raw.getheader(name, default)
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        return self._body.read() if size is None or size < 0 else self._body.read(size)
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            # Drain what the caller left unread so the connection can be reused.
+            self._raw.read()
+            reusable = not self._raw.will_close
+        except Exception:
+            reusable = False
+        self._session._release(self._key, self._conn, reusable)
+        super().close()
+
+
+class HttpSession:
+    """Connection-pooling HTTP client shared by the pipeline.
+
+    Args:
+        max_per_host: Maximum concurrent connections to any one host; further
+            requests wait for a free connection.
+        user_agent: User-Agent header sent with every request.
+
+    Attributes:
+        connections_opened: New connections created.
+        connections_reused: Requests served on a pooled keep-alive connection.
+        requests: Requests sent, including redirects and stale-connection retries.
+    """
+
+    def __init__(self, max_per_host=4, user_agent=USER_AGENT):
+        self.max_per_host = max_per_host
+        self.user_agent = user_agent
+        self._idle = defaultdict(list)
+        self._slots = defaultdict(lambda: threading.BoundedSemaphore(self.max_per_host))
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+        self.connections_reused = 0
+        self.requests = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'connections_opened': self.connections_opened,
+                'connections_reused': self.connections_reused,
+            }
+
+    def _slot(self, key):
+        with self._lock:
+            return self._slots[key]
+
+    def _checkout(self, key, timeout):
+        """An idle connection for key, or a new one. Returns (conn, reused)."""
+        with self._lock:
+            idle = self._idle[key]
+            if idle:
+                conn = idle.pop()
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                self.connections_reused += 1
+                return conn, True
+            self.connections_opened += 1
+        scheme, host, port = key
+        conn_cls = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return conn_cls(host, port, timeout=timeout), False
+
+    def _release(self, key, conn, reusable):
+        if reusable:
+            with self._lock:
+                self._idle[key].append(conn)
+        else:
+            conn.close()
+        self._slot(key).release()
+
+    def _send(self, key, path, headers, timeout):
+        """Send one GET; retries once on a fresh connection if a pooled one went stale."""
+        slot = self._slot(key)
+        slot.acquire()
+        try:
+            while True:
+                conn, reused = self._checkout(key, timeout)
+                with self._lock:
+                    self.requests += 1
+                try:
+                    conn.request('GET', path, headers=headers)
+                    return conn, conn.getresponse()
+                except _STALE_ERRORS:
+                    conn.close()
+                    if not reused:
+                        raise
+                except Exception:
+                    conn.close()
+                    raise
+        except BaseException:
+            slot.release()
+            raise
+
+    def get(self, url, headers=None, timeout=30):
+        """GET url, following redirects.
+
+        Returns:
+            HttpResponse (a context manager) for a 2xx answer.
+
+        Raises:
+            urllib.error.HTTPError: For any other final status, as urlopen does.
+        """
+        for _ in range(_MAX_REDIRECTS + 1):
+            parts = urllib.parse.urlsplit(url)
+            port = parts.port or (443 if parts.scheme == 'https' else 80)
+            key = (parts.scheme, parts.hostname, port)
+            path = parts.path or '/'
+            if parts.query:
+                path += f'?{parts.query}'
+            request_headers = {
+                'User-Agent': self.user_agent,
+                'Accept-Encoding': 'gzip, deflate',
+                'Connection': 'keep-alive',
+                **(headers or {}),
+            }
+
+            conn, raw = self._send(key, path, request_headers, timeout)
+            response = HttpResponse(self, key, conn, raw, url)
+            if response.status in _REDIRECTS and response.getheader('Location'):
+                location = response.getheader('Location')
+                response.close()
+                url = urllib.parse.urljoin(url, location)
+                continue
+            if not 200 <= response.status < 300:
+                body = response.read()
+                response.close()
+                raise urllib.error.HTTPError(url, response.status, response.reason,
+                                             response.headers, io.BytesIO(body))
+            return response
+        raise urllib.error.URLError(f'Too many redirects for {url}')
+
+    def close(self):
+        with self._lock:
+            for idle in self._idle.values():
+                for conn in idle:
+                    conn.close()
+            self._idle.clear()
+
+
+def open_url(url, headers=None, timeout=30, session=None):
+    """Open url through `session` when given, else with a one-off urlopen.
+
+    Both paths return a file-like context manager and raise HTTPError on non-2xx
+    statuses, so call sites do not need to know which one they got.
+    """
+    if session is not None:
+        return session.get(url, headers=headers, timeout=timeout)
+    request = libreq.Request(url, headers=headers) if headers else url
+    return libreq.urlopen(request, timeout=timeout)
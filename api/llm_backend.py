@@ -0,0 +1,457 @@
+"""LLM backends behind one small interface.
+
+The Agent talks to an LLMBackend rather than to genai directly, so the whole
+pipeline can run against FakeBackend: a deterministic local stand-in with
+configurable latency, rate-limit errors and output sizes, for load tests and
+benchmarks that spend no quota.
+"""
+import asyncio
+import itertools
+import math
+import random
+import re
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Protocol, runtime_checkable
+
+from google.genai import errors, types
+
+DEFAULT_MODEL = 'gemini-3.1-flash-lite'
+
+
+@dataclass(frozen=True, slots=True)
+class LLMResult:
+    text: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+
+
+class LLMRateLimitError(Exception):
+    """The backend refused a call for quota reasons (HTTP 429)."""
+
+    code = 429
+
+    def __init__(self, message='rate limited', retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@runtime_checkable
+class LLMBackend(Protocol):
+    model: str
+
+    def generate(self, prompt, system_instruction, config, cached_prefix=None) -> LLMResult:
+        """One completion. `config` holds generation settings (temperature, max_output_tokens).
+
+        With `cached_prefix` (a handle from create_prefix_cache) the prompt is
+        only the text after the cached prefix, and the cached system
+        instruction applies.
+        """
+
+    async def agenerate(self, prompt, system_instruction, config, cached_prefix=None) -> LLMResult:
+        """Async form of generate()."""
+
+    def create_prefix_cache(self, prefix, system_instruction, ttl_seconds):
+        """Store a prompt prefix (and system instruction) server-side. Returns a handle."""
+
+    def delete_prefix_cache(self, handle):
+        """Drop a cached prefix before its TTL runs out."""
+
+    def count_tokens(self, text) -> int:
+        """The model's token count for text."""
+
+    def usage(self) -> dict:
+        """Running totals: calls, errors, input/output tokens, cached_tokens (prefix
+        tokens served from a cache) and prompt_bytes (prompt text transmitted)."""
+
+
+@runtime_checkable
+class BatchJobBackend(Protocol):
+    """Optional asynchronous batch-job API (see api.batch_jobs)."""
+
+    def submit_batch(self, requests) -> str:
+        """Submit (prompt, system_instruction, config) requests as one job. Returns a job handle."""
+
+    def batch_state(self, job) -> str:
+        """'running', 'succeeded' or 'failed'."""
+
+    def batch_results(self, job) -> list:
+        """One LLMResult (or None where a request failed) per request, in submission order."""
+
+    def cancel_batch(self, job):
+        """Stop a job that is no longer wanted."""
+
+
+class _UsageMixin:
+    def _init_usage(self):
+        self._usage_lock = threading.Lock()
+        self._usage = {'calls': 0, 'errors': 0, 'input_tokens': 0, 'output_tokens': 0,
+                       'cached_tokens': 0, 'prompt_bytes': 0}
+
+    def _record(self, result=None, sent=''):
+        with self._usage_lock:
+            self._usage['calls'] += 1
+            self._usage['prompt_bytes'] += len(sent.encode())
+            if result is None:
+                self._usage['errors'] += 1
+            else:
+                self._usage['input_tokens'] += result.input_tokens
+                self._usage['output_tokens'] += result.output_tokens
+                self._usage['cached_tokens'] += result.cached_tokens
+
+    def _record_upload(self, sent):
+        with self._usage_lock:
+            self._usage['prompt_bytes'] += len(sent.encode())
+
+    def usage(self):
+        with self._usage_lock:
+            return dict(self._usage)
+
+
+def _sent(prompt, system_instruction, cached_prefix):
+    """The prompt text a call transmits."""
+    return prompt if cached_prefix else system_instruction + prompt
+
+
+def _token_count(value):
+    return value if isinstance(value, int) else 0
+
+
+def _retry_after(error):
+    """Seconds a 429 from the Gemini API asks to wait, or None if it doesn't say."""
+    headers = getattr(error.response, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        pass
+    details = (error.details or {}).get('error', {}).get('details', []) if isinstance(error.details, dict) else []
+    for detail in details:
+        delay = str(detail.get('retryDelay', ''))
+        if delay.endswith('s'):
+            try:
+                return float(delay[:-1])
+            except ValueError:
+                pass
+    return None
+
+
+class GeminiBackend(_UsageMixin):
+    """generate_content on a genai.Client.
+
+    Args:
+        client: A google.genai Client.
+        model: Model name.
+        timeout: Transport timeout per request in seconds (None: the client's).
+    """
+
+    def __init__(self, client, model=DEFAULT_MODEL, timeout=None):
+        self.client = client
+        self.model = model
+        self.timeout = timeout
+        self._init_usage()
+
+    def _result(self, response, sent):
+        usage = getattr(response, 'usage_metadata', None)
+        result = LLMResult(
+            text=response.text,
+            input_tokens=_token_count(getattr(usage, 'prompt_token_count', 0)),
+            output_tokens=_token_count(getattr(usage, 'candidates_token_count', 0)),
+            cached_tokens=_token_count(getattr(usage, 'cached_content_token_count', 0)),
+        )
+        self._record(result, sent)
+        return result
+
+    def _config(self, system_instruction, config, cached_prefix):
+        if self.timeout:
+            # Ends requests abandoned by a caller's deadline (see api.hedging).
+            config = {**config, 'http_options': types.HttpOptions(timeout=int(self.timeout * 1000))}
+        if cached_prefix:
+            # The cached content carries the system instruction.
+            return types.GenerateContentConfig(cached_content=cached_prefix, **config)
+        return types.GenerateContentConfig(system_instruction=system_instruction, **config)
+
+    def generate(self, prompt, system_instruction, config, cached_prefix=None):
+        try:
+            response = self.client.models.generate_content(
+                model=self.model,
+                contents=prompt,
+                config=self._config(system_instruction, config, cached_prefix),
+            )
+        except Exception as e:
+            self._record(sent=_sent(prompt, system_instruction, cached_prefix))
+            if isinstance(e, errors.APIError) and e.code == 429:
+                raise LLMRateLimitError(str(e), retry_after=_retry_after(e)) from e
+            raise
+        return self._result(response, _sent(prompt, system_instruction, cached_prefix))
+
+    async def agenerate(self, prompt, system_instruction, config, cached_prefix=None):
+        try:
+            response = await self.client.aio.models.generate_content(
+                model=self.model,
+                contents=prompt,
+                config=self._config(system_instruction, config, cached_prefix),
+            )
+        except Exception as e:
+            self._record(sent=_sent(prompt, system_instruction, cached_prefix))
+            if isinstance(e, errors.APIError) and e.code == 429:
+                raise LLMRateLimitError(str(e), retry_after=_retry_after(e)) from e
+            raise
+        return self._result(response, _sent(prompt, system_instruction, cached_prefix))
+
+    def create_prefix_cache(self, prefix, system_instruction, ttl_seconds):
+        cached = self.client.caches.create(
+            model=self.model,
+            config=types.CreateCachedContentConfig(
+                contents=[prefix],
+                system_instruction=system_instruction,
+                ttl=f'{int(ttl_seconds)}s',
+                display_name='paperpulse-prompt-prefix',
+            ),
+        )
+        self._record_upload(system_instruction + prefix)
+        return cached.name
+
+    def delete_prefix_cache(self, handle):
+        self.client.caches.delete(name=handle)
+
+    def count_tokens(self, text):
+        return self.client.models.count_tokens(model=self.model, contents=text).total_tokens
+
+    def submit_batch(self, requests):
+        job = self.client.batches.create(
+            model=self.model,
+            src=[
+                types.InlinedRequest(
+                    contents=prompt,
+                    config=types.GenerateContentConfig(system_instruction=system_instruction, **config),
+                )
+                for prompt, system_instruction, config in requests
+            ],
+            config=types.CreateBatchJobConfig(display_name='paperpulse-nightly'),
+        )
+        for prompt, system_instruction, _ in requests:
+            self._record_upload(system_instruction + prompt)
+        return job.name
+
+    def batch_state(self, job):
+        state = self.client.batches.get(name=job).state
+        name = getattr(state, 'name', str(state))
+        if name in _BATCH_SUCCEEDED:
+            return 'succeeded'
+        if name in _BATCH_FAILED:
+            return 'failed'
+        return 'running'
+
+    def batch_results(self, job):
+        dest = self.client.batches.get(name=job).dest
+        results = []
+        for item in (dest.inlined_responses if dest else None) or []:
+            if item.error or item.response is None:
+                self._record()
+                results.append(None)
+            else:
+                results.append(self._result(item.response, ''))
+        return results
+
+    def cancel_batch(self, job):
+        self.client.batches.cancel(name=job)
+
+
+_BATCH_SUCCEEDED = {'JOB_STATE_SUCCEEDED', 'JOB_STATE_PARTIALLY_SUCCEEDED'}
+_BATCH_FAILED = {'JOB_STATE_FAILED', 'JOB_STATE_CANCELLED', 'JOB_STATE_EXPIRED'}
+
+_LINK_RE = re.compile(
+    r'\*\*Title:\*\* (?P<title>.+)\n\*\*URL:\*\* (?P<url>\S+)'  # paper block
+    r'|\*\*Ref:\*\* \[(?P<ref>P\d+)\]'  # labeled paper block
+    r'|\[(?P<text>[^\]]+)\]\((?P<target>\S+?)\)'  # link in a summary
+    r'|\[(?P<label>P\d+)\](?!\()'  # label in a summary
+)
+
+_CATEGORY_RE = re.compile(r'^### Category: (\S+)$', re.MULTILINE)
+
+
+class FakeBackend(_UsageMixin):
+    """Deterministic local stand-in for an LLM API.
+
+    Latency is log-normal, set by its median and 95th percentile. A share of
+    calls fail with LLMRateLimitError and a share stall. Replies are markdown of roughly
+    `output_tokens` tokens that cite the papers (links or [P17] labels) found
+    in the prompt, so summaries survive combine steps like real ones; a packed
+    multi-category prompt gets one "=== <slug> ===" section per category (cut
+off at max_output_tokens, else closed by "=== END ==="). Each
+    reply depends only on the prompt and seed, never on call order.
+
+    Args:
+        latency: (median, p95) seconds per call.
+        rate_limit_rate: Share of calls that raise LLMRateLimitError.
+        output_tokens: Median reply size in tokens (capped by max_output_tokens).
+        links_per_reply: Most links kept in one reply.
+        seed: Seed for every random draw.
+        sleep: Blocking sleep used by generate() (injectable for tests).
+        batch_polls: Status checks a batch job stays 'running' for.
+        batch_failure_rate: Share of batch-job requests returned without output.
+        stall_rate: Share of calls that hang for an extra `stall_seconds` first.
+    """
+
+    model = 'fake'
+
+    def __init__(self, latency=(0.5, 2.0), rate_limit_rate=0.0, output_tokens=800, links_per_reply=40,
+                 seed=0, sleep=time.sleep, batch_polls=1, batch_failure_rate=0.0, stall_rate=0.0,
+                 stall_seconds=600.0):
+        self.latency = latency
+        self.rate_limit_rate = rate_limit_rate
+        self.output_tokens = output_tokens
+        self.links_per_reply = links_per_reply
+        self.seed = seed
+        self.sleep = sleep
+        self._init_usage()
+        self._attempts = {}
+        self._attempts_lock = threading.Lock()
+        self._prefixes = {}
+        self._cache_ids = itertools.count(1)
+        self._jobs = []
+        self.batch_polls = batch_polls
+        self.batch_failure_rate = batch_failure_rate
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+
+    def _rng(self, prompt):
+        # Retries of the same prompt draw fresh numbers, so a rate-limited call can succeed later.
+        key = zlib.crc32(prompt.encode())
+        with self._attempts_lock:
+            attempt = self._attempts.get(key, 0)
+            self._attempts[key] = attempt + 1
+        return random.Random(f'{self.seed}:{key}:{attempt}')
+
+    def _delay(self, rng):
+        median, p95 = self.latency
+        if median <= 0:
+            return 0.0
+        sigma = math.log(max(p95, median) / median) / 1.645
+        return rng.lognormvariate(math.log(median), sigma)
+
+    def _reply(self, rng, prompt, config):
+        sections = _CATEGORY_RE.split(prompt)
+        if len(sections) < 3:
+            return self._summary(rng, prompt, config)
+        # A packed multi-category prompt: answer each section under its own marker.
+        parts, output_tokens = [], 0
+        for slug, body in zip(sections[1::2], sections[2::2]):
+            result = self._summary(rng, body, config)
+            parts.append(f'=== {slug} ===\n{result.text}')
+            output_tokens += result.output_tokens
+        text = '\n\n'.join(parts)
+        limit = config.get('max_output_tokens')
+        if limit and output_tokens > limit:
+            # Cut off mid-section at the output limit, like a real reply.
+            text, output_tokens = ' '.join(text.split(' ')[:limit]), limit
+        else:
+            text += '\n\n=== END ==='
+        return LLMResult(text=text, input_tokens=self.count_tokens(prompt), output_tokens=output_tokens)
+
+    def _summary(self, rng, prompt, config):
+        links = []
+        for match in _LINK_RE.finditer(prompt):
+            if match['title']:
+                links.append(f"[{match['title'].strip()}]({match['url']})")
+            elif match['text']:
+                links.append(f"[{match['text'].strip()}]({match['target']})")
+            else:
+                links.append(f"[{match['ref'] or match['label']}]")
+            if len(links) >= self.links_per_reply:
+                break
+        target = int(rng.lognormvariate(math.log(max(1, self.output_tokens)), 0.3))
+        target = min(target, config.get('max_output_tokens') or target)
+        lines = ['## Theme 1: Synthetic results', '']
+        lines += [f'- {link}: ' + ' '.join(rng.choice(('model', 'data', 'bound', 'method', 'result'))
+                                             for _ in range(12)) for link in links]
+        words = sum(len(line.split()) for line in lines)
+        if words < target:
+            lines.append(' '.join('filler' for _ in range(target - words)))
+        return LLMResult(text='\n'.join(lines), input_tokens=self.count_tokens(prompt),
+                         output_tokens=max(words, target))
+
+    def _outcome(self, prompt, config, cached_prefix):
+        if cached_prefix and cached_prefix not in self._prefixes:
+            # Like the API once a cached content has expired or been deleted.
+            self._record(sent=prompt)
+            raise LookupError(f'{cached_prefix} not found or expired')
+        prefix = self._prefixes[cached_prefix] if cached_prefix else ''
+        rng = self._rng(prefix + prompt)
+        delay = self._delay(rng)
+        if self.stall_rate and rng.random() < self.stall_rate:
+            delay += self.stall_seconds
+        if rng.random() < self.rate_limit_rate:
+            return delay, None
+        result = self._reply(rng, prefix + prompt, config)
+        if prefix:
+            result = LLMResult(result.text, result.input_tokens, result.output_tokens,
+                               cached_tokens=self.count_tokens(prefix))
+        return delay, result
+
+    def generate(self, prompt, system_instruction, config, cached_prefix=None):
+        delay, result = self._outcome(prompt, config, cached_prefix)
+        self.sleep(delay)
+        self._record(result, _sent(prompt, system_instruction, cached_prefix))
+        if result is None:
+            raise LLMRateLimitError(retry_after=1)
+        return result
+
+    async def agenerate(self, prompt, system_instruction, config, cached_prefix=None):
+        delay, result = self._outcome(prompt, config, cached_prefix)
+        await asyncio.sleep(delay)
+        self._record(result, _sent(prompt, system_instruction, cached_prefix))
+        if result is None:
+            raise LLMRateLimitError(retry_after=1)
+        return result
+
+    def create_prefix_cache(self, prefix, system_instruction, ttl_seconds):
+        handle = (f'cachedContents/fake-{zlib.crc32((system_instruction + prefix).encode()):08x}'
+                  f'-{next(self._cache_ids)}')
+        self._prefixes[handle] = prefix
+        self._record_upload(system_instruction + prefix)
+        return handle
+
+    def delete_prefix_cache(self, handle):
+        self._prefixes.pop(handle, None)
+
+    def submit_batch(self, requests):
+        """Jobs report 'running' for `batch_polls` status checks, then succeed.
+
+        Batch requests are not rate-limited; a `batch_failure_rate` share of them
+        come back without output.
+        """
+        with self._attempts_lock:
+            self._jobs.append({'requests': list(requests), 'polls': 0, 'cancelled': False})
+            job = f'batches/fake-{len(self._jobs)}'
+        for prompt, system_instruction, _ in requests:
+            self._record_upload(system_instruction + prompt)
+        return job
+
+    def _job(self, job):
+        return self._jobs[int(job.rsplit('-', 1)[1]) - 1]
+
+    def batch_state(self, job):
+        state = self._job(job)
+        if state['cancelled']:
+            return 'failed'
+        state['polls'] += 1
+        return 'succeeded' if state['polls'] > self.batch_polls else 'running'
+
+    def batch_results(self, job):
+        results = []
+        for prompt, _, config in self._job(job)['requests']:
+            rng = self._rng(prompt)
+            result = None if rng.random() < self.batch_failure_rate else self._reply(rng, prompt, config)
+            self._record(result)
+            results.append(result)
+        return results
+
+    def cancel_batch(self, job):
+        self._job(job)['cancelled'] = True
+
+    def count_tokens(self, text):
+        return len(text) // 4 + 1
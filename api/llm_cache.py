@@ -0,0 +1,138 @@
+"""Content-addressed on-disk cache of LLM responses.
+
+Entries are keyed by a hash of everything that determines the output (model,
+generation config, system instruction, prompt), so re-running a day after a
+partial failure, or iterating locally, does not pay again for identical calls.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(model, config, system_instruction, prompt):
+    """Stable hex digest of one LLM request."""
+    payload = json.dumps(
+        {'model': model, 'config': config, 'system_instruction': system_instruction, 'prompt': prompt},
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """Response cache with age and size limits.
+
+    Each entry is a small JSON file under directory/<key[:2]>/<key>.json. Writes
+    go to a temp file that is renamed into place, so readers never see a partial
+    entry. An entry expires `max_age` seconds after it was written (its stored
+    `created` time), however often it is hit, and is then treated as a miss and
+    removed. When the cache grows past `max_bytes` the least recently used
+    entries (by mtime, refreshed on every hit) are evicted.
+
+    Args:
+        directory: Cache root; created if missing.
+        max_bytes: Size budget for all entries.
+        max_age: Entry lifetime in seconds; None keeps entries until evicted for size.
+    """
+
+    def __init__(self, directory, max_bytes=500 * 1024 * 1024, max_age=7 * 24 * 3600):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size = sum(p.stat().st_size for p in self._entries())
+        self.evict()
+
+    def _entries(self):
+        return self.directory.glob('*/*.json')
+
+    def _path(self, key):
+        return self.directory / key[:2] / f'{key}.json'
+
+    def _expired(self, mtime, now):
+        return self.max_age is not None and now - mtime > self.max_age
+
+    def get(self, key):
+        """The cached text for key, or None. Counts a hit or a miss."""
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+            text = entry['text']
+            if self._expired(entry.get('created', path.stat().st_mtime), time.time()):
+                self._remove(path)
+                raise FileNotFoundError(path)
+            os.utime(path)  # mark as recently used (mtime is for LRU only)
+        except (FileNotFoundError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return text
+
+    def put(self, key, text, **metadata):
+        """Store text under key, then evict if over budget."""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'text': text, 'created': time.time(), **metadata}, f, ensure_ascii=False)
+            old_size = path.stat().st_size if path.exists() else 0
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        with self._lock:
+            self._size += path.stat().st_size - old_size
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def _remove(self, path):
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._size -= size
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes.
+
+        An entry not used for max_age is expired (it was created before its last
+        use), so the sweep only needs mtimes; entries kept fresh by hits are
+        expired by get() on their created time.
+        """
+        now = time.time()
+        live = []
+        for path in self._entries():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if self._expired(stat.st_mtime, now):
+                self._remove(path)
+            else:
+                live.append((stat.st_mtime, path))
+        live.sort()
+        for _, path in live:
+            with self._lock:
+                if self._size <= self.max_bytes:
+                    break
+            self._remove(path)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'bytes': self._size}
@@ -19,9 +19,21 @@ from dotenv import load_dotenv
 #     download_pdf,
 # )
 from api.arxiv_client import ArxivClient
-from api.agent import Agent
+from api.agent import BLOG_JOB, Agent
 from api.file_handler import FileHandler
-from api.settings import RSS_CATEGORIES, get_secret
+from api.http_session import HttpSession
+from api.ranking import cross_listing_counts
+from api.settings import (
+    BLOG_FROM_BLURBS,
+    CONTENT_DIR,
+    DIGEST_DB,
+    DIGEST_MODE,
+    HTTP_MAX_CONNECTIONS_PER_HOST,
+    LLM_BATCH_MODE,
+    RSS_CATEGORIES,
+    TOKEN_CALIBRATION_SAMPLE,
+    get_secret,
+)
 
 from api.webs import create_blogpost
 
@@ -50,10 +62,26 @@ def main():
     logger.info(dev_env)
 
     # initalize
-    arxiv_client = ArxivClient(RSS_CATEGORIES)
+    # One keep-alive session for every feed, retry and metadata request this run.
+    http_session = HttpSession(max_per_host=HTTP_MAX_CONNECTIONS_PER_HOST)
+    arxiv_client = ArxivClient(RSS_CATEGORIES, session=http_session)
     llm_agent = Agent(get_secret("gemini_api_key"))
     file_handler = FileHandler(os.getenv("PROJECT_DIR"))
     papers = None
+    # In blurb mode the blog post is one combine pass over the fixed categories'
+    # blurbs instead of a second summarization of the same papers.
+    blog_from_blurbs = BLOG_FROM_BLURBS and bool(CONTENT_DIR)
+    blog_pending = False
+    digest_store = None
+    if DIGEST_MODE:
+        from api.digests import DigestStore
+        from api.feeds import today_ny
+
+        # One synopsis per arXiv id per day, shared by the blog and every category.
+        digest_store = DigestStore(
+            DIGEST_DB, date=today_ny(),
+            summarize=llm_agent.digest_papers if DIGEST_MODE == 'llm' else None)
+        llm_agent.digests = digest_store
 
     try:       
         # if in dev mode, check to see if papers were downloaded earlier
@@ -67,8 +95,14 @@ def main():
         
             if dev_env=='dev':
                 file_handler.save_papers(papers)
-                
-        if not papers:
+
+        from api.feeds import already_seen_feeds, today_ny
+
+        if set(RSS_CATEGORIES) <= already_seen_feeds(arxiv_client.unchanged_feeds, today_ny()):
+            # Every blog feed answered 304 with content from an earlier day
+            # (weekend/holiday): that content already has its post.
+            logger.info('Blog feeds unchanged since an earlier run; skipping today\'s post')
+        elif not papers:
             # Empty feeds are a legitimate steady state (e.g. arXiv didn't publish
             # in the last cycle). Skip the blog post only — the per-category blurbs
             # below fetch their own feeds, and a user category can have papers on a
@@ -76,27 +110,107 @@ def main():
             logger.info('No papers retrieved; skipping today\'s post')
         else:
             logger.info(f'Retrieved: {len(papers)} papers')
-            summary = llm_agent.identify_important_papers(papers)
-            create_blogpost(summary, len(papers))
+            try:
+                if TOKEN_CALIBRATION_SAMPLE:
+                    # One count_tokens call fits batch sizing to the model's tokenizer.
+                    scale = llm_agent.calibrate_tokens(papers[:TOKEN_CALIBRATION_SAMPLE])
+                    logger.info(f'Token estimator calibrated: {scale:.3f} tokens/piece')
+            except Exception as e:
+                logger.warning(f'Token calibration failed, using default estimate: {e}')
+            if digest_store is not None:
+                digest_store.build(papers)
+            if llm_agent.rank_max_papers or llm_agent.rank_token_budget:
+                # Cross-listing counts feed the ranking; the feeds are already in the store.
+                llm_agent.cross_listings = cross_listing_counts(
+                    arxiv_client.retrieve_results_by_category(RSS_CATEGORIES))
+            if blog_from_blurbs or LLM_BATCH_MODE:
+                # Written after the blurbs below: from the fixed categories' blurbs,
+                # or from the same batch jobs as the blurbs.
+                blog_pending = True
+            else:
+                summary = llm_agent.identify_important_papers(papers)
+                create_blogpost(summary, len(papers))
     except Exception as e:
         print(f'Exception: {e}')
 
     # Per-category blurbs for the personalized feed (Phase 1). Additive to the
     # public blog flow above; failures here must not break the blog post.
     try:
-        from api.feeds import generate_category_blurbs, get_fetch_list, today_ny
-        from api.settings import APP_DB_PATH, CONTENT_DIR
+        from api.feeds import (
+            already_seen_feeds,
+            generate_category_blurbs,
+            get_fetch_list,
+            today_ny,
+            write_category_blurbs,
+        )
+        from api.settings import APP_DB_PATH
 
         if CONTENT_DIR:
             fetch_list = get_fetch_list(APP_DB_PATH)
             logger.info(f'Generating per-category blurbs for: {fetch_list}')
             papers_by_category = arxiv_client.retrieve_results_by_category(fetch_list)
-            generate_category_blurbs(papers_by_category, llm_agent, CONTENT_DIR, today_ny())
+            seen = already_seen_feeds(arxiv_client.unchanged_feeds, today_ny())
+            if seen:
+                logger.info(f'Skipping categories unchanged since an earlier run: {sorted(seen)}')
+                papers_by_category = {s: p for s, p in papers_by_category.items() if s not in seen}
+            if digest_store is not None:
+                digest_store.build([p for papers in papers_by_category.values() for p in papers])
+            llm_agent.cross_listings = cross_listing_counts(papers_by_category)
+            if LLM_BATCH_MODE:
+                # Every category (and the blog, unless it comes from the blurbs)
+                # goes out together, one batch job per summarization round.
+                jobs = {slug: p for slug, p in papers_by_category.items() if p}
+                if blog_pending and not blog_from_blurbs:
+                    jobs[BLOG_JOB] = papers
+                summaries = llm_agent.summarize_with_batch_jobs(jobs)
+                if BLOG_JOB in summaries:
+                    create_blogpost(summaries.pop(BLOG_JOB), len(papers))
+                    blog_pending = False
+                write_category_blurbs(summaries, CONTENT_DIR, today_ny())
+            else:
+                generate_category_blurbs(papers_by_category, llm_agent, CONTENT_DIR, today_ny())
         else:
             logger.info('CONTENT_DIR not set; skipping per-category blurbs')
     except Exception as e:
         logger.error(f'Per-category blurb generation failed: {e}')
 
+    if blog_pending:
+        try:
+            from api.feeds import read_category_blurbs, today_ny
+
+            if blog_from_blurbs:
+                blurbs = read_category_blurbs(CONTENT_DIR, today_ny(), RSS_CATEGORIES)
+                missing = [slug for slug in RSS_CATEGORIES if slug not in blurbs]
+                if missing:
+                    logger.warning(f'No blurb for {missing}; the post covers {sorted(blurbs)} only')
+                if blurbs:
+                    summary = llm_agent.combine_summaries(list(blurbs.values()))
+                else:
+                    logger.warning('No blog-category blurbs were written; summarizing papers directly')
+                    summary = llm_agent.identify_important_papers(papers)
+            else:
+                # Batch mode without the blurb run (no CONTENT_DIR, or it failed).
+                summary = llm_agent.summarize_with_batch_jobs({BLOG_JOB: papers})[BLOG_JOB]
+            create_blogpost(summary, len(papers))
+        except Exception as e:
+            logger.error(f'Deferred blog post failed: {e}')
+
+    # Both flows above read feeds through the client's per-run store; hits are
+    # feeds that were served without a second download.
+    logger.info(f'Feed store: {arxiv_client.store.stats()}')
+    logger.info(f'HTTP session: {http_session.stats()}')
+    if llm_agent.cache:
+        logger.info(f'LLM cache: {llm_agent.cache.stats()}')
+    if llm_agent.compactor is not None:
+        logger.info(f'Prompt compaction: {llm_agent.compactor.stats()}')
+    llm_agent.release_prefix_caches()
+    logger.info(f'LLM usage: {llm_agent.backend.usage()}')
+    logger.info(f'LLM calls: {llm_agent.call_stats()}')
+    if digest_store is not None:
+        logger.info(f'Paper digests: {digest_store.stats()}')
+        digest_store.close()
+    http_session.close()
+
 if __name__ == "__main__":
     main()
 
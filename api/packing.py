@@ -0,0 +1,66 @@
+"""Bin packing for LLM batches, and the sectioned format for packed categories."""
+import re
+
+_SECTION_RE = re.compile(r'^\s*={3,}\s*(\S+?)\s*={3,}\s*$', re.MULTILINE)
+# Closes a complete packed reply (see MULTI_CATEGORY_PROMPT).
+END_MARKER = 'END'
+
+
+def pack(sizes, capacity):
+    """Pack items into as few bins of `capacity` as possible.
+
+    First-fit decreasing: items are placed largest first into the first bin
+    with room, which is within 11/9 of the optimal bin count. An item larger
+    than the capacity gets a bin of its own.
+
+    Args:
+        sizes: Item sizes.
+        capacity: Bin capacity.
+
+    Returns:
+        List of bins, each a list of item indices in ascending (input) order.
+    """
+    bins = []
+    remaining = []
+    for index in sorted(range(len(sizes)), key=lambda i: sizes[i], reverse=True):
+        size = sizes[index]
+        for b, room in enumerate(remaining):
+            if size <= room:
+                bins[b].append(index)
+                remaining[b] -= size
+                break
+        else:
+            bins.append([index])
+            remaining.append(capacity - size)
+    for b in bins:
+        b.sort()
+    # Order bins by their first item so batch order follows input order.
+    bins.sort(key=lambda b: b[0])
+    return bins
+
+
+def section_header(slug):
+    """Heading of one category's papers in a packed prompt."""
+    return f"### Category: {slug}"
+
+
+def split_sections(text, slugs):
+    """Split a packed reply ("=== <slug> ===" before each section) into {slug: markdown}.
+
+    Sections for slugs that were not asked for are dropped; a repeated slug
+    keeps its first section. Slugs without a section are left out. A reply
+    without the closing "=== END ===" line was cut off (e.g. at the output
+    token limit), so its last section is left out too.
+    """
+    wanted = set(slugs)
+    sections = {}
+    markers = list(_SECTION_RE.finditer(text or ''))
+    complete = any(marker.group(1) == END_MARKER for marker in markers)
+    for marker, following in zip(markers, markers[1:] + [None]):
+        if following is None and not complete:
+            break
+        slug = marker.group(1)
+        body = text[marker.end():following.start() if following else len(text)].strip()
+        if slug in wanted and slug not in sections and body:
+            sections[slug] = body
+    return sections
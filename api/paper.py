@@ -0,0 +1,90 @@
+"""Compact record type for a single arXiv paper.
+
+A day's run can hold thousands of papers across many categories, so papers are
+frozen, slotted records rather than dicts: author names are interned (the same
+prolific authors recur across feeds), and the prompt rendering is built once
+and memoized. Dict-style access (`paper['title']`, `paper.get('url')`) keeps
+code written against the old dict shape working.
+"""
+import re
+import sys
+from dataclasses import dataclass, field
+
+_ARXIV_ID_RE = re.compile(r'arxiv\.org/(?:abs|pdf)/([\w.\-/]+?)(?:v\d+)?(?:\.pdf)?/?$')
+
+
+def arxiv_id_from_url(url):
+    """The arXiv id in an abs/pdf URL (version stripped), or None."""
+    match = _ARXIV_ID_RE.search(url or '')
+    return match.group(1) if match else None
+
+
+def format_paper(title, url, authors, summary, ref=None):
+    """The per-paper block sent to the LLM.
+
+    With `ref` (a reference label such as 'P17') the block carries the label
+    instead of the URL.
+    """
+    if ref:
+        return f"**Ref:** [{ref}]\n**Title:** {title}\n**Authors:** {', '.join(authors)}\n**Summary:** {summary}\n"
+    return f"**Title:** {title}\n**URL:** {url}\n**Authors:** {', '.join(authors)}\n**Summary:** {summary}\n"
+
+
+@dataclass(frozen=True, slots=True)
+class Paper:
+    """One paper, compared and hashed by its arXiv id.
+
+    Build with Paper.create so the id is derived and author names are interned.
+    """
+    arxiv_id: str
+    title: str = field(compare=False)
+    url: str = field(compare=False)
+    authors: list = field(compare=False)
+    summary: str = field(compare=False, repr=False)
+    _prompt: str = field(default=None, init=False, compare=False, repr=False)
+
+    _KEYS = ('title', 'authors', 'summary', 'url')
+
+    @classmethod
+    def create(cls, title, url, authors, summary):
+        return cls(
+            arxiv_id=arxiv_id_from_url(url) or url,
+            title=title,
+            url=url,
+            authors=[sys.intern(a) for a in authors],
+            summary=summary,
+        )
+
+    @classmethod
+    def from_dict(cls, paper):
+        if isinstance(paper, cls):
+            return paper
+        return cls.create(paper['title'], paper['url'], paper.get('authors', ()), paper.get('summary', ''))
+
+    @property
+    def prompt_text(self):
+        """The LLM prompt block for this paper, rendered once per record."""
+        if self._prompt is None:
+            object.__setattr__(self, '_prompt', format_paper(self.title, self.url, self.authors, self.summary))
+        return self._prompt
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self._KEYS}
+
+    # Dict-style access for code written against the old paper dicts.
+    def __getitem__(self, key):
+        if key in self._KEYS or key == 'arxiv_id':
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return key in self._KEYS or key == 'arxiv_id'
+
+    def keys(self):
+        return self._KEYS
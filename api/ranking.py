@@ -0,0 +1,120 @@
+"""Local relevance ranking to cap the papers each category sends to the LLM.
+
+Big categories announce hundreds of papers a day. Before summarization the
+papers can be ranked on the CPU and only the top ones sent to the LLM; the rest
+are listed by title under the summary. The score is BM25-weighted centrality
+(how close a paper's title and abstract are to the day's centroid for the
+category, i.e. how much of the day's conversation it is part of) plus a bonus
+for each extra category the paper is cross-listed in.
+"""
+import math
+import re
+from collections import Counter
+
+from api.digests import paper_key
+
+_TOKEN_RE = re.compile(r'[a-z][a-z0-9\-]{2,}')
+_STOPWORDS = frozenset(
+    'the and for with that this from are our which these their has have been can not into also '
+    'its than such using use used via based show shows new paper propose proposed approach method '
+    'methods results result however while both more most over under between each other only well '
+    'may where when how what two one three first large small high low'.split()
+)
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+CROSS_LIST_BONUS = 0.05  # per extra category; centrality is in [0, 1]
+
+
+def tokenize(text):
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def cross_listing_counts(papers_by_category):
+    """{arxiv_id: number of categories the paper appears in}."""
+    return Counter(paper_key(p) for papers in papers_by_category.values() for p in papers)
+
+
+def bm25_vectors(texts, k1=BM25_K1, b=BM25_B):
+    """BM25 term weights per document, as sparse {term: weight} dicts, L2-normalized.
+
+    Memory grows with the words in the texts, not with documents x vocabulary.
+    """
+    docs = [Counter(tokenize(text)) for text in texts]
+    df = Counter(term for doc in docs for term in doc)
+    n_docs = len(docs)
+    avg_len = sum(sum(doc.values()) for doc in docs) / max(1, n_docs) or 1.0
+    idf = {term: math.log1p((n_docs - count + 0.5) / (count + 0.5)) for term, count in df.items()}
+    vectors = []
+    for doc in docs:
+        norm_len = k1 * (1 - b + b * sum(doc.values()) / avg_len)
+        weights = {term: idf[term] * tf * (k1 + 1) / (tf + norm_len) for term, tf in doc.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        vectors.append({term: w / norm for term, w in weights.items()})
+    return vectors
+
+
+def rank_papers(papers, cross_listings=None):
+    """Indices of papers, most relevant first.
+
+    Args:
+        papers: Paper records or paper dicts.
+        cross_listings: Optional {arxiv_id: category count} (see cross_listing_counts).
+    """
+    if not papers:
+        return []
+    # Titles count twice: they are the densest statement of the contribution.
+    vectors = bm25_vectors([f"{p['title']} {p['title']} {p['summary']}" for p in papers])
+    centroid = Counter()
+    for vector in vectors:
+        centroid.update(vector)
+    norm = math.sqrt(sum(w * w for w in centroid.values())) or 1.0
+    scores = [sum(w * centroid[term] for term, w in vector.items()) / norm for vector in vectors]
+    if cross_listings:
+        scores = [score + CROSS_LIST_BONUS * max(0, cross_listings.get(paper_key(p), 1) - 1)
+                  for score, p in zip(scores, papers)]
+    # Stable: ties keep feed order.
+    return sorted(range(len(papers)), key=lambda i: -scores[i])
+
+
+def select_papers(papers, max_papers, token_budget=0, size=None, cross_listings=None):
+    """Split papers into the ones to summarize and the ones to list by title.
+
+    Takes papers in rank order up to `max_papers` and, with a token budget, while
+    their prompt blocks fit in it (the top paper is always kept).
+
+    Args:
+        papers: Paper records or paper dicts.
+        max_papers: Most papers to keep (0: no count cap).
+        token_budget: Most prompt tokens for the kept papers (0: no budget).
+        size: Callable giving a paper's prompt tokens; needed with a budget.
+        cross_listings: Optional {arxiv_id: category count}.
+
+    Returns:
+        (kept, rest), each in the original feed order.
+    """
+    if (not max_papers or len(papers) <= max_papers) and not token_budget:
+        return list(papers), []
+    kept_ids, used = set(), 0
+    for i in rank_papers(papers, cross_listings):
+        if max_papers and len(kept_ids) >= max_papers:
+            break
+        cost = size(papers[i]) if token_budget else 0
+        if kept_ids and token_budget and used + cost > token_budget:
+            continue
+        kept_ids.add(i)
+        used += cost
+    kept = [p for i, p in enumerate(papers) if i in kept_ids]
+    rest = [p for i, p in enumerate(papers) if i not in kept_ids]
+    return kept, rest
+
+
+def titles_appendix(papers, heading='Also announced today'):
+    """Markdown list of title links for papers that were not summarized."""
+    if not papers:
+        return ''
+    lines = [f"## {heading}", '']
+    for p in papers:
+        title = ' '.join(p['title'].split()).replace('[', '(').replace(']', ')')
+        lines.append(f"- [{title}]({p['url']})")
+    return '\n'.join(lines)
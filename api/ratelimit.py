@@ -0,0 +1,91 @@
+"""Rate limiting shared by the pipeline's outbound calls."""
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket.
+
+    Refills at `rate` tokens per second and banks at most `capacity` tokens, so
+    callers can burst up to `capacity` and are then paced at `rate`. A single
+    bucket is meant to be shared by every worker that talks to the same service.
+
+    Args:
+        rate: Tokens added per second. Must be > 0.
+        capacity: Maximum tokens banked (burst size). Starts full.
+        clock: Monotonic time source; injectable for tests.
+        sleep: Sleep function; injectable for tests.
+    """
+
+    def __init__(self, rate, capacity=1, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(self.capacity)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """Take `tokens` if available right now. Returns True on success."""
+        with self._lock:
+            self._refill(self._clock())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` are available, then take them.
+
+        Requests larger than the capacity are clamped to it, so an oversized
+        request waits for a full bucket instead of forever.
+        """
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                self._refill(self._clock())
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            self._sleep(wait)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits for an API quota.
+
+    Each call takes one request token and its estimated token cost from two
+    shared buckets, each allowed to burst up to one minute's worth. A call whose
+    cost exceeds the per-minute token limit waits for a full bucket rather than
+    forever.
+
+    Args:
+        requests_per_minute: Request quota; None or 0 disables that limit.
+        tokens_per_minute: Token quota; None or 0 disables that limit.
+        clock, sleep: Injectable for tests.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.requests = (TokenBucket(requests_per_minute / 60, capacity=requests_per_minute,
+                                     clock=clock, sleep=sleep)
+                         if requests_per_minute else None)
+        self.tokens = (TokenBucket(tokens_per_minute / 60, capacity=tokens_per_minute,
+                                   clock=clock, sleep=sleep)
+                       if tokens_per_minute else None)
+
+    def acquire(self, tokens=0):
+        """Block until one request costing `tokens` fits in both quotas."""
+        if self.requests:
+            self.requests.acquire()
+        if self.tokens and tokens:
+            self.tokens.acquire(tokens)
@@ -0,0 +1,37 @@
+"""Reference-label citations: [P17] in the output, expanded into links afterwards.
+
+Writing `[Full Paper Title](url)` for every cited paper makes the model
+regenerate long titles and URLs token by token, and it sometimes mangles them.
+In reference mode each paper in a prompt carries a short label instead, the
+model cites labels, and expand_references rewrites them from the paper table
+into canonical links.
+"""
+import re
+
+_LABEL_GROUP_RE = re.compile(r'\[(P\d+(?:\s*[,;]\s*P\d+)*)\](\([^)\s]*\))?')
+_LABEL_RE = re.compile(r'P\d+')
+
+
+def reference_table(papers):
+    """{label: paper} with labels P1, P2, ... in paper order."""
+    return {f'P{i}': paper for i, paper in enumerate(papers, 1)}
+
+
+def _link(paper):
+    title = ' '.join(paper['title'].split()).replace('[', '(').replace(']', ')')
+    return f"[{title}]({paper['url']})"
+
+
+def expand_references(text, table):
+    """Replace [P17] (and grouped [P3, P9]) labels with [Title](url) links.
+
+    A link target the model attached to a label is discarded in favour of the
+    canonical URL. Labels not in the table are left as they are.
+    """
+    def expand(match):
+        labels = _LABEL_RE.findall(match.group(1))
+        if not all(label in table for label in labels):
+            return match.group(0)
+        return ', '.join(_link(table[label]) for label in labels)
+
+    return _LABEL_GROUP_RE.sub(expand, text or '')
@@ -0,0 +1,210 @@
+"""Local stand-in for rss.arxiv.org, for load-testing the fetch layer offline.
+
+ReplayServer serves an RSS document for any slug (or '+'-joined combination)
+under /rss/<feed>: a recorded file from `recordings_dir` when one exists,
+otherwise a deterministic synthetic feed. It can inject latency, 5xx errors
+and 429s with Retry-After, and it answers conditional requests with 304 just
+like the real feeds do. Point ArxivClient.base_url at `server.base_url`.
+
+    with ReplayServer(latency=(0.05, 0.3), error_rate=0.05) as server:
+        client = ArxivClient([])
+        client.base_url = server.base_url
+        client.retrieve_results_by_category(['cs.LG', 'cs.AI'])
+        print(server.stats())
+"""
+import hashlib
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+_WORDS = ("model learning neural training data network optimization gradient "
+          "transformer attention language vision graph policy reward sample "
+          "bound estimator kernel latent diffusion token benchmark robust").split()
+_CROSS_LISTS = ['cs.AI', 'cs.CL', 'cs.CV', 'stat.ML', 'math.OC']
+# A Tuesday: the heaviest announcement day.
+FEED_DAY = datetime(2025, 1, 14, tzinfo=timezone(timedelta(hours=-5)))
+
+
+def _slug_seed(slug, seed):
+    return zlib.crc32(f'{slug}:{seed}'.encode())
+
+
+def synthetic_items(slug, n_items=None, seed=0, stale_fraction=0.05):
+    """Deterministic arXiv-shaped <item> strings for slug.
+
+    Ids are unique per slug. Roughly `stale_fraction` of the items carry the
+    previous day's pubDate, so the latest-date filter has something to drop.
+
+    Args:
+        n_items: Item count; by default 20-300 depending on the slug.
+    """
+    rng = random.Random(_slug_seed(slug, seed))
+    if n_items is None:
+        n_items = rng.randint(20, 300)
+    prefix = 10000 + _slug_seed(slug, 0) % 89 * 1000
+    items = []
+    for i in range(n_items):
+        arxiv_id = f'2501.{prefix + i:05d}'
+        day = FEED_DAY - timedelta(days=1) if rng.random() < stale_fraction else FEED_DAY
+        title = ' '.join(rng.choice(_WORDS) for _ in range(rng.randint(6, 14))).title()
+        abstract = ' '.join(rng.choice(_WORDS) for _ in range(rng.randint(120, 250)))
+        authors = ', '.join(f'Author{rng.randint(0, 9999)} Name{rng.randint(0, 9999)}'
+                            for _ in range(rng.randint(1, 12)))
+        extra = [c for c in rng.sample(_CROSS_LISTS, rng.randint(0, 2)) if c != slug]
+        categories = ''.join(f'<category>{escape(c)}</category>' for c in [slug] + extra)
+        items.append(
+            f'<item><title>{title}</title><link>https://arxiv.org/abs/{arxiv_id}</link>'
+            f'<description>arXiv:{arxiv_id}v1 Announce Type: new Abstract: {abstract}</description>'
+            f'<guid isPermaLink="false">oai:arXiv.org:{arxiv_id}v1</guid>{categories}'
+            f'<pubDate>{format_datetime(day)}</pubDate>'
+            f'<arxiv:announce_type>new</arxiv:announce_type>'
+            f'<dc:creator>{authors}</dc:creator></item>'
+        )
+    return items
+
+
+def render_feed(feed, items):
+    """Wrap item strings in an arXiv RSS envelope. Returns bytes."""
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<rss version="2.0" xmlns:dc="http://purl.org/dc/elements/1.1/" '
+        'xmlns:arxiv="http://arxiv.org/schemas/atom"><channel>'
+        f'<title>{escape(feed)} updates on arXiv.org</title>'
+        f'<link>http://rss.arxiv.org/rss/{escape(feed)}</link>'
+        + ''.join(items)
+        + '</channel></rss>'
+    ).encode('utf-8')
+
+
+def synthetic_feed(slug, n_items=None, seed=0, stale_fraction=0.05):
+    """A whole synthetic feed for one slug, as bytes."""
+    return render_feed(slug, synthetic_items(slug, n_items, seed, stale_fraction))
+
+
+class ReplayServer:
+    """Threaded local RSS server with fault injection.
+
+    Args:
+        recordings_dir: Directory of recorded feeds named '<feed>.xml' (e.g.
+            'cs.LG.xml'); feeds without a recording get a synthetic document.
+        items_per_feed: Item count for synthetic feeds (None varies by slug).
+        latency: Seconds added per response, a fixed number or a (min, max) range.
+        error_rate: Probability a request fails with 503.
+        rate_limit_rate: Probability a request gets 429 with Retry-After.
+        retry_after: Retry-After value (seconds) sent with 429s.
+        seed: Seed for the fault-injection draws.
+        host, port: Bind address; port 0 picks a free port.
+    """
+
+    def __init__(self, recordings_dir=None, items_per_feed=None, latency=0.0, error_rate=0.0,
+                 rate_limit_rate=0.0, retry_after=1, seed=0, host='127.0.0.1', port=0):
+        self.recordings_dir = Path(recordings_dir) if recordings_dir else None
+        self.items_per_feed = items_per_feed
+        self.latency = latency if isinstance(latency, (tuple, list)) else (latency, latency)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._documents = {}
+        self._counts = {'requests': 0, 'bytes': 0, 'status': {}}
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}/rss'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self):
+        """Requests served, body bytes sent and a count per status code."""
+        with self._lock:
+            return {'requests': self._counts['requests'], 'bytes': self._counts['bytes'],
+                    'status': dict(self._counts['status'])}
+
+    def document(self, feed):
+        """(body, etag) for a feed name, built once and then served from memory."""
+        with self._lock:
+            cached = self._documents.get(feed)
+        if cached:
+            return cached
+        recorded = self.recordings_dir / f'{feed}.xml' if self.recordings_dir else None
+        if recorded is not None and recorded.exists():
+            body = recorded.read_bytes()
+        else:
+            items = [item for slug in feed.split('+') for item in synthetic_items(slug, self.items_per_feed)]
+            body = render_feed(feed, list(dict.fromkeys(items)))
+        result = (body, f'"{hashlib.sha256(body).hexdigest()[:16]}"')
+        with self._lock:
+            self._documents[feed] = result
+        return result
+
+    def _draw(self):
+        with self._lock:
+            return self._rng.random(), self._rng.uniform(*self.latency)
+
+    def _record(self, status, size):
+        with self._lock:
+            self._counts['requests'] += 1
+            self._counts['bytes'] += size
+            self._counts['status'][status] = self._counts['status'].get(status, 0) + 1
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _reply(self, status, body=b'', headers=()):
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+                server._record(status, len(body))
+
+            def do_GET(self):
+                roll, delay = server._draw()
+                if delay > 0:
+                    time.sleep(delay)
+                path = self.path.split('?', 1)[0]
+                if not path.startswith('/rss/') or len(path) <= len('/rss/'):
+                    return self._reply(404)
+                if roll < server.error_rate:
+                    return self._reply(503)
+                if roll < server.error_rate + server.rate_limit_rate:
+                    return self._reply(429, headers=[('Retry-After', str(server.retry_after))])
+
+                body, etag = server.document(path[len('/rss/'):])
+                if self.headers.get('If-None-Match') == etag:
+                    return self._reply(304, headers=[('ETag', etag)])
+                self._reply(200, body, [('Content-Type', 'application/rss+xml'), ('ETag', etag)])
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
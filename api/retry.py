@@ -0,0 +1,173 @@
+"""Retry policy for outbound fetches: backoff, Retry-After, circuit breaking, deadline.
+
+The policy only decides *whether* and *when* to retry; callers schedule the
+retry themselves (see ArxivClient._fetch_many), so a failing feed waits in a
+queue instead of holding a worker that other feeds could use.
+"""
+import math
+import random
+import threading
+import time
+import urllib.error
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+# Statuses worth retrying; any other HTTP error is treated as permanent.
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+def retry_after_seconds(error, now=None):
+    """Seconds requested by an HTTPError's Retry-After header, or None.
+
+    Accepts both forms of the header: delta-seconds and an HTTP-date.
+    """
+    headers = getattr(error, 'headers', None)
+    value = headers.get('Retry-After') if headers is not None else None
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    now = now or datetime.now(timezone.utc)
+    return max(0.0, (when - now).total_seconds())
+
+
+def is_retryable(error):
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code in RETRYABLE_STATUSES
+    return True
+
+
+class RetryPolicy:
+    """Decides retry delays for one run.
+
+    Delays use "full jitter" exponential backoff: a uniform draw from
+    [0, min(max_delay, base_delay * 2**(attempt-1))], raised to any Retry-After
+    the server sent. A retry is refused once `max_attempts` is reached, when the
+    error is permanent, or when it could not start before the run deadline,
+    which counts from start() (the first fetch), not from construction.
+
+    Each host has a circuit breaker: after `breaker_threshold` consecutive
+    retryable failures (429, 5xx, timeouts) the circuit opens and callers hold
+    new requests to the host (see admit). Once `breaker_cooldown` seconds have
+    passed it is half-open: one probe request goes through; a success closes the
+    circuit and a failure opens it for another cooldown. Permanent errors such
+    as 404 mean the host answered, so they end a run of failures.
+
+    Args:
+        max_attempts: Total attempts per request, including the first.
+        base_delay: Backoff scale in seconds.
+        max_delay: Cap on a single backoff delay (Retry-After may exceed it,
+            up to the deadline).
+        run_budget: Seconds from start() until the run deadline; None for no deadline.
+        breaker_threshold: Consecutive failures that open a host's circuit.
+        breaker_cooldown: Seconds a host's circuit stays open.
+        clock, sleep, rng: Injectable time source, sleep and uniform [0, 1) random.
+    """
+
+    def __init__(self, max_attempts=5, base_delay=1.0, max_delay=30.0, run_budget=None,
+                 breaker_threshold=5, breaker_cooldown=60.0,
+                 clock=time.monotonic, sleep=time.sleep, rng=random.random):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.clock = clock
+        self.sleep = sleep
+        self.rng = rng
+        self.run_budget = run_budget
+        self.deadline = None
+        self._failures = {}
+        self._open_until = {}
+        self._probing = set()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the deadline clock; later calls are no-ops."""
+        with self._lock:
+            if self.deadline is None and self.run_budget is not None:
+                self.deadline = self.clock() + self.run_budget
+
+    def time_left(self):
+        """Seconds until the run deadline, or None if there is none."""
+        if self.run_budget is None:
+            return None
+        if self.deadline is None:
+            return float(self.run_budget)
+        return max(0.0, self.deadline - self.clock())
+
+    def blocked_for(self, host):
+        """Seconds until host's circuit lets requests through (0 if it is closed)."""
+        with self._lock:
+            return max(0.0, self._open_until.get(host, 0.0) - self.clock())
+
+    def admit(self, host):
+        """Ask to send a request to host now.
+
+        Returns:
+            0 if it may go (claiming the probe when the circuit is half-open),
+            the seconds left in the cooldown while the circuit is open, or
+            math.inf while the half-open probe is still out.
+        """
+        with self._lock:
+            open_until = self._open_until.get(host)
+            if open_until is None:
+                return 0.0
+            left = open_until - self.clock()
+            if left > 0:
+                return left
+            if host in self._probing:
+                return math.inf
+            self._probing.add(host)
+            return 0.0
+
+    def record_success(self, host):
+        with self._lock:
+            self._failures.pop(host, None)
+            self._open_until.pop(host, None)
+            self._probing.discard(host)
+
+    def record_failure(self, host):
+        with self._lock:
+            self._probing.discard(host)
+            failures = self._failures.get(host, 0) + 1
+            self._failures[host] = failures
+            if failures >= self.breaker_threshold:
+                self._open_until[host] = self.clock() + self.breaker_cooldown
+
+    def backoff(self, attempt):
+        cap = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return self.rng() * cap
+
+    def fits_deadline(self, delay):
+        left = self.time_left()
+        return left is None or delay < left
+
+    def next_delay(self, attempt, error, host=None):
+        """Record a failed attempt and return the delay before the next one.
+
+        Args:
+            attempt: The attempt that just failed (1-based).
+            error: The exception it raised.
+            host: Host the request went to, for circuit breaking.
+
+        Returns:
+            Seconds to wait before retrying, or None to give up.
+        """
+        retryable = is_retryable(error)
+        if host is not None:
+            if retryable:
+                self.record_failure(host)
+            else:
+                self.record_success(host)
+        if attempt >= self.max_attempts or not retryable:
+            return None
+        delay = max(self.backoff(attempt), retry_after_seconds(error) or 0.0)
+        if host is not None:
+            delay = max(delay, self.blocked_for(host))
+        return delay if self.fits_deadline(delay) else None
@@ -0,0 +1,99 @@
+"""Single-pass streaming parser for arXiv RSS feeds.
+
+Items are handed out one at a time from `iterparse` and cleared as soon as they
+have been converted, so a large feed (cs.LG on a Tuesday) never exists as a full
+element tree. lxml is used when installed; the stdlib parser is the fallback.
+"""
+import xml.etree.ElementTree as ET
+from email.utils import parsedate_to_datetime
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:  # optional fast path
+    lxml_etree = None
+
+BACKENDS = ('lxml', 'etree')
+
+
+def default_backend():
+    return 'lxml' if lxml_etree is not None else 'etree'
+
+
+def pub_date(item):
+    """The item's pubDate as a date, or None if missing or unparseable."""
+    raw = item.findtext('pubDate')
+    if not raw:
+        return None
+    try:
+        return parsedate_to_datetime(raw).date()
+    except Exception:
+        return None
+
+
+def _iter_items_etree(source):
+    channel = None
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if elem.tag == 'channel':
+                channel = elem
+            continue
+        if elem.tag == 'item':
+            yield elem
+            # Drop the finished item so the tree never grows past one item.
+            elem.clear()
+            if channel is not None:
+                channel.remove(elem)
+
+
+def _iter_items_lxml(source):
+    for _, elem in lxml_etree.iterparse(source, events=('end',), tag='item'):
+        yield elem
+        elem.clear(keep_tail=True)
+        parent = elem.getparent()
+        while parent is not None and elem.getprevious() is not None:
+            del parent[0]
+
+
+def iter_items(source, backend=None):
+    """Yield each <item> element of an RSS document in order.
+
+    The element is only valid until the next one is requested.
+
+    Args:
+        source: Binary file-like object (e.g. an HTTP response) or a path.
+        backend: 'lxml' or 'etree'. Defaults to lxml when it is installed.
+    """
+    backend = backend or default_backend()
+    if backend == 'lxml':
+        if lxml_etree is None:
+            raise ValueError("lxml backend requested but lxml is not installed")
+        return _iter_items_lxml(source)
+    if backend == 'etree':
+        return _iter_items_etree(source)
+    raise ValueError(f"Unknown RSS parser backend: {backend!r}")
+
+
+def parse_entries(source, process_entry, backend=None):
+    """Parse an RSS document in one pass.
+
+    Each item's pubDate is parsed exactly once and each item is converted with
+    `process_entry` while it is still in memory.
+
+    Args:
+        source: Binary file-like object or path.
+        process_entry: Callable turning an <item> element into a paper
+            (or None to skip it).
+        backend: See iter_items.
+
+    Returns:
+        List of (date or None, categories, paper) tuples in feed order, where
+        categories is the list of the item's <category> texts.
+    """
+    entries = []
+    for item in iter_items(source, backend):
+        paper = process_entry(item)
+        if not paper:
+            continue
+        categories = [(c.text or '').strip() for c in item.findall('category')]
+        entries.append((pub_date(item), categories, paper))
+    return entries
@@ -54,6 +54,50 @@ COMBINE_PROMPT = """
         Format each theme heading as "## Theme N: [Theme Name]". Do not include any introductory text before Theme 1.:\n\n
         """
 
+MULTI_CATEGORY_PROMPT = """
+You are a research scientist and professor with a PhD in machine learning. 
+You are also an educator skilled in explaining complex scientific concepts to the average technology professional. 
+Your summaries and explanations of concepts and papers in machine learning and artificial intelligence are like
+how Neil Degrasse Tyson and Carl Sagan explain astronomy and cosmology concepts. 
+
+You are provided with academic papers and their abstracts from several arXiv categories. Each category's papers
+are in their own section, which starts with a line "### Category: <category>".
+For EACH category separately, write a short blogpost-style summary of that category's papers that groups them into themes.
+
+For each theme:
+1. Use a clear, descriptive heading formatted as "## Theme N: [Theme Name]", numbering from 1 within each category
+2. Highlight the most important developments and insights within that theme
+3. When mentioning a paper, you MUST format it as a markdown hyperlink using the URL provided: [Full Paper Title](url). Always use the complete title as the link text.
+4. Only discuss a category's own papers in its summary
+
+Output format: for every category, in the order given, first a line containing exactly "=== <category> ===",
+then that category's summary. Write nothing before the first such line. After the last category's summary,
+write a line containing exactly "=== END ===".
+
+Papers by Category:
+"""
+
+# Reference-ID mode (PROMPT_REFERENCE_IDS=1): papers are labeled [P1], [P2], ...
+# and the model cites labels, which are expanded into [Title](url) links
+# afterwards instead of being generated token by token.
+REFERENCE_SUMMARY_PROMPT = SUMMARY_PROMPT.replace(
+    "4. When mentioning a paper, you MUST format it as a markdown hyperlink using the URL provided: "
+    "[Full Paper Title](url). Always use the complete title as the link text.",
+    "4. When mentioning a paper, cite it ONLY by its reference label exactly as given, e.g. [P17]. "
+    "Do not write its title or a URL; labels are turned into links afterwards.",
+)
+REFERENCE_MULTI_CATEGORY_PROMPT = MULTI_CATEGORY_PROMPT.replace(
+    "3. When mentioning a paper, you MUST format it as a markdown hyperlink using the URL provided: "
+    "[Full Paper Title](url). Always use the complete title as the link text.",
+    "3. When mentioning a paper, cite it ONLY by its reference label exactly as given, e.g. [P17]. "
+    "Do not write its title or a URL; labels are turned into links afterwards.",
+)
+REFERENCE_COMBINE_PROMPT = COMBINE_PROMPT.replace(
+    "do not remove or reformat any [Title](url) links.",
+    "do not remove or reformat any [Title](url) links, and keep every paper label such as [P17] "
+    "exactly as written.",
+)
+
 TOP5_PAPERS_PROMPT = """
 You are given a list of academic papers and their abstracts, all within the fields of machine learning and artificial intelligence. 
 Your task is to identify the top five most interesting papers from this list based on their contributions to the ML/AI literature, 
@@ -64,6 +108,15 @@ Select exactly five papers that you believe represent the most significant or gr
 List of Papers and Abstracts
 """
 
+DIGEST_PROMPT = """
+You are a research scientist with a PhD in machine learning.
+For each paper below, write a one- or two-sentence synopsis of its problem, method and main result,
+keeping the technical terms a specialist would search for.
+Answer with exactly one line per paper, in the form "<arXiv id>: <synopsis>", and nothing else.
+
+Papers:
+"""
+
 RSS_CATEGORIES = ['cs.LG', 'cs.AI', 'cs.CL', 'cs.CV', 'stat.ML']
 
 # Categories that always ship (the public archive), regardless of user signups.
@@ -73,3 +126,117 @@ FIXED_PUBLIC_CATEGORIES = ['cs.LG', 'cs.AI', 'cs.CL', 'cs.CV', 'stat.ML']
 # per-category feed blurbs are written. Both set via env in prod; empty locally.
 APP_DB_PATH = os.getenv("APP_DB_PATH", "")
 CONTENT_DIR = os.getenv("CONTENT_DIR", "")
+# Build the public blog post from the fixed categories' blurbs (one COMBINE
+# pass) instead of summarizing the blog papers a second time. Needs CONTENT_DIR.
+BLOG_FROM_BLURBS = os.getenv("BLOG_FROM_BLURBS", "").lower() in ("1", "true", "yes")
+
+# Category fetch engine: how many RSS feeds are downloaded at once, and the
+# shared politeness budget (requests/second, bursting up to the concurrency cap)
+# that every fetch and retry draws from.
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "4"))
+FETCH_REQUESTS_PER_SECOND = float(os.getenv("FETCH_REQUESTS_PER_SECOND", "1.0"))
+# Feed retries: attempts per feed (jittered exponential backoff, honoring
+# Retry-After) and the run-wide deadline, counted from the first fetch, after
+# which no retry is started.
+FETCH_MAX_ATTEMPTS = int(os.getenv("FETCH_MAX_ATTEMPTS", "5"))
+FETCH_RUN_BUDGET_SECONDS = float(os.getenv("FETCH_RUN_BUDGET_SECONDS", "600"))
+# Pack the per-category fetch into combined feeds ('cs.LG+cs.AI+...') and split
+# items back out by their <category> tags. Off by default.
+FETCH_COMBINED_FEEDS = os.getenv("FETCH_COMBINED_FEEDS", "").lower() in ("1", "true", "yes")
+
+# SQLite file caching arXiv export-API metadata (PDF links, categories, versions)
+# across runs. Empty keeps the cache in memory for the run only.
+ARXIV_METADATA_CACHE = os.getenv("ARXIV_METADATA_CACHE", "")
+
+# Keep-alive connection cap per host for the shared HTTP session.
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "4"))
+
+# Directory for the RSS conditional-GET cache (ETag / Last-Modified validators
+# only; no feed content is kept across runs).
+# Empty disables conditional requests.
+FEED_CACHE_DIR = os.getenv("FEED_CACHE_DIR", "")
+
+# Gemini quota shared by every LLM call in a run (batches, combines, categories),
+# and how many calls may be in flight at once.
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "15"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "250000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+# A call refused for quota (HTTP 429) is retried up to LLM_RATE_LIMIT_RETRIES
+# times after the server's Retry-After (or an exponential backoff from
+# LLM_RATE_LIMIT_BACKOFF_SECONDS), unless the wait would outlast the run budget.
+LLM_RATE_LIMIT_RETRIES = int(os.getenv("LLM_RATE_LIMIT_RETRIES", "3"))
+LLM_RATE_LIMIT_BACKOFF_SECONDS = float(os.getenv("LLM_RATE_LIMIT_BACKOFF_SECONDS", "2"))
+# Categories summarized at once by generate_category_blurbs. Their LLM calls
+# still share the limits above, so this bounds queued work, not API load.
+BLURB_CONCURRENCY = int(os.getenv("BLURB_CONCURRENCY", "8"))
+
+# On-disk LLM response cache keyed by model/config/system instruction/prompt.
+# Empty disables it.
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "")
+LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", "500"))
+LLM_CACHE_MAX_AGE_DAYS = float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", "7"))
+
+# Token budget for one summarization call (prompt template + papers + output),
+# and the output tokens reserved for the model's answer.
+LLM_BATCH_TOKEN_BUDGET = int(os.getenv("LLM_BATCH_TOKEN_BUDGET", "122000"))
+LLM_MAX_OUTPUT_TOKENS = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "5000"))
+# Maximum intermediate summaries merged by one combine call; more are reduced
+# in a tree, level by level.
+LLM_COMBINE_FAN_IN = int(os.getenv("LLM_COMBINE_FAN_IN", "8"))
+# Papers sampled for the per-run count_tokens calibration (0 disables it).
+TOKEN_CALIBRATION_SAMPLE = int(os.getenv("TOKEN_CALIBRATION_SAMPLE", "50"))
+# Per-paper digests: "extractive" (leading abstract sentences) or "llm" (one
+# short LLM pass per day) replaces each abstract in category prompts with a
+# synopsis built once per arXiv id; empty sends full abstracts. DIGEST_DB keeps
+# a day's digests across reruns; DIGEST_MAX_CHARS bounds extractive digests.
+DIGEST_MODE = os.getenv("DIGEST_MODE", "").lower()
+DIGEST_DB = os.getenv("DIGEST_DB", "")
+DIGEST_MAX_CHARS = int(os.getenv("DIGEST_MAX_CHARS", "400"))
+# Server-side caching of the shared prompt prefixes (SUMMARY/COMBINE/DIGEST
+# prompt + system instruction). The TTL should outlast a run (the systemd unit
+# allows 30 minutes); a run that outlives it gets a fresh cache shortly before
+# expiry. 0 disables caching. Prefixes under the minimum the API accepts are
+# sent inline.
+LLM_CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("LLM_CONTEXT_CACHE_TTL_SECONDS", "2400"))
+LLM_CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("LLM_CONTEXT_CACHE_MIN_TOKENS", "1024"))
+# Nightly batch-job mode: submit each round of summarization calls (all
+# categories and the blog together) as one asynchronous batch job instead of
+# interactive calls. Jobs not done within the timeout are cancelled and their
+# calls made interactively, so keep it inside the systemd unit's 30 minutes.
+LLM_BATCH_MODE = os.getenv("LLM_BATCH_MODE", "").lower() in ("1", "true", "yes")
+LLM_BATCH_POLL_SECONDS = float(os.getenv("LLM_BATCH_POLL_SECONDS", "30"))
+LLM_BATCH_TIMEOUT_SECONDS = float(os.getenv("LLM_BATCH_TIMEOUT_SECONDS", "600"))
+# Per-call deadline in seconds (0: none); a call that misses it fails like any
+# other failed call. With LLM_HEDGE=1, a call still out after the observed
+# LLM_HEDGE_QUANTILE latency (once LLM_HEDGE_MIN_SAMPLES calls have finished)
+# is sent a second time and the first answer wins.
+LLM_CALL_TIMEOUT_SECONDS = float(os.getenv("LLM_CALL_TIMEOUT_SECONDS", "120"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "").lower() in ("1", "true", "yes")
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# Wall-clock budget for all of a run's LLM calls, counted from the first call
+# that reaches the API (0: unlimited). Once spent, calls are skipped: summaries
+# keep what finished and list the remaining papers by title. Keep it inside the
+# unit's 30 minutes.
+LLM_RUN_BUDGET_SECONDS = float(os.getenv("LLM_RUN_BUDGET_SECONDS", "1200"))
+# Prompt compaction (PROMPT_COMPACTION=1): per-paper blocks keep the first
+# PROMPT_MAX_AUTHORS authors, a LaTeX-free abstract of at most
+# PROMPT_ABSTRACT_TOKENS tokens (0: untrimmed) and, with PROMPT_SHORT_URLS, the
+# bare arXiv id instead of the URL (expanded back to links in the output).
+PROMPT_COMPACTION = os.getenv("PROMPT_COMPACTION", "").lower() in ("1", "true", "yes")
+PROMPT_MAX_AUTHORS = int(os.getenv("PROMPT_MAX_AUTHORS", "3"))
+PROMPT_ABSTRACT_TOKENS = int(os.getenv("PROMPT_ABSTRACT_TOKENS", "250"))
+PROMPT_SHORT_URLS = os.getenv("PROMPT_SHORT_URLS", "1").lower() in ("1", "true", "yes")
+PROMPT_REFERENCE_IDS = os.getenv("PROMPT_REFERENCE_IDS", "").lower() in ("1", "true", "yes")
+# Local relevance ranking before summarization: at most RANK_MAX_PAPERS papers
+# (0 disables ranking) whose prompt blocks fit in RANK_TOKEN_BUDGET tokens (0:
+# no budget) go to the LLM per category; the rest are listed by title.
+RANK_MAX_PAPERS = int(os.getenv("RANK_MAX_PAPERS", "0"))
+RANK_TOKEN_BUDGET = int(os.getenv("RANK_TOKEN_BUDGET", "0"))
+# Multi-category packing: categories whose paper blocks total at most
+# PACK_SMALL_CATEGORY_TOKENS tokens (0 disables packing) share one LLM call, up
+# to PACK_MAX_CATEGORIES per call, with a sectioned reply split back per slug.
+# A packed call may write LLM_MAX_OUTPUT_TOKENS per category, and cites
+# reference labels under PROMPT_REFERENCE_IDS like single-category calls.
+PACK_SMALL_CATEGORY_TOKENS = int(os.getenv("PACK_SMALL_CATEGORY_TOKENS", "0"))
+PACK_MAX_CATEGORIES = int(os.getenv("PACK_MAX_CATEGORIES", "8"))
@@ -0,0 +1,941 @@
+"""Tests for the LLM side of the pipeline: pacing, concurrency and caching of Agent calls.
+
+No real Gemini calls: generate_content is replaced with in-process fakes.
+"""
+import asyncio
+import math
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import Mock
+
+import pytest
+from google.genai import errors as genai_errors
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from api.agent import BLOG_JOB, SYSTEM_INSTRUCTION, Agent
+from api.batch_jobs import BatchJobRunner
+from api.compaction import PromptCompactor, expand_arxiv_links
+from api.digests import DigestStore, extractive_digest
+from api.feeds import generate_category_blurbs
+from api.hedging import LatencyTracker, RunBudget
+from api.llm_backend import FakeBackend, GeminiBackend, LLMBackend, LLMRateLimitError, LLMResult
+from api.packing import pack, split_sections
+from api.ranking import rank_papers, select_papers
+from api.ratelimit import RateLimiter
+from api.references import expand_references, reference_table
+from api.settings import (
+    COMBINE_PROMPT,
+    DIGEST_PROMPT,
+    LLM_MAX_OUTPUT_TOKENS,
+    REFERENCE_COMBINE_PROMPT,
+    REFERENCE_MULTI_CATEGORY_PROMPT,
+    REFERENCE_SUMMARY_PROMPT,
+    SUMMARY_PROMPT,
+)
+from api.tokens import TokenCounter, count_pieces
+
+
+def _paper(i, summary="s"):
+    return {"title": f"Paper {i}", "url": f"https://arxiv.org/abs/2501.{i:05d}",
+            "authors": ["A"], "summary": summary}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def agent():
+    return Agent(gemini_api_key="dummy_key", rate_limiter=RateLimiter(), max_concurrency=4)
+
+
+# --- rate limiter ------------------------------------------------------------------
+
+
+def test_rate_limiter_enforces_requests_and_tokens_per_minute():
+    clock = FakeClock()
+    limiter = RateLimiter(requests_per_minute=2, tokens_per_minute=600, clock=clock, sleep=clock.sleep)
+
+    limiter.acquire(100)
+    limiter.acquire(100)
+    assert clock.sleeps == []  # a minute's quota may burst
+    limiter.acquire(100)
+    assert clock.sleeps == [30.0]  # third request waits for the RPM bucket
+
+    clock.sleeps.clear()
+    limiter.acquire(600)  # 300 tokens left; the rest refills at 10 tokens/s
+    assert sum(clock.sleeps) == pytest.approx(30.0)
+
+
+# --- concurrent batches ------------------------------------------------------------
+
+
+def test_batches_run_concurrently_and_keep_order(agent, monkeypatch):
+    lock = threading.Lock()
+    in_flight = {"now": 0, "peak": 0}
+    prompts = []
+
+    def fake_generate(model, contents, config):
+        with lock:
+            in_flight["now"] += 1
+            in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+            prompts.append(contents)
+        # later batches finish first, so order can only come from the map
+        batch_no = int(contents.split("**Title:** Paper ")[1].split("\n")[0]) if "**Title:**" in contents else -1
+        time.sleep(0.05 if batch_no == 0 else 0.01)
+        with lock:
+            in_flight["now"] -= 1
+        return Mock(text=f"summary of {batch_no}" if "List of Papers" in contents else contents)
+
+    monkeypatch.setattr(agent.client.models, "generate_content", fake_generate)
+    # one paper per batch
+    monkeypatch.setattr(agent, "_batch_papers", lambda papers, max_length, template: [[p] for p in papers])
+
+    result = agent.identify_important_papers([_paper(i) for i in range(6)])
+
+    assert in_flight["peak"] == 4
+    combine_prompt = result  # the fake echoes the combine prompt back
+    positions = [combine_prompt.index(f"summary of {i}") for i in range(6)]
+    assert positions == sorted(positions)
+
+
+def test_failed_batch_is_dropped_not_fatal(agent, monkeypatch):
+    def fake_generate(model, contents, config):
+        if "**Title:** Paper 1\n" in contents:
+            raise RuntimeError("quota")
+        return Mock(text="ok")
+
+    monkeypatch.setattr(agent.client.models, "generate_content", fake_generate)
+    monkeypatch.setattr(agent, "_batch_papers", lambda papers, max_length, template: [[p] for p in papers])
+    result = agent.identify_important_papers([_paper(0), _paper(1), _paper(2)])
+    # the failed batch's paper is still announced, by title
+    assert result == "ok\n\n## Also announced today\n\n- [Paper 1](https://arxiv.org/abs/2501.00001)"
+
+
+def test_inflight_cap_is_shared_across_concurrent_callers(monkeypatch):
+    agent = Agent(gemini_api_key="dummy_key", rate_limiter=RateLimiter(), max_concurrency=3)
+    lock = threading.Lock()
+    in_flight = {"now": 0, "peak": 0}
+
+    def fake_generate(model, contents, config):
+        with lock:
+            in_flight["now"] += 1
+            in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+        time.sleep(0.02)
+        with lock:
+            in_flight["now"] -= 1
+        return Mock(text="ok")
+
+    monkeypatch.setattr(agent.client.models, "generate_content", fake_generate)
+    monkeypatch.setattr(agent, "_batch_papers", lambda papers, max_length, template: [[p] for p in papers])
+    # four categories at once, each with three batches: 12 calls want to run together
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(agent.identify_important_papers, [[_paper(i) for i in range(3)]] * 4))
+
+    assert in_flight["peak"] == 3
+
+
+def test_many_summaries_reduce_in_a_tree(agent, monkeypatch):
+    combine_calls = []
+    lock = threading.Lock()
+
+    def fake_generate(model, contents, config):
+        with lock:
+            combine_calls.append(len(contents[len(COMBINE_PROMPT):].split("\n\n")))
+        # concatenate the inputs so the result keeps every leaf in order
+        return Mock(text=contents[len(COMBINE_PROMPT):].replace("\n\n", ""))
+
+    monkeypatch.setattr(agent.client.models, "generate_content", fake_generate)
+    result = agent._reduce_summaries([f"<<{i}>>" for i in range(20)], fan_in=4)
+
+    assert result == "".join(f"<<{i}>>" for i in range(20))
+    # 20 -> 5 -> 2 -> 1: every call merges at most fan_in summaries
+    assert sorted(combine_calls) == [2, 4, 4, 4, 4, 4, 4]
+
+
+def test_combine_groups_respect_token_budget_and_never_stall(agent):
+    summaries = ["word " * 400] * 6
+    size = agent.token_counter.count(summaries[0]) + 1
+    budget = agent.token_counter.count(COMBINE_PROMPT) + LLM_MAX_OUTPUT_TOKENS + 2 * size
+    groups = agent._combine_groups(summaries, fan_in=8, token_budget=budget)
+    assert [len(g) for g in groups] == [2, 2, 2]
+    # even when a single summary exceeds the budget, groups hold two so the level shrinks
+    groups = agent._combine_groups(summaries[:3], fan_in=8, token_budget=1)
+    assert [len(g) for g in groups] == [2, 1]
+
+    # capacity comes from the combine prompt in use; the reference-ID one is longer
+    budget = agent.token_counter.count(COMBINE_PROMPT) + LLM_MAX_OUTPUT_TOKENS + 3 * size
+    assert [len(g) for g in agent._combine_groups(summaries, 8, budget)] == [3, 3]
+    groups = agent._combine_groups(summaries, 8, budget, combine_prompt=REFERENCE_COMBINE_PROMPT)
+    assert [len(g) for g in groups] == [2, 2, 2]
+
+
+def test_blurbs_combine_in_one_pass(agent, monkeypatch):
+    prompts = []
+
+    def fake_generate(model, contents, config):
+        prompts.append(contents)
+        return Mock(text="post")
+
+    monkeypatch.setattr(agent.client.models, "generate_content", fake_generate)
+    blurbs = [f"## {slug}" for slug in ["cs.LG", "cs.AI", "cs.CL", "cs.CV", "stat.ML"]]
+
+    assert agent.combine_summaries(blurbs) == "post"
+    assert prompts == [COMBINE_PROMPT + "\n\n".join(blurbs)]
+    assert agent.combine_summaries(["only"]) == "only"
+    assert len(prompts) == 1
+
+
+# --- LLM response cache ------------------------------------------------------------
+
+
+def test_rerun_is_served_from_cache(tmp_path, monkeypatch):
+    from api.llm_cache import LLMCache
+
+    calls = []
+
+    def fake_generate(model, contents, config):
+        calls.append(contents)
+        return Mock(text=f"summary {len(calls)}")
+
+    def run():
+        agent = Agent("dummy_key", rate_limiter=RateLimiter(), cache=LLMCache(tmp_path))
+        monkeypatch.setattr(agent.client.models, "generate_content", fake_generate)
+        return agent, agent.identify_important_papers([_paper(1)])
+
+    first_agent, first = run()
+    second_agent, second = run()
+
+    assert first == second == "summary 1"
+    assert len(calls) == 1  # the rerun cost zero LLM calls
+    assert first_agent.cache.stats()["misses"] == 1
+    assert second_agent.cache.stats()["hits"] == 1
+
+
+def test_cache_key_covers_model_config_and_instruction():
+    from api.llm_cache import cache_key
+
+    base = cache_key("m", {"temperature": 0.1}, "sys", "prompt")
+    assert base == cache_key("m", {"temperature": 0.1}, "sys", "prompt")
+    assert base != cache_key("m2", {"temperature": 0.1}, "sys", "prompt")
+    assert base != cache_key("m", {"temperature": 0.2}, "sys", "prompt")
+    assert base != cache_key("m", {"temperature": 0.1}, "other", "prompt")
+
+
+def test_cache_evicts_expired_and_least_recently_used(tmp_path):
+    import os
+
+    from api.llm_cache import LLMCache
+
+    cache = LLMCache(tmp_path, max_bytes=10_000, max_age=3600)
+    cache.put("aa" + "0" * 62, "old")
+    old_path = next(tmp_path.glob("aa/*.json"))
+    os.utime(old_path, (0, 0))  # unused for far longer than max_age
+    LLMCache(tmp_path, max_bytes=10_000, max_age=3600)  # the startup sweep drops it
+    assert not old_path.exists()
+
+    small = LLMCache(tmp_path / "small", max_bytes=350, max_age=None)
+    for i, key in enumerate(["b1", "b2", "b3"]):
+        small.put(key * 32, "x" * 60)
+        os.utime(small._path(key * 32), (1000 + i, 1000 + i))
+    small.get("b1" * 32)  # refreshes b1, so b2 is now least recently used
+    small.put("b4" * 32, "x" * 60)
+    assert small.get("b2" * 32) is None
+    assert small.get("b1" * 32) == "x" * 60
+    assert small.stats()["bytes"] <= 350
+
+
+def test_cache_entry_expires_on_creation_time_despite_hits(tmp_path, monkeypatch):
+    from api.llm_cache import LLMCache
+
+    now = [1_000_000.0]
+    monkeypatch.setattr("api.llm_cache.time.time", lambda: now[0])
+    cache = LLMCache(tmp_path, max_age=2)
+    cache.put("cc" * 32, "hot")
+    for _ in range(4):
+        now[0] += 1
+        hit = cache.get("cc" * 32)  # hits refresh recency, not the lifetime
+    assert hit is None
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 2
+
+
+# --- token-budget batching ---------------------------------------------------------
+
+
+def test_pack_minimizes_bins_and_keeps_input_order():
+    # Greedy in arrival order needs 4 bins of 10 here; first-fit decreasing needs 3.
+    bins = pack([6, 5, 5, 4, 6, 4], 10)
+    assert len(bins) == 3
+    assert sorted(i for b in bins for i in b) == list(range(6))
+    assert all(b == sorted(b) for b in bins)
+    assert pack([15, 1], 10) == [[0], [1]]  # oversized items get a bin of their own
+
+
+def test_batches_fit_token_budget_with_room_for_prompt_and_output(agent):
+    papers = [_paper(i, summary="word " * (50 + 37 * (i % 7))) for i in range(40)]
+    budget = 6000
+    batches = agent._batch_papers(papers, budget, "Summarize these papers:")
+
+    assert sorted(p["title"] for b in batches for p in b) == sorted(p["title"] for p in papers)
+    counter = agent.token_counter
+    for batch in batches:
+        assert [papers.index(p) for p in batch] == sorted(papers.index(p) for p in batch)
+        text = "Summarize these papers:" + "\n".join(agent._combine_paper_info(p) for p in batch)
+        assert counter.count(text) <= budget - LLM_MAX_OUTPUT_TOKENS
+
+    total = sum(counter.count(agent._combine_paper_info(p)) for p in papers)
+    capacity = budget - LLM_MAX_OUTPUT_TOKENS - counter.count("Summarize these papers:")
+    assert len(batches) <= -(-total // capacity) + 1
+
+
+def test_calibrate_scales_estimate_to_model_count():
+    counter = TokenCounter()
+    text = "Graph neural networks for $\\mathcal{O}(n)$ message passing"
+    before = counter.count(text)
+    calls = []
+
+    def count_tokens(sample):
+        calls.append(sample)
+        return 2 * count_pieces(sample)
+
+    assert counter.calibrate([text, text], count_tokens) == pytest.approx(2.0)
+    assert len(calls) == 1
+    assert counter.calibrated
+    assert counter.count(text) != before
+    assert counter.count(text) == 2 * count_pieces(text) + 1
+
+
+
+def test_only_short_texts_are_memoized():
+    from api.tokens import MEMO_MAX_CHARS, _memo_count_pieces
+
+    _memo_count_pieces.cache_clear()
+    block = _paper(1)["summary"] * 100
+    prompt = "word " * MEMO_MAX_CHARS
+    assert count_pieces(block) == count_pieces(block) == 1
+    assert count_pieces(prompt) == MEMO_MAX_CHARS
+    assert _memo_count_pieces.cache_info().currsize == 1  # the block, never the prompt
+
+# --- paper digests -----------------------------------------------------------------
+
+
+def test_extractive_digest_keeps_leading_sentences():
+    abstract = "We study X.  It matters a lot.\nWe propose Y, which beats Z by 3%. Code is released."
+    assert extractive_digest(abstract, max_chars=40) == "We study X. It matters a lot."
+    assert extractive_digest(abstract, max_chars=1000) == " ".join(abstract.split())
+    assert extractive_digest("one very long opening sentence", max_chars=12) == "one very…"
+
+
+def test_digest_store_builds_each_paper_once_per_day(tmp_path):
+    db = str(tmp_path / "digests.sqlite")
+    shared = _paper(1, summary="Shared paper. Second sentence.")
+    store = DigestStore(db, date="2026-06-28")
+    assert store.build([shared, _paper(2)]) == 2
+    # cross-listed in another category: not rebuilt
+    assert store.build([dict(shared), _paper(3)]) == 1
+    assert store.stats() == {"digests": 3, "built": 3, "reused": 1}
+    store.close()
+
+    same_day = DigestStore(db, date="2026-06-28")
+    assert same_day.get("2501.00001") == "Shared paper. Second sentence."
+    assert same_day.build([shared]) == 0
+    same_day.close()
+    assert len(DigestStore(db, date="2026-06-29")) == 0
+
+
+def test_category_prompts_use_llm_digests_built_once(agent, monkeypatch):
+    prompts = []
+
+    def fake_generate(model, contents, config):
+        prompts.append(contents)
+        if contents.startswith(DIGEST_PROMPT):
+            ids = [line.split(":")[0] for line in contents[len(DIGEST_PROMPT):].splitlines()
+                   if line.startswith("2501.")]
+            # the model skips the last paper; it falls back to an extractive digest
+            return Mock(text="\n".join(f"{i}: digest of {i}" for i in ids[:-1]))
+        return Mock(text="blurb")
+
+    monkeypatch.setattr(agent.client.models, "generate_content", fake_generate)
+    agent.digests = DigestStore(date="2026-06-28", summarize=agent.digest_papers)
+    lg = [_paper(1, "Long abstract one. More."), _paper(2, "Long abstract two. More.")]
+    ai = [_paper(2, "Long abstract two. More."), _paper(3, "Long abstract three. More.")]
+    agent.digests.build(lg + ai)
+
+    agent.identify_important_papers(lg)
+    agent.identify_important_papers(ai)
+
+    digest_calls = [p for p in prompts if p.startswith(DIGEST_PROMPT)]
+    assert len(digest_calls) == 1
+    assert digest_calls[0].count("2501.00002:") == 1
+    category_prompts = [p for p in prompts if p.startswith(SUMMARY_PROMPT)]
+    assert "**Summary:** digest of 2501.00002" in category_prompts[0]
+    assert "**Summary:** digest of 2501.00002" in category_prompts[1]
+    assert "**Summary:** Long abstract three. More." in category_prompts[1]
+
+
+# --- LLM backends ------------------------------------------------------------------
+
+
+def test_fake_backend_is_deterministic_and_injects_faults():
+    sleeps = []
+    prompts = [f"**Title:** Paper {i}\n**URL:** https://arxiv.org/abs/2501.{i:05d}\n" for i in range(200)]
+
+    def run():
+        backend = FakeBackend(latency=(0.5, 2.0), rate_limit_rate=0.1, output_tokens=100, seed=7,
+                              sleep=sleeps.append)
+        outcomes = []
+        for prompt in prompts:
+            try:
+                outcomes.append(backend.generate(prompt, "sys", {"max_output_tokens": 150}).text)
+            except LLMRateLimitError as e:
+                assert e.code == 429
+                outcomes.append(None)
+        return backend, outcomes
+
+    backend, first = run()
+    assert run()[1] == first
+    assert 5 < first.count(None) < 40
+    assert backend.usage()["errors"] == first.count(None)
+    assert backend.usage()["calls"] == 200
+    assert "[Paper 3](https://arxiv.org/abs/2501.00003)" in first[3]
+    ordered = sorted(sleeps[:200])
+    assert 0.35 < ordered[100] < 0.7  # median
+    assert 1.4 < ordered[190] < 2.9  # ~p95
+    assert all(len(text.split()) <= 150 + 20 for text in first if text)
+
+
+def test_fake_backend_async_generate():
+    backend = FakeBackend(latency=(0.01, 0.02), output_tokens=50)
+
+    async def main():
+        return await asyncio.gather(*(backend.agenerate(f"prompt {i}", "sys", {}) for i in range(20)))
+
+    start = time.perf_counter()
+    results = asyncio.run(main())
+    assert time.perf_counter() - start < 0.5  # concurrent, not 20 sequential waits
+    assert len(results) == 20 and all(r.output_tokens > 0 for r in results)
+    assert backend.usage()["calls"] == 20
+
+
+def test_gemini_429_raises_rate_limit_error_with_retry_delay():
+    details = [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "12s"}]
+    client = Mock()
+    client.models.generate_content.side_effect = genai_errors.ClientError(
+        429, {"error": {"code": 429, "message": "quota", "status": "RESOURCE_EXHAUSTED", "details": details}})
+    backend = GeminiBackend(client)
+
+    with pytest.raises(LLMRateLimitError) as raised:
+        backend.generate("prompt", "sys", {})
+
+    assert raised.value.retry_after == 12
+    assert backend.usage()["errors"] == 1
+
+
+def test_agent_runs_end_to_end_on_fake_backend():
+    backend = FakeBackend(latency=(0, 0), output_tokens=50)
+    agent = Agent(backend=backend, rate_limiter=RateLimiter(), max_concurrency=4)
+    assert agent.client is None
+    batches = [[_paper(i) for i in range(j, j + 2)] for j in range(0, 20, 2)]
+    agent._batch_papers = lambda papers, max_length, template: batches
+
+    result = agent.identify_important_papers([_paper(i) for i in range(20)])
+
+    # 10 batches -> combine tree (fan-in 8) -> 2 -> 1: 13 calls, links preserved
+    assert backend.usage()["calls"] == 13
+    assert all(f"(https://arxiv.org/abs/2501.{i:05d})" in result for i in range(20))
+    assert isinstance(agent.backend, LLMBackend)
+
+
+# --- context caching ---------------------------------------------------------------
+
+
+def _fake_agent(latency=(0, 0), **backend_args):
+    backend = FakeBackend(latency=latency, output_tokens=20, **backend_args)
+    agent = Agent(backend=backend, rate_limiter=RateLimiter(), max_concurrency=4)
+    agent._batch_papers = lambda papers, max_length, template: [[p] for p in papers]
+    return agent, backend
+
+
+def test_shared_prefix_is_cached_once_and_not_resent():
+    inline_agent, inline = _fake_agent()
+    inline_agent.context_cache_ttl = 0
+    cached_agent, cached = _fake_agent()
+    cached_agent.context_cache_min_tokens = 0
+    papers = [_paper(i) for i in range(6)]
+
+    inline_agent.identify_important_papers(papers)
+    cached_agent.identify_important_papers(papers)
+
+    prefix_bytes = len((SYSTEM_INSTRUCTION + SUMMARY_PROMPT).encode())
+    # inline: the prefix goes out with every call; cached: once per prefix, at creation
+    assert inline.usage()["prompt_bytes"] - cached.usage()["prompt_bytes"] == 5 * prefix_bytes
+    assert len(cached_agent._prefix_handles) == 2
+    assert cached.usage()["cached_tokens"] == \
+        6 * cached.count_tokens(SUMMARY_PROMPT) + cached.count_tokens(COMBINE_PROMPT)
+    assert inline.usage()["cached_tokens"] == 0
+
+    cached_agent.release_prefix_caches()
+    assert cached._prefixes == {}
+
+
+def test_small_or_uncacheable_prefix_falls_back_inline(monkeypatch):
+    agent, backend = _fake_agent()
+    assert agent.context_cache_min_tokens > backend.count_tokens(SUMMARY_PROMPT)
+    agent.identify_important_papers([_paper(1)])
+    assert {prefix: handle for prefix, (handle, _) in agent._prefix_handles.items()} == {SUMMARY_PROMPT: None}
+
+    agent, backend = _fake_agent()
+    agent.context_cache_min_tokens = 0
+    calls = []
+
+    def unavailable(*args):
+        calls.append(args)
+        raise RuntimeError("caching not supported for this model")
+
+    monkeypatch.setattr(backend, "create_prefix_cache", unavailable)
+    agent.identify_important_papers([_paper(1), _paper(2)])
+    assert agent.backend.usage()["errors"] == 0
+    assert len(calls) == 2  # one attempt per prefix (summary, combine), not per call
+
+
+
+def test_long_prefix_is_cached_reused_and_replaced_near_expiry():
+    agent, backend = _fake_agent()
+    clock = FakeClock()
+    agent.clock = clock
+    agent.context_cache_ttl = 1800
+    prefix = "Follow these house style rules closely. " * 200  # well over the 1024-token minimum
+    assert agent.token_counter.count(prefix) > agent.context_cache_min_tokens
+
+    first = agent._call_llm("**Title:** A\n**URL:** https://arxiv.org/abs/2501.00001\n", prefix=prefix)
+    agent._call_llm("**Title:** B\n**URL:** https://arxiv.org/abs/2501.00002\n", prefix=prefix)
+    (handle,) = backend._prefixes
+    assert backend.usage()["cached_tokens"] == 2 * backend.count_tokens(prefix)
+
+    clock.sleep(1800 - 120)  # within the refresh margin: a new cache replaces the old one
+    agent._call_llm("**Title:** C\n**URL:** https://arxiv.org/abs/2501.00003\n", prefix=prefix)
+    (renewed,) = backend._prefixes
+    assert renewed != handle
+    assert "(https://arxiv.org/abs/2501.00001)" in first
+
+    backend.delete_prefix_cache(renewed)  # expired server-side ahead of schedule
+    text = agent._call_llm("**Title:** D\n**URL:** https://arxiv.org/abs/2501.00004\n", prefix=prefix)
+    assert "(https://arxiv.org/abs/2501.00004)" in text  # resent inline
+    assert prefix not in agent._prefix_handles  # the next call caches it again
+    agent._call_llm("**Title:** E\n**URL:** https://arxiv.org/abs/2501.00005\n", prefix=prefix)
+    assert len(backend._prefixes) == 1 and renewed not in backend._prefixes
+
+    agent.release_prefix_caches()
+    assert backend._prefixes == {}
+
+# --- batch-job mode ----------------------------------------------------------------
+
+
+def _categories():
+    # 1, 3 and 10 batches of one paper each: the last needs two combine levels
+    return {slug: [_paper(100 * n + i) for i in range(count)]
+            for n, (slug, count) in enumerate([("cs.LG", 1), ("cs.AI", 3), ("cs.CV", 10)], 1)}
+
+
+def test_batch_jobs_run_plans_in_lockstep_and_match_interactive():
+    interactive, _ = _fake_agent()
+    expected = {slug: interactive.identify_important_papers(p) for slug, p in _categories().items()}
+
+    agent, backend = _fake_agent()
+    runner = BatchJobRunner(agent, poll_interval=5, sleep=lambda s: None)
+    plans = {slug: agent._summary_plan(p) for slug, p in _categories().items()}
+    assert runner.run(plans) == expected
+    # round 1: 14 batches; round 2: cs.AI and cs.CV combines; round 3: cs.CV's last level
+    assert runner.jobs == 3
+    assert [len(job["requests"]) for job in backend._jobs] == [14, 3, 1]
+    assert all(job["polls"] == 2 for job in backend._jobs)
+
+
+def test_failed_or_slow_batch_job_falls_back_to_direct_calls(tmp_path):
+    from api.llm_cache import LLMCache
+
+    agent, backend = _fake_agent(batch_polls=10 ** 6)
+    agent.cache = LLMCache(str(tmp_path))
+    clock = FakeClock()
+    runner = BatchJobRunner(agent, poll_interval=30, timeout=120, clock=clock, sleep=clock.sleep)
+
+    result = runner.run({"cs.LG": agent._summary_plan([_paper(1), _paper(2)])})
+
+    assert "(https://arxiv.org/abs/2501.00001)" in result["cs.LG"]
+    assert backend._jobs[0]["cancelled"]
+    assert sum(clock.sleeps) == 120
+    assert backend.usage()["calls"] == 3  # the cancelled job's 2 calls, then the combine
+
+    # a rerun is answered from the LLM cache without submitting anything
+    jobs_before = len(backend._jobs)
+    again = BatchJobRunner(agent, clock=clock, sleep=clock.sleep).run(
+        {"cs.LG": agent._summary_plan([_paper(1), _paper(2)])})
+    assert again == result
+    assert len(backend._jobs) == jobs_before
+
+
+def test_summarize_with_batch_jobs_requires_a_batch_backend(agent):
+    agent.backend = object()
+    with pytest.raises(ValueError):
+        agent.summarize_with_batch_jobs({"cs.LG": [_paper(1)]})
+
+
+# --- prompt compaction -------------------------------------------------------------
+
+
+def test_compactor_caps_authors_strips_latex_and_trims():
+    compactor = PromptCompactor(max_authors=3, abstract_tokens=20, short_urls=True)
+    paper = {"title": "A  Study\nof Things", "url": "https://arxiv.org/abs/2501.00042",
+             "authors": [f"Author {i}" for i in range(40)],
+             "summary": "We bound $\\mathcal{O}(n^2)$ \\emph{mixing}\n  times. " + "More words here. " * 30}
+
+    block = compactor.render(paper)
+
+    assert "**Title:** A Study of Things\n**URL:** 2501.00042\n" in block
+    assert "**Authors:** Author 0, Author 1, Author 2, et al.\n" in block
+    assert "We bound O(n^2) mixing times." in block
+    assert compactor.token_counter.count(block.split("**Summary:** ")[1]) <= 21
+    assert compactor.render(paper) is block
+    stats = compactor.stats()
+    assert stats["papers"] == 1
+    assert stats["tokens_saved"] == stats["tokens_before"] - stats["tokens_after"] > 100
+
+
+def test_compacted_prompts_expand_bare_ids_back_to_links():
+    agent, backend = _fake_agent()
+    agent.compactor = PromptCompactor(token_counter=agent.token_counter)
+    prompts = []
+    generate = backend.generate
+    backend.generate = lambda prompt, *args, **kwargs: prompts.append(prompt) or generate(prompt, *args, **kwargs)
+
+    result = agent.identify_important_papers([_paper(1), _paper(2)])
+
+    assert "https://arxiv.org" not in "".join(prompts)
+    assert "[Paper 1](https://arxiv.org/abs/2501.00001)" in result
+    assert expand_arxiv_links("[X](https://arxiv.org/abs/2501.00001)") == "[X](https://arxiv.org/abs/2501.00001)"
+
+
+# --- reference-ID prompting --------------------------------------------------------
+
+
+def test_expand_references_uses_canonical_links():
+    table = reference_table([{"title": "A [New]\n Method", "url": "https://arxiv.org/abs/2501.00001"},
+                             {"title": "B", "url": "https://arxiv.org/abs/2501.00002"}])
+    text = "See [P1], [P2, P1] and [P2](https://arxiv.org/abs/mangled); [P9] is unknown."
+    assert expand_references(text, table) == (
+        "See [A (New) Method](https://arxiv.org/abs/2501.00001), "
+        "[B](https://arxiv.org/abs/2501.00002), [A (New) Method](https://arxiv.org/abs/2501.00001) "
+        "and [B](https://arxiv.org/abs/2501.00002); [P9] is unknown.")
+
+
+def test_reference_mode_prompts_with_labels_and_expands_after_combine():
+    agent, backend = _fake_agent()
+    agent.reference_ids = True
+    prompts = []
+    generate = backend.generate
+    backend.generate = lambda prompt, *args, **kwargs: prompts.append(prompt) or generate(prompt, *args, **kwargs)
+
+    result = agent.identify_important_papers([_paper(i) for i in range(1, 4)])
+
+    batch_prompts = [p for p in prompts if p.startswith(REFERENCE_SUMMARY_PROMPT)]
+    assert [p.count("**Ref:** [P") for p in batch_prompts] == [1, 1, 1]
+    assert "**URL:**" not in "".join(batch_prompts)
+    combine = [p for p in prompts if p.startswith(REFERENCE_COMBINE_PROMPT)]
+    assert len(combine) == 1 and "[P3]" in combine[0]
+    for i in range(1, 4):
+        assert f"[Paper {i}](https://arxiv.org/abs/2501.{i:05d})" in result
+    assert not any(f"[P{i}]" in result for i in range(1, 4))
+
+
+# --- local ranking -----------------------------------------------------------------
+
+
+def _topic_papers():
+    on_topic = [_paper(i, summary=f"diffusion models denoising score matching sampler variant {i}")
+                for i in range(5)]
+    off_topic = [_paper(10 + i, summary=f"tax policy auditing of municipal budgets case {i}") for i in range(2)]
+    return [off_topic[0]] + on_topic + [off_topic[1]]
+
+
+def test_rank_prefers_central_papers_and_cross_listings():
+    papers = _topic_papers()
+    order = rank_papers(papers)
+    assert set(order[-2:]) == {0, 6}  # off-topic papers rank last
+
+    # equal centrality; the cross-listed one moves ahead
+    assert order.index(0) < order.index(6)
+    boosted = rank_papers(papers, cross_listings={"2501.00011": 3})
+    assert boosted.index(6) < boosted.index(0)
+
+
+def test_select_papers_caps_count_and_budget_keeping_feed_order():
+    papers = _topic_papers()
+    kept, rest = select_papers(papers, max_papers=3)
+    assert len(kept) == 3 and len(rest) == 4
+    assert [papers.index(p) for p in kept] == sorted(papers.index(p) for p in kept)
+    assert not {0, 6} & {papers.index(p) for p in kept}
+
+    kept, rest = select_papers(papers, max_papers=0, token_budget=25, size=lambda p: 10)
+    assert len(kept) == 2
+    assert select_papers(papers, max_papers=10) == (papers, [])
+
+
+def test_ranked_summary_lists_the_rest_by_title():
+    agent, backend = _fake_agent()
+    agent.rank_max_papers = 3
+    papers = _topic_papers()
+
+    result = agent.identify_important_papers(papers)
+
+    assert backend.usage()["calls"] == 4  # 3 kept papers in single-paper batches + 1 combine
+    appendix = result.split("## Also announced today")[1]
+    assert "[Paper 10](https://arxiv.org/abs/2501.00010)" in appendix
+    assert appendix.count("\n- [") == 4
+
+
+# --- category packing --------------------------------------------------------------
+
+
+def test_split_sections_keeps_asked_for_slugs():
+    text = ("=== cs.LG ===\n## Theme 1: A\nlg\n\n=== cs.XX ===\nstray\n"
+            "=== cs.AI ===\n\n=== cs.LG ===\nrepeat")
+    assert split_sections(text, ["cs.LG", "cs.AI"]) == {"cs.LG": "## Theme 1: A\nlg"}
+    assert split_sections("", ["cs.LG"]) == {}
+
+
+def test_split_sections_drops_the_last_section_of_a_cut_off_reply():
+    text = "=== a ===\nfull\n\n=== b ===\ncut mid-sen"
+    assert split_sections(text, ["a", "b"]) == {"a": "full"}
+    assert split_sections(text + "tence\n=== END ===\n", ["a", "b"]) == {"a": "full", "b": "cut mid-sentence"}
+
+
+def test_pack_categories_groups_only_small_categories():
+    agent, _ = _fake_agent()
+    categories = {"a": [_paper(1)], "b": [_paper(2)], "big": [_paper(10 + i) for i in range(20)],
+                  "c": [_paper(3)], "empty": []}
+    assert agent.pack_categories(categories) == []  # off by default
+
+    agent.pack_small_category_tokens = 200
+    assert agent.pack_categories(categories) == [["a", "b", "c"]]
+    agent.pack_max_categories = 2
+    assert agent.pack_categories(categories) == [["a", "b"]]  # a lone leftover is not a pack
+
+
+def test_packed_blurbs_share_one_call_and_keep_their_own_links(tmp_path):
+    categories = {slug: [_paper(10 * n + i) for i in range(2)] for n, slug in enumerate(["a", "b", "c"])}
+    agent, backend = _fake_agent()
+    agent.pack_small_category_tokens = 200
+
+    written = generate_category_blurbs(categories, agent, tmp_path, "2025-01-01")
+
+    assert written == ["a", "b", "c"]
+    assert backend.usage()["calls"] == 1
+    for n, slug in enumerate(categories):
+        blurb = (tmp_path / "2025-01-01" / f"{slug}.md").read_text()
+        assert blurb.startswith("## Theme 1")
+        links = {f"(https://arxiv.org/abs/2501.{10 * m + i:05d})" for m in range(3) for i in range(2)}
+        own = {f"(https://arxiv.org/abs/2501.{10 * n + i:05d})" for i in range(2)}
+        assert {link for link in links if link in blurb} == own
+
+
+def test_missing_pack_section_is_summarized_alone(monkeypatch):
+    agent, backend = _fake_agent()
+    categories = {"a": [_paper(1)], "b": [_paper(2)]}
+    reply = backend._reply
+    monkeypatch.setattr(backend, "_reply", lambda rng, prompt, config: LLMResult(
+        reply(rng, prompt, config).text.split("=== b ===")[0] + "=== END ===", 1, 1))
+
+    result = agent.summarize_category_pack(categories)
+
+    assert set(result) == {"a", "b"}
+    assert "(https://arxiv.org/abs/2501.00002)" in result["b"]
+    assert backend.usage()["calls"] == 2
+
+
+def test_pack_gets_an_output_budget_per_category_and_resummarizes_a_cut_off_section():
+    agent, backend = _fake_agent()
+    agent._call_llm = Mock(wraps=agent._call_llm)
+    categories = {"a": [_paper(1)], "b": [_paper(2)], "c": [_paper(3)]}
+
+    result = agent.summarize_category_pack(categories)
+
+    assert agent._call_llm.call_args_list[0].kwargs["max_tokens"] == 3 * LLM_MAX_OUTPUT_TOKENS
+    assert backend.usage()["calls"] == 1 and "(https://arxiv.org/abs/2501.00003)" in result["c"]
+
+    backend.output_tokens = 10 ** 6  # every reply runs into its output limit
+    agent.summarize_category_pack({"d": [_paper(4)], "e": [_paper(5)]})
+    assert backend.usage()["calls"] == 1 + 1 + 2  # the cut-off pack, then d and e alone
+
+
+def test_packed_blurbs_cite_reference_labels():
+    agent, backend = _fake_agent()
+    agent.reference_ids = True
+    agent._call_llm = Mock(wraps=agent._call_llm)
+    categories = {"a": [_paper(1), _paper(2)], "b": [_paper(3)]}
+
+    result = agent.summarize_category_pack(categories)
+
+    prompt = agent._call_llm.call_args_list[0].args[0]
+    assert "**Ref:** [P3]" in prompt and "https://arxiv.org" not in prompt
+    assert agent._call_llm.call_args_list[0].kwargs["prefix"] == REFERENCE_MULTI_CATEGORY_PROMPT
+    assert "[Paper 3](https://arxiv.org/abs/2501.00003)" in result["b"]
+    assert "[P1]" not in result["a"] and "(https://arxiv.org/abs/2501.00001)" in result["a"]
+
+
+def test_batch_jobs_pack_small_categories():
+    agent, backend = _fake_agent(batch_polls=0)
+    agent.pack_small_category_tokens = 200
+    categories = _categories()
+
+    result = agent.summarize_with_batch_jobs(categories)
+
+    assert list(result) == list(categories)
+    assert "(https://arxiv.org/abs/2501.00100)" in result["cs.LG"]
+    # cs.LG and cs.AI share a call; cs.CV is summarized on its own
+    assert len(backend._jobs[0]["requests"]) == 11
+
+
+def test_blog_is_never_packed_with_categories():
+    agent, backend = _fake_agent(batch_polls=0)
+    agent.pack_small_category_tokens = 200
+    jobs = {"cs.LG": [_paper(1)], BLOG_JOB: [_paper(2)], "cs.AI": [_paper(3)]}
+
+    result = agent.summarize_with_batch_jobs(jobs)
+
+    assert result[BLOG_JOB].startswith("## Theme 1") and "=== " not in result[BLOG_JOB]
+    prompts = [prompt for prompt, _, _ in backend._jobs[0]["requests"]]
+    assert len(prompts) == 2  # the blog's own call and one pack of cs.LG + cs.AI
+    assert sum("### Category: cs.LG" in p and "### Category: cs.AI" in p for p in prompts) == 1
+    assert not any(BLOG_JOB in p for p in prompts)
+
+
+# --- deadlines and hedging ---------------------------------------------------------
+
+
+def test_latency_tracker_and_run_budget():
+    tracker = LatencyTracker(window=20, quantile=0.95, min_samples=10)
+    for seconds in range(1, 10):
+        tracker.record(seconds / 10)
+    assert tracker.threshold() is None
+    tracker.record(5.0)
+    assert tracker.threshold() == 5.0
+    for _ in range(20):
+        tracker.record(0.1)
+    assert tracker.threshold() == 0.1  # old latencies age out
+
+    clock = FakeClock()
+    budget = RunBudget(60, clock=clock)
+    clock.sleep(1000)  # e.g. fetching feeds: not charged until the first LLM call
+    assert budget.remaining() == 60
+    budget.start()
+    clock.sleep(45)
+    budget.start()
+    assert budget.remaining() == 15 and not budget.expired
+    clock.sleep(20)
+    assert budget.expired and budget.remaining() == 0
+    assert RunBudget(0).remaining() == math.inf
+
+
+def iter_plan(calls):
+    outputs = yield calls
+    return outputs
+
+
+@pytest.fixture
+def release():
+    # stalled fake calls wait on this; set at teardown so their threads finish
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def test_stalled_call_times_out_and_papers_are_listed(release):
+    agent, backend = _fake_agent(stall_rate=1.0, sleep=release.wait)
+    agent.call_timeout = 0.2
+
+    start = time.monotonic()
+    result = agent.identify_important_papers([_paper(1), _paper(2)])
+
+    assert time.monotonic() - start < 2
+    assert result.startswith("## Also announced today")
+    assert "[Paper 2](https://arxiv.org/abs/2501.00002)" in result
+    assert agent.call_stats()["timeouts"] == 2
+
+
+def test_hedging_cuts_stalls_to_a_typical_call(release):
+    agent, backend = _fake_agent(latency=(0.01, 0.02), sleep=release.wait)
+    agent.hedge = True
+    agent.call_timeout = 5
+    agent.latencies = LatencyTracker(min_samples=10)
+    agent.identify_important_papers([_paper(100 + i) for i in range(20)])  # warm up the p95
+
+    backend.stall_rate = 0.05
+    start = time.monotonic()
+    outputs = agent._run_plan(iter_plan([(_paper(i)["title"], SUMMARY_PROMPT) for i in range(40)]))
+
+    assert time.monotonic() - start < 2
+    assert None not in outputs
+    stats = agent.call_stats()
+    assert stats["timeouts"] == 0 and stats["hedge_wins"] >= 1
+    assert stats["hedges"] >= stats["hedge_wins"]
+    assert stats["hedge_after"] < 0.1
+
+
+def test_spent_run_budget_skips_calls_and_degrades():
+    agent, backend = _fake_agent()
+    clock = FakeClock()
+    agent.run_budget = RunBudget(600, clock=clock)
+    assert agent.identify_important_papers([_paper(1)]).startswith("## Theme 1")
+
+    clock.sleep(600)
+    result = agent.identify_important_papers([_paper(2), _paper(3)])
+
+    assert result.startswith("## Also announced today") and "[Paper 3]" in result
+    assert backend.usage()["calls"] == 1
+    assert agent.call_stats()["skipped"] == 2
+
+
+def test_rate_limited_call_waits_out_retry_after_and_succeeds():
+    waits = []
+    agent, backend = _fake_agent(rate_limit_rate=1.0)
+
+    def sleep(seconds):
+        waits.append(seconds)
+        if len(waits) == 2:
+            backend.rate_limit_rate = 0.0
+
+    agent.sleep = sleep
+    assert agent.identify_important_papers([_paper(1)]).startswith("## Theme 1")
+    assert waits == [1, 1]  # FakeBackend's Retry-After
+    assert backend.usage()["calls"] == 3
+    assert agent.call_stats()["rate_limited"] == 2
+
+
+def test_rate_limit_retries_are_bounded_by_count_and_run_budget():
+    waits = []
+    agent, backend = _fake_agent(rate_limit_rate=1.0)
+    agent.sleep = waits.append
+    with pytest.raises(LLMRateLimitError):
+        agent._call_llm("prompt")
+    assert waits == [1, 1, 1] and backend.usage()["calls"] == 4
+
+    clock = FakeClock()
+    agent.run_budget = RunBudget(600, clock=clock)
+    agent.run_budget.start()
+    clock.sleep(599.5)
+    with pytest.raises(LLMRateLimitError):
+        agent._call_llm("other prompt")
+    assert waits == [1, 1, 1] and backend.usage()["calls"] == 5
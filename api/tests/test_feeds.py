@@ -3,16 +3,19 @@
 Covers every acceptance criterion in docs/PHASE1_CHUNKS.md chunk 4.
 No real Gemini or network calls: the Agent and the RSS fetch are mocked.
 """
+import io
 import re
 import sqlite3
 import sys
+import threading
+import time
 from pathlib import Path
 from unittest.mock import Mock, patch
 
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
 from api.arxiv_client import ArxivClient
-from api.feeds import generate_category_blurbs, get_fetch_list, today_ny
+from api.feeds import generate_category_blurbs, get_fetch_list, read_category_blurbs, today_ny
 from api.settings import FIXED_PUBLIC_CATEGORIES
 
 
@@ -65,12 +68,12 @@ def test_retrieve_results_by_category_fetches_each_slug_once(monkeypatch):
     client = ArxivClient([])
     calls = []
     monkeypatch.setattr(client, "_fetch_category_papers", lambda slug: calls.append(slug) or [])
-    monkeypatch.setattr("api.arxiv_client.time.sleep", lambda s: None)
 
     results = client.retrieve_results_by_category(["cs.LG", "cs.AI", "cs.LG"])
 
-    assert calls == ["cs.LG", "cs.AI"]  # one download per unique category
-    assert set(results) == {"cs.LG", "cs.AI"}
+    # one download per unique category (fetches run concurrently, so order is free)
+    assert sorted(calls) == ["cs.AI", "cs.LG"]
+    assert list(results) == ["cs.LG", "cs.AI"]
 
 
 def test_fetch_list_zero_users_equals_fixed(tmp_path):
@@ -108,10 +111,9 @@ def test_fetch_category_papers_dedupes_within_feed():
       <item><title>A again</title><link>http://dup</link><description>Abstract: s</description><dc:creator>Au</dc:creator></item>
     </channel></rss>"""
     client = ArxivClient()
-    mock_resp = Mock()
-    mock_resp.read.return_value = xml
     with patch("urllib.request.urlopen") as mock_urlopen:
-        mock_urlopen.return_value.__enter__.return_value = mock_resp
+        # file-like body: the feed is parsed while it streams in
+        mock_urlopen.return_value.__enter__.return_value = io.BytesIO(xml)
         papers = client._fetch_category_papers("cs.LG")
     assert len(papers) == 1
     assert papers[0]["url"] == "http://dup"
@@ -151,6 +153,66 @@ def test_blurbs_use_provided_date_dir(tmp_path):
     assert (tmp_path / "2099-01-02" / "cs.LG.md").exists()
 
 
+def test_blurbs_generated_concurrently_and_written_as_ready(tmp_path):
+    slow_started = threading.Event()
+    release_slow = threading.Event()
+    fast_file = tmp_path / "2026-06-28" / "cs.AI.md"
+
+    class GatedAgent(FakeAgent):
+        def identify_important_papers(self, papers):
+            if papers[0]["url"] == "http://slow":
+                slow_started.set()
+                # cs.AI must already be on disk while cs.LG is still running
+                assert release_slow.wait(5)
+                return "slow blurb"
+            assert slow_started.wait(5)  # both categories are in flight together
+            return "fast blurb"
+
+    def release_when_fast_written():
+        for _ in range(500):
+            if fast_file.exists():
+                release_slow.set()
+                return
+            time.sleep(0.01)
+
+    watcher = threading.Thread(target=release_when_fast_written)
+    watcher.start()
+    written = generate_category_blurbs(
+        {"cs.LG": [_paper("http://slow")], "cs.AI": [_paper("http://fast")]},
+        GatedAgent(), str(tmp_path), "2026-06-28", max_concurrency=2)
+    watcher.join()
+
+    assert release_slow.is_set()
+    assert written == ["cs.LG", "cs.AI"]
+    assert fast_file.read_text() == "fast blurb"
+    assert not list((tmp_path / "2026-06-28").glob(".*.tmp"))
+
+
+def test_failed_category_does_not_block_others(tmp_path):
+    class FlakyAgent(FakeAgent):
+        def identify_important_papers(self, papers):
+            if papers[0]["url"] == "http://bad":
+                raise RuntimeError("quota")
+            return super().identify_important_papers(papers)
+
+    written = generate_category_blurbs(
+        {"cs.LG": [_paper("http://bad")], "cs.AI": [_paper("http://ok")]},
+        FlakyAgent(), str(tmp_path), "2026-06-28")
+    assert written == ["cs.AI"]
+    assert not (tmp_path / "2026-06-28" / "cs.LG.md").exists()
+
+
+def test_read_category_blurbs_returns_written_blurbs_in_order(tmp_path):
+    generate_category_blurbs(
+        {"cs.LG": [_paper("http://a")], "cs.CV": [_paper("http://b")], "cs.AI": []},
+        FakeAgent(blurb="## Theme"), str(tmp_path), "2026-06-28")
+    (tmp_path / "2026-06-28" / "stat.ML.md").write_text("  \n")
+
+    blurbs = read_category_blurbs(str(tmp_path), "2026-06-28", ["cs.CV", "cs.AI", "stat.ML", "cs.LG"])
+    assert list(blurbs) == ["cs.CV", "cs.LG"]  # missing and blank blurbs are left out
+    assert blurbs["cs.LG"] == "## Theme"
+
+
 # --- today_ny ------------------------------------------------------------------
 
 
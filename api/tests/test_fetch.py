@@ -0,0 +1,576 @@
+"""Tests for the RSS fetch layer and arXiv metadata lookups.
+
+No network: feed downloads are replaced with in-process fakes.
+"""
+import io
+import sys
+import threading
+import time
+from pathlib import Path
+from unittest.mock import MagicMock, Mock
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from api.arxiv_client import ArxivClient
+from api.ratelimit import TokenBucket
+from api.retry import RetryPolicy, retry_after_seconds
+from api.rss_parser import iter_items, parse_entries
+
+
+def _paper(url, title="t"):
+    return {"title": title, "url": url, "authors": [], "summary": "s"}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+# --- TokenBucket ---------------------------------------------------------------
+
+
+def test_token_bucket_bursts_to_capacity_then_paces():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2.0, capacity=3, clock=clock, sleep=clock.sleep)
+
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.sleeps == []  # burst served from the full bucket
+
+    bucket.acquire()
+    assert clock.sleeps == [0.5]  # then one token every 1/rate seconds
+
+
+def test_token_bucket_try_acquire_does_not_block():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1.0, capacity=1, clock=clock, sleep=clock.sleep)
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+    clock.now += 1.0
+    assert bucket.try_acquire()
+
+
+# --- concurrent retrieve_results_by_category -----------------------------------
+
+
+def test_fetches_run_concurrently_up_to_cap(monkeypatch):
+    client = ArxivClient([], max_workers=3)
+    lock = threading.Lock()
+    in_flight = {"now": 0, "peak": 0}
+
+    def fake_fetch(slug):
+        with lock:
+            in_flight["now"] += 1
+            in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+        time.sleep(0.05)
+        with lock:
+            in_flight["now"] -= 1
+        return [_paper(f"http://{slug}")]
+
+    monkeypatch.setattr(client, "_fetch_category_papers", fake_fetch)
+    slugs = [f"cat.{i}" for i in range(9)]
+    results = client.retrieve_results_by_category(slugs)
+
+    assert list(results) == slugs  # same shape and order as the input
+    assert all(results[s][0]["url"] == f"http://{s}" for s in slugs)
+    assert in_flight["peak"] == 3
+
+
+def test_failed_fetch_yields_empty_list_without_sinking_others(monkeypatch):
+    client = ArxivClient([], retry_policy=RetryPolicy(max_attempts=1))
+
+    def fake_fetch(slug):
+        if slug == "cs.AI":
+            raise RuntimeError("boom")
+        return [_paper("http://ok")]
+
+    monkeypatch.setattr(client, "_fetch_category_papers", fake_fetch)
+    results = client.retrieve_results_by_category(["cs.LG", "cs.AI"])
+    assert results == {"cs.LG": [_paper("http://ok")], "cs.AI": []}
+
+
+# --- combined multi-category feeds ---------------------------------------------
+
+COMBINED_FEED = b"""<rss xmlns:dc="http://purl.org/dc/elements/1.1/"><channel>
+  <item><title>Shared</title><link>http://x</link><description>Abstract: s</description>
+    <category>cs.LG</category><category>cs.AI</category><category>math.OC</category>
+    <pubDate>Tue, 14 Jan 2025 00:00:00 -0500</pubDate></item>
+  <item><title>AI only</title><link>http://y</link><description>Abstract: s</description>
+    <category>cs.AI</category><pubDate>Tue, 14 Jan 2025 00:00:00 -0500</pubDate></item>
+  <item><title>Stale LG</title><link>http://z</link><description>Abstract: s</description>
+    <category>cs.LG</category><pubDate>Mon, 13 Jan 2025 00:00:00 -0500</pubDate></item>
+  <item><title>Elsewhere</title><link>http://w</link><description>Abstract: s</description>
+    <category>q-bio.NC</category><pubDate>Tue, 14 Jan 2025 00:00:00 -0500</pubDate></item>
+</channel></rss>"""
+
+
+def test_pack_feeds_respects_url_limit(monkeypatch):
+    monkeypatch.setattr("api.arxiv_client.MAX_FEED_URL_LENGTH", 50)
+    client = ArxivClient([])
+    client.base_url = "https://h/rss"  # 13 chars + '/' leaves 36 for slugs
+    slugs = ["cs.LG", "cs.AI", "cs.CL", "cs.CV", "stat.ML", "math.ST", "q-bio.NC"]
+    groups = client._pack_feeds(slugs)
+
+    assert [s for g in groups for s in g] == slugs
+    assert all(len(f"{client.base_url}/{'+'.join(g)}") <= 50 for g in groups)
+    assert len(groups) == 2
+
+
+def test_combined_feed_split_by_category_tags(monkeypatch):
+    client = ArxivClient([])
+    requested = []
+
+    def fake_fetch_feed(feed):
+        requested.append(feed)
+        return parse_entries(io.BytesIO(COMBINED_FEED), client._process_paper_entry)
+
+    monkeypatch.setattr(client, "_fetch_feed", fake_fetch_feed)
+    result = client.retrieve_results_by_category(["cs.LG", "cs.AI", "stat.ML"], combined=True)
+
+    assert requested == ["cs.LG+cs.AI+stat.ML"]  # one round trip for all three
+    assert [p["title"] for p in result["cs.LG"]] == ["Shared"]  # stale day dropped per slug
+    assert [p["title"] for p in result["cs.AI"]] == ["Shared", "AI only"]
+    assert result["stat.ML"] == []
+    # the cross-listed item was parsed once and is shared, not re-parsed per slug
+    assert result["cs.LG"][0] is result["cs.AI"][0]
+
+
+# --- per-run feed store ----------------------------------------------------------
+
+
+def test_blog_and_category_flows_share_one_fetch_per_slug(monkeypatch):
+    client = ArxivClient(["cs.LG", "cs.AI"])
+    calls = []
+    feeds = {"cs.LG": [_paper("http://x")], "cs.AI": [_paper("http://x"), _paper("http://y")],
+             "math.ST": [_paper("http://m")]}
+    monkeypatch.setattr(client, "_fetch_category_papers", lambda slug: calls.append(slug) or feeds[slug])
+
+    daily = client.retrieve_daily_results()
+    by_category = client.retrieve_results_by_category(["cs.AI", "cs.LG", "math.ST"])
+
+    assert [p["url"] for p in daily] == ["http://x", "http://y"]  # deduped across feeds
+    assert sorted(calls) == ["cs.AI", "cs.LG", "math.ST"]  # each slug downloaded once
+    assert by_category["cs.AI"] == feeds["cs.AI"]
+    assert client.store.stats() == {"feeds": 3, "hits": 2, "misses": 3}
+
+
+def test_failed_fetch_is_not_stored(monkeypatch):
+    client = ArxivClient([], retry_policy=RetryPolicy(max_attempts=1))
+    attempts = []
+
+    def flaky(slug):
+        attempts.append(slug)
+        if len(attempts) == 1:
+            raise RuntimeError("boom")
+        return [_paper("http://ok")]
+
+    monkeypatch.setattr(client, "_fetch_category_papers", flaky)
+    assert client.retrieve_results_by_category(["cs.LG"]) == {"cs.LG": []}
+    assert client.retrieve_results_by_category(["cs.LG"]) == {"cs.LG": [_paper("http://ok")]}
+
+
+# --- streaming parser ------------------------------------------------------------
+
+
+def test_parse_entries_single_pass_with_dates_and_categories():
+    client = ArxivClient([])
+    entries = parse_entries(io.BytesIO(COMBINED_FEED), client._process_paper_entry, backend="etree")
+
+    assert [p["title"] for _, _, p in entries] == ["Shared", "AI only", "Stale LG", "Elsewhere"]
+    assert entries[0][1] == ["cs.LG", "cs.AI", "math.OC"]
+    assert str(entries[0][0]) == "2025-01-14"
+    assert str(entries[2][0]) == "2025-01-13"
+
+
+def test_iter_items_clears_finished_items():
+    seen = []
+    for item in iter_items(io.BytesIO(COMBINED_FEED), backend="etree"):
+        seen.append(item)
+    # every yielded item was emptied once the parser moved past it
+    assert len(seen) == 4
+    assert all(len(item) == 0 for item in seen)
+
+
+def test_lxml_backend_matches_etree_and_prunes_finished_items():
+    pytest.importorskip("lxml")
+    client = ArxivClient([])
+    by_backend = {backend: parse_entries(io.BytesIO(COMBINED_FEED), client._process_paper_entry, backend=backend)
+                  for backend in ("lxml", "etree")}
+    assert by_backend["lxml"] == by_backend["etree"]
+
+    seen, earlier = [], []
+    for item in iter_items(io.BytesIO(COMBINED_FEED), backend="lxml"):
+        seen.append(item)
+        earlier.append(len(list(item.itersiblings(preceding=True))))
+    # finished items are emptied and dropped from the channel: at most the
+    # previous (already cleared) item is still ahead of the current one
+    assert len(seen) == 4
+    assert all(len(item) == 0 for item in seen)
+    assert earlier == [0, 1, 1, 1]
+
+
+def test_unknown_parser_backend_rejected():
+    with pytest.raises(ValueError):
+        iter_items(io.BytesIO(COMBINED_FEED), backend="sax")
+
+
+# --- bulk arXiv metadata ---------------------------------------------------------
+
+
+def _atom_feed(ids):
+    entries = "".join(
+        f"""<entry><id>http://arxiv.org/abs/{i}v2</id>
+        <published>2025-01-13T18:00:00Z</published><updated>2025-01-14T18:00:00Z</updated>
+        <link title="pdf" href="http://arxiv.org/pdf/{i}v2" rel="related" type="application/pdf"/>
+        <arxiv:primary_category term="cs.LG"/><category term="cs.LG"/><category term="stat.ML"/>
+        </entry>"""
+        for i in ids
+    )
+    return (f'<feed xmlns="http://www.w3.org/2005/Atom" xmlns:arxiv="http://arxiv.org/schemas/atom">'
+            f'{entries}</feed>').encode()
+
+
+def test_metadata_resolved_in_chunks_and_cached_across_runs(tmp_path, monkeypatch):
+    from urllib.parse import parse_qs, urlparse
+
+    from api.arxiv_metadata import ArxivMetadataResolver, MetadataCache
+
+    queried = []
+
+    def fake_urlopen(url, timeout=None):
+        ids = parse_qs(urlparse(url).query)["id_list"][0].split(",")
+        queried.append(ids)
+        response = Mock()
+        response.read.return_value = _atom_feed(ids)
+        cm = MagicMock()
+        cm.__enter__.return_value = response
+        return cm
+
+    monkeypatch.setattr("urllib.request.urlopen", fake_urlopen)
+    ids = [f"2501.{n:05d}" for n in range(5)]
+    db = str(tmp_path / "meta.sqlite")
+
+    resolver = ArxivMetadataResolver(MetadataCache(db), chunk_size=2, requests_per_second=1000)
+    records = resolver.resolve(ids)
+    assert [len(q) for q in queried] == [2, 2, 1]
+    assert records["2501.00003"].pdf_url == "http://arxiv.org/pdf/2501.00003v2"
+    assert records["2501.00003"].primary_category == "cs.LG"
+    assert records["2501.00003"].categories == ("cs.LG", "stat.ML")
+    assert records["2501.00003"].version == 2
+
+    # a later run with the same cache file makes no requests for known ids
+    queried.clear()
+    again = ArxivMetadataResolver(MetadataCache(db), requests_per_second=1000).resolve(ids + ["2501.00009"])
+    assert queried == [["2501.00009"]]
+    assert again["2501.00001"] == records["2501.00001"]
+
+
+# --- keep-alive HTTP session -----------------------------------------------------
+
+
+@pytest.fixture
+def local_http_server():
+    """Local HTTP/1.1 server: /feed/<slug> serves a tiny RSS doc (gzipped if asked)."""
+    import gzip
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if self.path == "/moved":
+                self.send_response(301)
+                self.send_header("Location", "/feed/cs.LG")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if self.path == "/missing":
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = COMBINED_FEED
+            self.send_response(200)
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                body = gzip.compress(body)
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_session_reuses_connections_and_decodes_gzip(local_http_server):
+    import urllib.error
+
+    from api.http_session import HttpSession
+
+    session = HttpSession(max_per_host=2)
+    client = ArxivClient([], session=session)
+    client.base_url = f"{local_http_server}/feed"
+    results = client.retrieve_results_by_category(["cs.LG", "cs.AI", "stat.ML", "math.OC"])
+    assert [p["title"] for p in results["cs.AI"]] == ["Shared", "AI only", "Elsewhere"]  # gzip body parsed
+
+    with session.get(f"{local_http_server}/moved") as response:
+        assert response.read() == COMBINED_FEED
+    with pytest.raises(urllib.error.HTTPError) as err:
+        session.get(f"{local_http_server}/missing")
+    assert err.value.code == 404
+
+    stats = session.stats()
+    assert stats["connections_opened"] <= 2  # capped per host
+    assert stats["connections_reused"] == stats["requests"] - stats["connections_opened"]
+    assert stats["connections_reused"] >= 5
+    session.close()
+
+
+# --- retry policy and rescheduling ---------------------------------------------
+
+
+def _http_error(code, retry_after=None):
+    import urllib.error
+    from email.message import Message
+
+    headers = Message()
+    if retry_after is not None:
+        headers["Retry-After"] = retry_after
+    return urllib.error.HTTPError("http://h/x", code, "err", headers, None)
+
+
+def test_backoff_is_jittered_exponential_and_capped():
+    policy = RetryPolicy(base_delay=1.0, max_delay=5.0, rng=lambda: 1.0)
+    assert [policy.backoff(a) for a in (1, 2, 3, 4)] == [1.0, 2.0, 4.0, 5.0]
+    policy.rng = lambda: 0.25
+    assert policy.backoff(3) == 1.0
+
+
+def test_retry_after_honored_and_permanent_errors_not_retried():
+    policy = RetryPolicy(rng=lambda: 0.0)
+    assert policy.next_delay(1, _http_error(429, "12")) == 12.0
+    assert policy.next_delay(1, _http_error(404)) is None
+    assert policy.next_delay(5, _http_error(503)) is None  # out of attempts
+    assert retry_after_seconds(_http_error(503, "Wed, 21 Oct 2015 07:28:00 GMT")) == 0.0
+
+
+def test_no_retry_past_run_deadline_and_circuit_opens():
+    clock = FakeClock()
+    policy = RetryPolicy(max_attempts=10, run_budget=10.0, breaker_threshold=2, breaker_cooldown=30.0,
+                         clock=clock, rng=lambda: 0.0)
+    assert policy.next_delay(1, _http_error(429, "5"), "h") == 5.0
+    assert policy.next_delay(2, _http_error(429, "20"), "h") is None  # would start after the deadline
+    assert policy.blocked_for("h") == 30.0  # two failures in a row opened the circuit
+    policy.record_success("h")
+    assert policy.blocked_for("h") == 0.0
+
+
+def test_only_retryable_errors_count_toward_the_circuit():
+    policy = RetryPolicy(breaker_threshold=2, rng=lambda: 0.0)
+    for _ in range(3):
+        policy.next_delay(1, _http_error(404), "h")
+    assert policy.blocked_for("h") == 0.0
+    policy.next_delay(1, _http_error(503), "h")
+    policy.next_delay(1, _http_error(404), "h")  # the host answered: the run of failures ends
+    policy.next_delay(1, _http_error(503), "h")
+    assert policy.blocked_for("h") == 0.0
+
+
+def test_open_circuit_stops_new_requests_until_a_probe_succeeds(monkeypatch):
+    clock = FakeClock()
+    client = ArxivClient([], max_workers=1,
+                         retry_policy=RetryPolicy(max_attempts=1, breaker_threshold=2, breaker_cooldown=100.0,
+                                                  clock=clock, sleep=clock.sleep))
+    requests = []
+
+    def fake_fetch(slug):
+        requests.append((slug, clock.now))
+        if clock.now < 100:
+            raise OSError("timeout")
+        return [_paper(f"http://{slug}")]
+
+    monkeypatch.setattr(client, "_fetch_category_papers", fake_fetch)
+    slugs = [f"cat.{i}" for i in range(6)]
+    results = client.retrieve_results_by_category(slugs)
+
+    # two failures open the circuit; the other four wait it out, then one probe goes first
+    assert requests[:3] == [("cat.0", 0.0), ("cat.1", 0.0), ("cat.2", 100.0)]
+    assert len(requests) == 6
+    assert results["cat.0"] == [] and all(results[s] for s in slugs[2:])
+
+
+def test_circuit_open_past_deadline_gives_up_queued_feeds(monkeypatch):
+    clock = FakeClock()
+    client = ArxivClient([], max_workers=1,
+                         retry_policy=RetryPolicy(max_attempts=1, run_budget=150.0, breaker_threshold=2,
+                                                  breaker_cooldown=100.0, clock=clock, sleep=clock.sleep))
+    requests = []
+
+    def down(slug):
+        requests.append(slug)
+        raise OSError("timeout")
+
+    monkeypatch.setattr(client, "_fetch_category_papers", down)
+    results = client.retrieve_results_by_category([f"cat.{i}" for i in range(6)])
+
+    assert requests == ["cat.0", "cat.1", "cat.2"]  # the probe at t=100 failed; reopening runs past t=150
+    assert not any(results.values())
+
+
+def test_fetch_deadline_starts_at_the_first_fetch(monkeypatch):
+    clock = FakeClock()
+    client = ArxivClient([], max_workers=1,
+                         retry_policy=RetryPolicy(run_budget=600.0, base_delay=10.0, clock=clock,
+                                                  sleep=clock.sleep, rng=lambda: 1.0))
+    clock.sleep(700)  # e.g. the blog post was summarized first
+    attempts = []
+
+    def flaky(slug):
+        attempts.append(clock.now)
+        if len(attempts) == 1:
+            raise OSError("timeout")
+        return [_paper(f"http://{slug}")]
+
+    monkeypatch.setattr(client, "_fetch_category_papers", flaky)
+    results = client.retrieve_results_by_category(["cs.LG"])
+
+    assert attempts == [700.0, 710.0]
+    assert results["cs.LG"] == [_paper("http://cs.LG")]
+    assert client.retry_policy.time_left() == 590.0
+
+
+def test_failed_feed_is_rescheduled_without_blocking_others(monkeypatch):
+    clock = FakeClock()
+    client = ArxivClient([], max_workers=1,
+                         retry_policy=RetryPolicy(base_delay=10.0, clock=clock, sleep=clock.sleep,
+                                                  rng=lambda: 1.0))
+    order = []
+
+    def fake_fetch(slug):
+        order.append(slug)
+        if slug == "dead" and order.count("dead") < 3:
+            raise OSError("timeout")
+        return [_paper(f"http://{slug}")]
+
+    monkeypatch.setattr(client, "_fetch_category_papers", fake_fetch)
+    results = client.retrieve_results_by_category(["dead", "a", "b"])
+
+    # with a single worker, 'a' and 'b' ran while 'dead' waited out its backoff
+    assert order == ["dead", "a", "b", "dead", "dead"]
+    assert results["dead"] == [_paper("http://dead")]
+    assert clock.sleeps == [10.0, 20.0]
+
+
+# --- conditional GET cache -------------------------------------------------------
+
+
+@pytest.fixture
+def validating_server():
+    """Local server that honors If-None-Match for a fixed ETag."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    hits = {"200": 0, "304": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if self.headers.get("If-None-Match") == '"v1"':
+                hits["304"] += 1
+                self.send_response(304)
+                self.send_header("ETag", '"v1"')
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            hits["200"] += 1
+            self.send_response(200)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", str(len(COMBINED_FEED)))
+            self.end_headers()
+            self.wfile.write(COMBINED_FEED)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", hits
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("use_session", [False, True])
+def test_conditional_get_skips_feeds_seen_on_an_earlier_day(tmp_path, validating_server, use_session):
+    import json
+
+    from api.feed_cache import FeedValidatorCache
+    from api.http_session import HttpSession
+
+    base_url, hits = validating_server
+
+    def run():
+        client = ArxivClient([], validator_cache=FeedValidatorCache(tmp_path),
+                             session=HttpSession() if use_session else None)
+        client.base_url = base_url
+        return client, client.retrieve_results_by_category(["cs.AI"])
+
+    first_client, first = run()
+    _, rerun = run()  # same day: downloaded again in full, there may be work left
+    assert hits == {"200": 2, "304": 0}
+    assert rerun["cs.AI"] and first_client.unchanged_feeds == {}
+
+    (entry,) = tmp_path.glob("*.json")
+    record = json.loads(entry.read_text())
+    assert set(record) == {"url", "etag", "last_modified", "first_seen"}  # validators only, no feed content
+    record["first_seen"] = "2025-01-13T15:00:00+00:00"
+    entry.write_text(json.dumps(record))
+
+    next_day_client, next_day = run()
+    assert hits == {"200": 2, "304": 1}
+    assert next_day_client.unchanged_feeds == {"cs.AI": "2025-01-13T15:00:00+00:00"}
+    assert next_day == {"cs.AI": []}
+
+
+def test_already_seen_feeds_excludes_content_first_seen_today():
+    from api.feeds import already_seen_feeds
+
+    unchanged = {"cs.LG": "2025-01-13T15:00:00+00:00", "cs.AI": "2025-01-14T15:00:00+00:00"}
+    assert already_seen_feeds(unchanged, "2025-01-14") == {"cs.LG"}
+
+
+# --- replay server -----------------------------------------------------------------
+
+
+def test_replay_server_drives_client_through_faults():
+    from api.http_session import HttpSession
+    from api.replay import ReplayServer
+
+    with ReplayServer(items_per_feed=5, error_rate=0.3, rate_limit_rate=0.2, retry_after=0, seed=3) as server:
+        client = ArxivClient([], max_workers=4, requests_per_second=1000, session=HttpSession(),
+                             retry_policy=RetryPolicy(max_attempts=20, base_delay=0.001))
+        client.base_url = server.base_url
+        slugs = ["cs.LG", "cs.AI", "math.ST", "hep-th"]
+        results = client.retrieve_results_by_category(slugs)
+        stats = server.stats()
+
+    assert all(results[s] for s in slugs)  # every feed recovered from injected faults
+    assert stats["status"][200] == len(slugs)
+    assert stats["requests"] == sum(stats["status"].values()) > len(slugs)
+    assert set(stats["status"]) <= {200, 429, 503}
@@ -1,3 +1,4 @@
+import io
 import pytest
 from unittest.mock import patch, Mock, MagicMock
 import xml.etree.ElementTree as ET
@@ -11,6 +12,7 @@ sys.path.append(str(Path(__file__).parent.parent.parent))
 from api.arxiv_client import ArxivClient
 from api.agent import Agent
 from api.file_handler import FileHandler
+from api.paper import Paper
 from api.utils import add_markdown_links, download_pdf
 from api.webs import create_blogpost
 from api.settings import get_secret
@@ -82,9 +84,7 @@ class TestArxivClient:
 
     @patch('urllib.request.urlopen')
     def test_retrieve_daily_results(self, mock_urlopen, mock_arxiv_response):
-        mock_response = Mock()
-        mock_response.read.return_value = mock_arxiv_response
-        mock_urlopen.return_value.__enter__.return_value = mock_response
+        mock_urlopen.return_value.__enter__.return_value = io.BytesIO(mock_arxiv_response)
 
         client = ArxivClient(categories=['cs.LG'])
         with patch('time.sleep'):
@@ -155,6 +155,35 @@ class TestAgent:
         expected = "**Title:** Test Paper Title\n**URL:** https://arxiv.org/abs/1234.5678\n**Authors:** Author One, Author Two\n**Summary:** This is a test summary\n"
         assert result == expected
 
+    def test_combine_paper_info_paper_record_matches_dict(self, sample_paper, llm_agent):
+        paper = Paper.from_dict(sample_paper)
+        assert llm_agent._combine_paper_info(paper) == llm_agent._combine_paper_info(sample_paper)
+        # rendered once, then served from the record
+        assert llm_agent._combine_paper_info(paper) is llm_agent._combine_paper_info(paper)
+
+# Paper Tests
+class TestPaper:
+    def test_keyed_by_arxiv_id_with_dict_access(self):
+        a = Paper.create('A', 'https://arxiv.org/abs/2501.00001v2', ['Ann Lee'], 's')
+        b = Paper.create('A (cross-list)', 'https://arxiv.org/abs/2501.00001', ['Ann Lee'], 's')
+        assert a.arxiv_id == '2501.00001'
+        assert a == b and len({a, b}) == 1
+        assert a['title'] == 'A' and a.get('missing') is None
+        assert dict(a) == {'title': 'A', 'authors': ['Ann Lee'], 'summary': 's',
+                           'url': 'https://arxiv.org/abs/2501.00001v2'}
+
+    def test_author_names_are_interned(self):
+        name = ''.join(['Ann', ' ', 'Lee'])  # built at runtime, so not interned by the compiler
+        a = Paper.create('A', 'https://arxiv.org/abs/2501.00001', [name], 's')
+        b = Paper.create('B', 'https://arxiv.org/abs/2501.00002', [''.join(['Ann ', 'Lee'])], 's')
+        assert a.authors[0] is b.authors[0]
+
+    def test_pickle_round_trip(self, sample_paper):
+        import pickle
+
+        paper = Paper.from_dict(sample_paper)
+        assert pickle.loads(pickle.dumps(paper)).to_dict() == paper.to_dict()
+
 # FileHandler Tests
 class TestFileHandler:
     def test_save_and_load_papers(self, file_handler, sample_paper):
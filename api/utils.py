@@ -12,6 +12,8 @@ import urllib
 import os
 import urllib.request as libreq
 
+from api.http_session import open_url
+
 def extract_text_from_pdf(pdf_content):
     """
     Extracts text from the PDF content.
@@ -65,17 +67,18 @@ def extract_images_from_pdf_base64(pdf_content):
 
     return images_base64
 
-def download_pdf(pdf_url, filename):
+def download_pdf(pdf_url, filename, session=None):
     """
     Downloads a PDF from a given URL and saves it to /tmp/filename
 
     Args:
         pdf_url (str): The URL of the PDF to download.
         filename (str): The filename to save the PDF as.
+        session (HttpSession): Optional shared keep-alive session to download through.
     """
     filepath  = os.path.join('/tmp/',filename)
     try:
-        with urllib.request.urlopen(pdf_url) as response, open(filepath, 'wb') as outfile:
+        with open_url(pdf_url, timeout=60, session=session) as response, open(filepath, 'wb') as outfile:
             outfile.write(response.read())
         print(f"Successfully downloaded PDF to {filename}")
         return filepath